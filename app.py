@@ -6,10 +6,10 @@ Application Streamlit principale - Assistant MJ Les Lames du Cardinal
 import sys
 from pathlib import Path
 from datetime import datetime
-import time
-import json
 import warnings
 import logging
+from itertools import islice
+from typing import Optional
 
 # Ajouter le répertoire parent au path pour les imports
 sys.path.insert(0, str(Path(__file__).parent))
@@ -20,17 +20,16 @@ logging.getLogger("PyPDF2").setLevel(logging.ERROR)
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
 import streamlit as st
-import plotly.express as px
-import pandas as pd
 from datetime import datetime
 
-from core.rag import DocumentExtractor, VectorStore, RAGChain
+from core.rag import DocumentExtractor, VectorStore, RAGChain, relevance_confidence
 from core.memory import Memory, SessionManager, Statistics
 from core.parser import ResponseParser, GameState
 from core.characters import CharacterManager
 from core.utils import (
     load_config, get_ollama_models, validate_ollama_installation,
-    export_session_to_markdown, ColorScheme
+    export_session_to_markdown, ColorScheme, read_json, open_with_default_app,
+    format_file_size
 )
 
 
@@ -38,6 +37,18 @@ from core.utils import (
 # CONFIGURATION ET INITIALISATION
 # =============================================================================
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_ollama_models() -> list:
+    """Liste des modèles Ollama, rafraîchie au plus une fois par minute"""
+    return get_ollama_models()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_ollama_installed() -> bool:
+    """Vérifie l'installation d'Ollama au plus une fois toutes les 5 minutes"""
+    return validate_ollama_installation()
+
+
 def init_app():
     """Initialise l'application"""
     st.set_page_config(
@@ -55,18 +66,41 @@ def init_app():
     
     config = load_config(config_path)
     
-    # Créer la structure de répertoires
-    for path in config['paths'].values():
-        if isinstance(path, Path):
+    # Créer la structure de répertoires (embedding_cache est un fichier, pas un dossier)
+    for key, path in config['paths'].items():
+        if isinstance(path, Path) and key != 'embedding_cache':
             path.mkdir(parents=True, exist_ok=True)
     
     # Vérifier Ollama
-    if not validate_ollama_installation():
+    if not _cached_ollama_installed():
         st.warning("⚠️ Ollama ne semble pas installé ou accessible.")
     
     return config
 
 
+@st.cache_resource(show_spinner=False)
+def _get_memory(max_size: int, memory_file_str: str) -> Memory:
+    """Mémoire persistante partagée par processus (clé : taille max + fichier)
+
+    Une seule instance pour tous les onglets : « Tout effacer » ou le chargement
+    d'une session s'appliquent à tous. Les accès concurrents (un thread par
+    session Streamlit) sont sérialisés par le verrou interne de Memory.
+    """
+    return Memory(max_size=max_size, memory_file=Path(memory_file_str))
+
+
+@st.cache_resource(show_spinner=False)
+def _get_session_manager(save_dir_str: str) -> SessionManager:
+    """Gestionnaire de sessions partagé par processus"""
+    return SessionManager(Path(save_dir_str))
+
+
+@st.cache_resource(show_spinner=False)
+def _get_char_manager(char_dir_str: str) -> CharacterManager:
+    """Gestionnaire de personnages partagé par processus"""
+    return CharacterManager(Path(char_dir_str))
+
+
 def init_session_state(config):
     """Initialise le session state"""
     if 'initialized' not in st.session_state:
@@ -84,13 +118,11 @@ def init_session_state(config):
         mj_file = paths['memory_dir'] / "mj_memory.json"
         encyclo_file = paths['memory_dir'] / "encyclo_memory.json"
         
-        st.session_state.mj_memory = Memory(
-            max_size=config['memory']['max_mj_memory'],
-            memory_file=mj_file
+        st.session_state.mj_memory = _get_memory(
+            config['memory']['max_mj_memory'], str(mj_file)
         )
-        st.session_state.encyclo_memory = Memory(
-            max_size=config['memory']['max_encyclo_memory'],
-            memory_file=encyclo_file
+        st.session_state.encyclo_memory = _get_memory(
+            config['memory']['max_encyclo_memory'], str(encyclo_file)
         )
         
         # État du jeu
@@ -104,10 +136,10 @@ def init_session_state(config):
             st.session_state.statistics = Statistics()
         
         # Sessions
-        st.session_state.session_manager = SessionManager(paths['save_dir'])
+        st.session_state.session_manager = _get_session_manager(str(paths['save_dir']))
         
         # Personnages
-        st.session_state.char_manager = CharacterManager(paths['char_dir'])
+        st.session_state.char_manager = _get_char_manager(str(paths['char_dir']))
         
         # Paramètres UI
         st.session_state.current_model = config['model']['default']
@@ -187,15 +219,7 @@ def render_sidebar():
                 with col1:
                     # Bouton pour ouvrir dans l'explorateur
                     if st.button("📂 Ouvrir", key="open_pdf", use_container_width=True):
-                        import subprocess
-                        import platform
-                        if platform.system() == 'Windows':
-                            import os
-                            os.startfile(str(char.file_path))
-                        elif platform.system() == 'Darwin':  # macOS
-                            subprocess.run(['open', str(char.file_path)])
-                        else:  # Linux
-                            subprocess.run(['xdg-open', str(char.file_path)])
+                        open_with_default_app(char.file_path)
 
                 with col2:
                     # Bouton de téléchargement
@@ -331,7 +355,7 @@ def render_config_panel(config):
 
     # Sélection du modèle
     st.markdown("**Modèle**")
-    models = get_ollama_models()
+    models = _cached_ollama_models()
 
     try:
         default_idx = models.index(st.session_state.current_model)
@@ -347,9 +371,10 @@ def render_config_panel(config):
 
     if selected_model != st.session_state.current_model:
         st.session_state.current_model = selected_model
-        # Invalider le cache QA
-        if 'qa_chain' in st.session_state:
-            del st.session_state['qa_chain']
+
+    if st.button("🔄 Rafraîchir les modèles", key="refresh_models", use_container_width=True):
+        _cached_ollama_models.clear()
+        st.rerun()
 
     # Mode
     st.markdown("**Mode**")
@@ -382,12 +407,19 @@ def render_config_panel(config):
         render_game_state()
 
 
+@st.cache_data(ttl=5, show_spinner=False)
+def _cached_sessions(save_dir_str: str) -> list:
+    """Liste des sessions sauvegardées (scan du dossier au plus toutes les 5 s)"""
+    return _get_session_manager(save_dir_str).list_sessions()
+
+
 def render_session_manager():
     """Affiche le gestionnaire de sessions"""
     st.markdown("**💾 Sessions**")
 
-    session_manager = st.session_state.session_manager
-    sessions = session_manager.list_sessions()
+    ss = st.session_state
+    session_manager = ss.session_manager
+    sessions = _cached_sessions(str(session_manager.save_dir))
 
     # Sauvegarder
     session_name = st.text_input(
@@ -401,15 +433,16 @@ def render_session_manager():
     if col1.button("💾 Sauver", use_container_width=True):
         success = session_manager.save_session(
             session_name=session_name,
-            mj_memory=st.session_state.mj_memory,
-            encyclo_memory=st.session_state.encyclo_memory,
+            mj_memory=ss.mj_memory,
+            encyclo_memory=ss.encyclo_memory,
             metadata={
-                "game_state": st.session_state.game_state.to_dict(),
-                "mode": st.session_state.mode,
-                "model": st.session_state.current_model
+                "game_state": ss.game_state.to_dict(),
+                "mode": ss.mode,
+                "model": ss.current_model
             }
         )
         if success:
+            _cached_sessions.clear()
             st.success(f"✅ Session '{session_name}' sauvegardée")
         else:
             st.error("❌ Erreur lors de la sauvegarde")
@@ -426,19 +459,19 @@ def render_session_manager():
             data = session_manager.load_session(selected_session)
             if data:
                 # Restaurer la mémoire
-                st.session_state.mj_memory.entries = data['mj_entries']
-                st.session_state.encyclo_memory.entries = data['encyclo_entries']
+                ss.mj_memory.replace_all(data['mj_entries'])
+                ss.encyclo_memory.replace_all(data['encyclo_entries'])
 
                 # Restaurer l'état du jeu
                 if 'game_state' in data.get('metadata', {}):
-                    st.session_state.game_state.from_dict(data['metadata']['game_state'])
+                    ss.game_state.from_dict(data['metadata']['game_state'])
 
                 # Restaurer les paramètres
                 metadata = data.get('metadata', {})
                 if 'mode' in metadata:
-                    st.session_state.mode = metadata['mode']
+                    ss.mode = metadata['mode']
                 if 'model' in metadata:
-                    st.session_state.current_model = metadata['model']
+                    ss.current_model = metadata['model']
 
                 st.success(f"✅ Session '{selected_session}' chargée")
                 st.rerun()
@@ -447,10 +480,10 @@ def render_session_manager():
 
     # Export
     if st.button("📄 Exporter en Markdown", use_container_width=True):
-        export_path = st.session_state.config['paths']['save_dir'] / f"{session_name}_export.md"
+        export_path = ss.config['paths']['save_dir'] / f"{session_name}_export.md"
         success = export_session_to_markdown(
-            mj_memory=[e.to_dict() for e in st.session_state.mj_memory.entries],
-            game_state=st.session_state.game_state.to_dict(),
+            mj_memory=ss.mj_memory.to_dict_list(),
+            game_state=ss.game_state.to_dict(),
             session_name=session_name,
             output_path=export_path
         )
@@ -480,19 +513,19 @@ def render_game_state():
 
     if game_state.npcs:
         st.markdown("**PNJ:**")
-        for name, status in list(game_state.npcs.items())[:5]:
+        for name, status in islice(game_state.npcs.items(), 5):
             icon = game_state.get_npc_icon(status)
             st.text(f"{icon} {name}")
 
     if game_state.locations:
         st.markdown("**Lieux:**")
-        for name, status in list(game_state.locations.items())[:5]:
+        for name, status in islice(game_state.locations.items(), 5):
             icon = game_state.get_location_icon(status)
             st.text(f"{icon} {name}")
 
     if game_state.intrigues:
         st.markdown("**Intrigues:**")
-        for name, status in list(game_state.intrigues.items())[:3]:
+        for name, status in islice(game_state.intrigues.items(), 3):
             icon = game_state.get_intrigue_icon(status)
             st.text(f"{icon} {name}")
 
@@ -501,21 +534,23 @@ def render_game_state():
         st.rerun()
 
 
-def render_timeline():
-    """Affiche la timeline des actions"""
-    if not st.session_state.timeline:
-        st.info("Aucune action pour le moment. Commence à jouer!")
-        return
-    
-    df = pd.DataFrame([
-        {
-            "Tour": f"Tour {i+1}",
-            "Début": i,
-            "Fin": i + 1,
-            "Type": "Action"
-        }
-        for i in range(len(st.session_state.timeline))
-    ])
+@st.cache_data(show_spinner=False, max_entries=4)
+def _build_timeline_fig(n_turns: int):
+    """Construit la figure de la timeline (cache par nombre de tours)
+
+    Chaque tour crée une nouvelle clé : max_entries borne la mémoire occupée
+    par les figures des tours précédents.
+    """
+    # Imports différés : pandas/plotly ne sont chargés qu'à la première timeline
+    import pandas as pd
+    import plotly.express as px
+
+    df = pd.DataFrame({
+        "Tour": [f"Tour {i+1}" for i in range(n_turns)],
+        "Début": range(n_turns),
+        "Fin": range(1, n_turns + 1),
+        "Type": ["Action"] * n_turns
+    })
     
     fig = px.timeline(
         df,
@@ -527,8 +562,41 @@ def render_timeline():
     )
     fig.update_yaxes(autorange="reversed")
     fig.update_layout(height=300, showlegend=False)
+    return fig
+
+
+def render_timeline():
+    """Affiche la timeline des actions"""
+    if not st.session_state.timeline:
+        st.info("Aucune action pour le moment. Commence à jouer!")
+        return
     
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(_build_timeline_fig(len(st.session_state.timeline)), use_container_width=True)
+
+
+# Taille maximale d'un PDF affiché via PDF.js + base64 (fallback sans st.pdf)
+_PDF_INLINE_MAX_BYTES = 1024 * 1024
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _pdf_b64(path_str: str, mtime: float) -> str:
+    """PDF encodé en base64 (cache par chemin + date de modification)"""
+    import base64
+    return base64.b64encode(Path(path_str).read_bytes()).decode()
+
+
+def _render_native_pdf(pdf_path: Path) -> bool:
+    """Affiche le PDF avec st.pdf (Streamlit >= 1.49), sans passer par base64
+
+    Retourne False si st.pdf est indisponible (version ou extra streamlit[pdf] manquant).
+    """
+    if not hasattr(st, "pdf"):
+        return False
+    try:
+        st.pdf(str(pdf_path), height=800)
+        return True
+    except Exception:
+        return False
 
 
 def render_character_viewer_old():
@@ -587,15 +655,7 @@ def render_character_viewer_old():
                 with col1:
                     # Bouton pour ouvrir dans l'explorateur
                     if st.button("📂 Ouvrir dans lecteur PDF", key="open_pdf", use_container_width=True):
-                        import subprocess
-                        import platform
-                        if platform.system() == 'Windows':
-                            import os
-                            os.startfile(str(char.file_path))
-                        elif platform.system() == 'Darwin':  # macOS
-                            subprocess.run(['open', str(char.file_path)])
-                        else:  # Linux
-                            subprocess.run(['xdg-open', str(char.file_path)])
+                        open_with_default_app(char.file_path)
                 
                 with col2:
                     # Bouton de téléchargement
@@ -617,170 +677,179 @@ def render_character_viewer_old():
                 
                 # Visualiseur PDF avec PDF.js
                 try:
-                    import base64
-                    with open(char.file_path, "rb") as f:
-                        pdf_bytes = f.read()
-                        pdf_base64 = base64.b64encode(pdf_bytes).decode()
-                    
                     st.markdown("#### 📖 Aperçu du document")
                     
-                    # Utiliser PDF.js pour le rendu
-                    pdf_viewer_html = f'''
-                    <!DOCTYPE html>
-                    <html>
-                    <head>
-                        <style>
-                            body {{
-                                margin: 0;
-                                padding: 0;
-                                overflow: hidden;
-                            }}
-                            #pdf-container {{
-                                width: 100%;
-                                height: 800px;
-                                overflow: auto;
-                                border: 2px solid #ddd;
-                                border-radius: 5px;
-                                background: #525659;
-                            }}
-                            canvas {{
-                                display: block;
-                                margin: 10px auto;
-                                box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-                            }}
-                            .controls {{
-                                position: sticky;
-                                top: 0;
-                                background: white;
-                                padding: 10px;
-                                border-bottom: 2px solid #ddd;
-                                text-align: center;
-                                z-index: 100;
-                            }}
-                            button {{
-                                margin: 0 5px;
-                                padding: 8px 16px;
-                                background: #8B0000;
-                                color: white;
-                                border: none;
-                                border-radius: 4px;
-                                cursor: pointer;
-                                font-size: 14px;
-                            }}
-                            button:hover {{
-                                background: #A00000;
-                            }}
-                            #page-info {{
-                                display: inline-block;
-                                margin: 0 10px;
-                                font-weight: bold;
-                            }}
-                        </style>
-                        <script src="https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.min.js"></script>
-                    </head>
-                    <body>
-                        <div id="pdf-container">
-                            <div class="controls">
-                                <button id="prev-page">◀ Précédent</button>
-                                <span id="page-info">Page <span id="page-num">1</span> / <span id="page-count">?</span></span>
-                                <button id="next-page">Suivant ▶</button>
-                                <button id="zoom-in">🔍 Zoom +</button>
-                                <button id="zoom-out">🔍 Zoom -</button>
+                    pdf_stat = char.file_path.stat()
+                    if _render_native_pdf(char.file_path):
+                        pass
+                    elif pdf_stat.st_size > _PDF_INLINE_MAX_BYTES:
+                        # Au-delà, l'encodage base64 embarqué dans le HTML coûte plusieurs
+                        # copies du fichier en mémoire à chaque affichage
+                        st.info(
+                            f"📄 PDF volumineux ({format_file_size(pdf_stat.st_size)}) : aperçu intégré désactivé. "
+                            "Utilise 'Ouvrir dans lecteur PDF' ou le téléchargement ci-dessus."
+                        )
+                    else:
+                        # base64 calculé une fois par version du fichier, pas à chaque rerun
+                        pdf_base64 = _pdf_b64(str(char.file_path), pdf_stat.st_mtime)
+                        
+                        # Utiliser PDF.js pour le rendu
+                        pdf_viewer_html = f'''
+                        <!DOCTYPE html>
+                        <html>
+                        <head>
+                            <style>
+                                body {{
+                                    margin: 0;
+                                    padding: 0;
+                                    overflow: hidden;
+                                }}
+                                #pdf-container {{
+                                    width: 100%;
+                                    height: 800px;
+                                    overflow: auto;
+                                    border: 2px solid #ddd;
+                                    border-radius: 5px;
+                                    background: #525659;
+                                }}
+                                canvas {{
+                                    display: block;
+                                    margin: 10px auto;
+                                    box-shadow: 0 2px 8px rgba(0,0,0,0.3);
+                                }}
+                                .controls {{
+                                    position: sticky;
+                                    top: 0;
+                                    background: white;
+                                    padding: 10px;
+                                    border-bottom: 2px solid #ddd;
+                                    text-align: center;
+                                    z-index: 100;
+                                }}
+                                button {{
+                                    margin: 0 5px;
+                                    padding: 8px 16px;
+                                    background: #8B0000;
+                                    color: white;
+                                    border: none;
+                                    border-radius: 4px;
+                                    cursor: pointer;
+                                    font-size: 14px;
+                                }}
+                                button:hover {{
+                                    background: #A00000;
+                                }}
+                                #page-info {{
+                                    display: inline-block;
+                                    margin: 0 10px;
+                                    font-weight: bold;
+                                }}
+                            </style>
+                            <script src="https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.min.js"></script>
+                        </head>
+                        <body>
+                            <div id="pdf-container">
+                                <div class="controls">
+                                    <button id="prev-page">◀ Précédent</button>
+                                    <span id="page-info">Page <span id="page-num">1</span> / <span id="page-count">?</span></span>
+                                    <button id="next-page">Suivant ▶</button>
+                                    <button id="zoom-in">🔍 Zoom +</button>
+                                    <button id="zoom-out">🔍 Zoom -</button>
+                                </div>
+                                <canvas id="pdf-canvas"></canvas>
                             </div>
-                            <canvas id="pdf-canvas"></canvas>
-                        </div>
                         
-                        <script>
-                            const pdfData = atob('{pdf_base64}');
-                            const pdfBytes = new Uint8Array(pdfData.length);
-                            for (let i = 0; i < pdfData.length; i++) {{
-                                pdfBytes[i] = pdfData.charCodeAt(i);
-                            }}
+                            <script>
+                                const pdfData = atob('{pdf_base64}');
+                                const pdfBytes = new Uint8Array(pdfData.length);
+                                for (let i = 0; i < pdfData.length; i++) {{
+                                    pdfBytes[i] = pdfData.charCodeAt(i);
+                                }}
                             
-                            pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
+                                pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
                             
-                            let pdfDoc = null;
-                            let pageNum = 1;
-                            let pageRendering = false;
-                            let pageNumPending = null;
-                            let scale = 1.5;
-                            const canvas = document.getElementById('pdf-canvas');
-                            const ctx = canvas.getContext('2d');
+                                let pdfDoc = null;
+                                let pageNum = 1;
+                                let pageRendering = false;
+                                let pageNumPending = null;
+                                let scale = 1.5;
+                                const canvas = document.getElementById('pdf-canvas');
+                                const ctx = canvas.getContext('2d');
                             
-                            function renderPage(num) {{
-                                pageRendering = true;
-                                pdfDoc.getPage(num).then(function(page) {{
-                                    const viewport = page.getViewport({{scale: scale}});
-                                    canvas.height = viewport.height;
-                                    canvas.width = viewport.width;
+                                function renderPage(num) {{
+                                    pageRendering = true;
+                                    pdfDoc.getPage(num).then(function(page) {{
+                                        const viewport = page.getViewport({{scale: scale}});
+                                        canvas.height = viewport.height;
+                                        canvas.width = viewport.width;
                                     
-                                    const renderContext = {{
-                                        canvasContext: ctx,
-                                        viewport: viewport
-                                    }};
+                                        const renderContext = {{
+                                            canvasContext: ctx,
+                                            viewport: viewport
+                                        }};
                                     
-                                    const renderTask = page.render(renderContext);
-                                    renderTask.promise.then(function() {{
-                                        pageRendering = false;
-                                        if (pageNumPending !== null) {{
-                                            renderPage(pageNumPending);
-                                            pageNumPending = null;
-                                        }}
+                                        const renderTask = page.render(renderContext);
+                                        renderTask.promise.then(function() {{
+                                            pageRendering = false;
+                                            if (pageNumPending !== null) {{
+                                                renderPage(pageNumPending);
+                                                pageNumPending = null;
+                                            }}
+                                        }});
                                     }});
-                                }});
                                 
-                                document.getElementById('page-num').textContent = num;
-                            }}
+                                    document.getElementById('page-num').textContent = num;
+                                }}
                             
-                            function queueRenderPage(num) {{
-                                if (pageRendering) {{
-                                    pageNumPending = num;
-                                }} else {{
-                                    renderPage(num);
+                                function queueRenderPage(num) {{
+                                    if (pageRendering) {{
+                                        pageNumPending = num;
+                                    }} else {{
+                                        renderPage(num);
+                                    }}
                                 }}
-                            }}
                             
-                            function onPrevPage() {{
-                                if (pageNum <= 1) return;
-                                pageNum--;
-                                queueRenderPage(pageNum);
-                            }}
+                                function onPrevPage() {{
+                                    if (pageNum <= 1) return;
+                                    pageNum--;
+                                    queueRenderPage(pageNum);
+                                }}
                             
-                            function onNextPage() {{
-                                if (pageNum >= pdfDoc.numPages) return;
-                                pageNum++;
-                                queueRenderPage(pageNum);
-                            }}
+                                function onNextPage() {{
+                                    if (pageNum >= pdfDoc.numPages) return;
+                                    pageNum++;
+                                    queueRenderPage(pageNum);
+                                }}
                             
-                            function onZoomIn() {{
-                                scale += 0.25;
-                                queueRenderPage(pageNum);
-                            }}
+                                function onZoomIn() {{
+                                    scale += 0.25;
+                                    queueRenderPage(pageNum);
+                                }}
                             
-                            function onZoomOut() {{
-                                if (scale <= 0.5) return;
-                                scale -= 0.25;
-                                queueRenderPage(pageNum);
-                            }}
+                                function onZoomOut() {{
+                                    if (scale <= 0.5) return;
+                                    scale -= 0.25;
+                                    queueRenderPage(pageNum);
+                                }}
                             
-                            document.getElementById('prev-page').addEventListener('click', onPrevPage);
-                            document.getElementById('next-page').addEventListener('click', onNextPage);
-                            document.getElementById('zoom-in').addEventListener('click', onZoomIn);
-                            document.getElementById('zoom-out').addEventListener('click', onZoomOut);
+                                document.getElementById('prev-page').addEventListener('click', onPrevPage);
+                                document.getElementById('next-page').addEventListener('click', onNextPage);
+                                document.getElementById('zoom-in').addEventListener('click', onZoomIn);
+                                document.getElementById('zoom-out').addEventListener('click', onZoomOut);
                             
-                            pdfjsLib.getDocument({{data: pdfBytes}}).promise.then(function(pdf) {{
-                                pdfDoc = pdf;
-                                document.getElementById('page-count').textContent = pdf.numPages;
-                                renderPage(pageNum);
-                            }});
-                        </script>
-                    </body>
-                    </html>
-                    '''
+                                pdfjsLib.getDocument({{data: pdfBytes}}).promise.then(function(pdf) {{
+                                    pdfDoc = pdf;
+                                    document.getElementById('page-count').textContent = pdf.numPages;
+                                    renderPage(pageNum);
+                                }});
+                            </script>
+                        </body>
+                        </html>
+                        '''
                     
-                    # Afficher le viewer avec composant HTML
-                    import streamlit.components.v1 as components
-                    components.html(pdf_viewer_html, height=850, scrolling=False)
+                        # Afficher le viewer avec composant HTML
+                        import streamlit.components.v1 as components
+                        components.html(pdf_viewer_html, height=850, scrolling=False)
                     
                 except Exception as e:
                     st.error(f"❌ Erreur d'affichage du PDF: {e}")
@@ -814,6 +883,9 @@ def render_character_viewer_old():
                     st.write(f"**Taille:** {len(char.content)} caractères")
 
 
+_MEMORY_ENTRY_TPL = "**Joueur:** {u}\n\n**Réponse:** {a}"
+
+
 def render_memory_display(mode: str):
     """Affiche la mémoire selon le mode"""
     if mode == "MJ immersif":
@@ -829,18 +901,37 @@ def render_memory_display(mode: str):
     
     st.markdown(f"### {title}")
     
-    # Afficher les derniers échanges
-    recent = memory.get_recent(6)
+    # Afficher les derniers échanges, du plus récent au plus ancien
+    recent = memory.get_recent(6, reverse=True)
+    
+    # Seuls les 3 derniers échanges sont rendus par défaut (le contenu des
+    # expanders repliés est quand même envoyé au navigateur)
+    show_all = st.session_state.get('show_all_memory', False)
+    shown = recent if show_all else recent[:3]
+    
+    total = len(memory)
+    for i, (user, assistant, timestamp) in enumerate(shown):
+        with st.expander(f"Échange {total - i}", expanded=(i == 0)):
+            if len(assistant) > 500:
+                assistant = assistant[:500] + "..."
+            st.markdown(_MEMORY_ENTRY_TPL.format(u=user, a=assistant))
+            st.caption(f"_Horodatage: {timestamp}_")
     
-    for i, entry in enumerate(reversed(recent), 1):
-        with st.expander(f"Échange {len(memory) - i + 1}", expanded=(i == 1)):
-            st.markdown(f"**Joueur:** {entry.user}")
-            st.markdown(f"**Réponse:** {entry.assistant[:500]}{'...' if len(entry.assistant) > 500 else ''}")
-            st.caption(f"_Horodatage: {entry.timestamp}_")
+    if len(shown) < len(recent):
+        if st.button(f"⬇️ Afficher les {len(recent) - len(shown)} échanges précédents", key="show_all_memory_btn"):
+            st.session_state.show_all_memory = True
+            st.rerun()
     
     # Bouton pour effacer
     if st.button("🗑️ Effacer l'historique", key="clear_memory"):
         memory.clear()
+        # Nouvel instantané auto_save : tronque le journal qui rejouerait l'historique effacé
+        st.session_state.session_manager.save_session(
+            "auto_save",
+            st.session_state.mj_memory,
+            st.session_state.encyclo_memory,
+            metadata=st.session_state.session_manager.AUTO_SAVE_METADATA
+        )
         if mode == "MJ immersif":
             st.session_state.timeline.clear()
         st.rerun()
@@ -854,59 +945,68 @@ def render_memory_display(mode: str):
 # LOGIQUE PRINCIPALE - Chargement intelligent
 # =============================================================================
 
+@st.cache_data(ttl=30, show_spinner=False)
+def _corpus_verdict(pdf_root_str: str, db_dir_str: str, metadata_mtime: float):
+    """Verdict de check_if_reload_needed, réutilisé par les reruns pendant 30 s"""
+    from core.rag import DocumentExtractor
+
+    return DocumentExtractor.check_if_reload_needed(Path(pdf_root_str), Path(db_dir_str))
+
+
 def check_corpus_changes(config):
     """Vérifie si le corpus a changé"""
-    from core.rag import DocumentExtractor
-    
     pdf_root = config['paths']['pdf_root']
     db_dir = config['paths']['db_dir']
     
-    needs_reload, reason = DocumentExtractor.check_if_reload_needed(pdf_root, db_dir)
+    # La date des métadonnées fait partie de la clé : une reconstruction
+    # de la base invalide le verdict sans attendre l'expiration du TTL
+    try:
+        metadata_mtime = (db_dir / "corpus_metadata.json").stat().st_mtime
+    except OSError:
+        metadata_mtime = 0.0
     
-    return needs_reload, reason
+    return _corpus_verdict(str(pdf_root), str(db_dir), metadata_mtime)
+
+
+@st.cache_data(persist="disk", show_spinner=False)
+def _extract_documents(pdf_root_str: str, max_pages, corpus_hash: str, text_cache_str: Optional[str] = None):
+    """Extraction des documents persistée sur disque (survit aux redémarrages)
+
+    corpus_hash (noms, tailles, dates de modification) fait partie de la clé :
+    tout changement du corpus invalide l'entrée. Les PDFs inchangés sont alors
+    relus depuis le cache texte par fichier (paths.text_cache).
+    """
+    cache_dir = Path(text_cache_str) if text_cache_str else None
+    return DocumentExtractor.extract_from_directory(Path(pdf_root_str), max_pages, cache_dir=cache_dir)
 
 
 @st.cache_resource(show_spinner=False)
 def load_documents(_config):
-    """Charge les documents (cached) avec progression"""
-    extractor = DocumentExtractor()
+    """Charge les documents (cached) avec progression
+
+    Retourne (documents, total_chars).
+    """
+    pdf_root = _config['paths']['pdf_root']
     max_pages = _config['advanced'].get('max_pdf_pages')
+    corpus_hash, file_metadata = DocumentExtractor.calculate_directory_hash(pdf_root)
     
     # Créer un placeholder principal unique
     main_container = st.empty()
     
     with main_container.container():
         st.markdown("### 📄 Lecture des documents")
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        st.info(f"📖 {len(file_metadata)} fichiers — cache disque réutilisé si le corpus est inchangé...")
     
-    def progress_callback(current, total, message):
-        """Callback pour afficher la progression"""
-        if total > 0:
-            progress = current / total
-            with main_container.container():
-                st.markdown("### 📄 Lecture des documents")
-                progress_bar.progress(progress)
-                status_text.info(f"📖 Fichier {current}/{total} : {message}")
-    
-    documents = extractor.extract_from_directory(
-        _config['paths']['pdf_root'], 
-        max_pages,
-        progress_callback=progress_callback
-    )
-    
-    # Message de succès
-    if documents:
-        with main_container.container():
-            st.markdown("### ✅ Documents chargés")
-            st.success(f"🎉 {len(documents)} fichiers extraits avec succès")
-        import time
-        time.sleep(1.5)
+    text_cache = _config['paths'].get('text_cache')
+    documents = _extract_documents(str(pdf_root), max_pages, corpus_hash,
+                                   str(text_cache) if text_cache else None)
+    # Calculé une fois ici (sous le cache) plutôt qu'à chaque affichage des statistiques
+    total_chars = sum(len(doc["content"]) for doc in documents.values())
     
     # Nettoyer complètement
     main_container.empty()
     
-    return documents
+    return documents, total_chars
 
 
 @st.cache_resource(show_spinner=False)
@@ -937,15 +1037,6 @@ def build_vectorstore(_config, _documents):
         progress_callback=progress_callback
     )
     
-    # Message final
-    if _documents:
-        num_docs = len(_documents)
-        with main_container.container():
-            st.markdown("### ✅ Base vectorielle prête !")
-            st.success(f"🎉 {num_docs} documents indexés et prêts à l'emploi")
-        import time
-        time.sleep(2)
-    
     # Nettoyer complètement
     main_container.empty()
     
@@ -956,7 +1047,6 @@ def build_vectorstore(_config, _documents):
 def load_vectorstore_only(_config):
     """Charge uniquement la base vectorielle existante (ultra rapide)"""
     from core.rag import DocumentExtractor
-    from langchain_community.vectorstores import Chroma
     
     vector_store = VectorStore(_config)
     
@@ -967,10 +1057,7 @@ def load_vectorstore_only(_config):
         st.markdown("### ⚡ Chargement rapide")
         st.info("Utilisation de la base vectorielle existante...")
     
-    vectordb = Chroma(
-        persist_directory=str(_config['paths']['db_dir']),
-        embedding_function=vector_store.embeddings
-    )
+    vectordb = vector_store.load_existing(_config['paths']['db_dir'])
     
     # IMPORTANT: Créer les métadonnées si elles n'existent pas
     metadata_file = _config['paths']['db_dir'] / "corpus_metadata.json"
@@ -980,20 +1067,41 @@ def load_vectorstore_only(_config):
             st.info("Création des métadonnées de suivi...")
         DocumentExtractor.save_corpus_metadata(_config['paths']['pdf_root'], _config['paths']['db_dir'])
     
-    with main_container.container():
-        st.markdown("### ✅ Prêt")
-        st.success("Base vectorielle chargée (aucun rechargement nécessaire)")
-    
-    import time
-    time.sleep(1)
     main_container.empty()
     
     return vectordb
 
 
+@st.cache_resource(show_spinner=False)
+def _get_rag_chain(_config, enable_reranking: bool, rerank_model: str, use_cuda: bool):
+    """RAGChain partagée, indexée par les réglages du re-ranker.
+
+    Le CrossEncoder n'est ainsi chargé qu'une fois par combinaison de réglages,
+    et non plus à chaque requête.
+    """
+    return RAGChain(_config)
+
+
 def get_qa_chain(config, vectordb, model, mode, temp, top_p, k, show_sources, system_prompt, memory, short_memory, level, source_filter="rules_and_universe", query=""):
-    """Crée la chaîne QA (doit être recréée à chaque requête car contient la mémoire)"""
-    rag_chain = RAGChain(config)
+    """Crée la chaîne QA (recréée dès que la mémoire ou un réglage change)"""
+    rag_cfg = config['rag']
+    rag_chain = _get_rag_chain(
+        config,
+        rag_cfg.get('enable_reranking', False),
+        rag_cfg.get('rerank_model', 'BAAI/bge-reranker-v2-m3'),
+        rag_cfg.get('use_cuda', False),
+    )
+
+    # Retourner les sources si l'utilisateur veut voir les sources OU les chunks de debug
+    return_sources = st.session_state.get('show_sources', False) or st.session_state.get('show_debug_chunks', False)
+
+    # La chaîne embarque le prompt (mémoire comprise) : réutilisée telle quelle, retriever
+    # compris, si rien n'a changé depuis la requête précédente (rerun, question reposée)
+    chain_key = (id(vectordb), model, mode, temp, top_p, k, source_filter, return_sources,
+                 system_prompt, memory, short_memory, level)
+    cached = st.session_state.get("_qa_chain_last")
+    if cached is not None and cached[0] == chain_key:
+        return cached[1], rag_chain
 
     # Filtrer les sources selon le mode
     if mode == "Encyclopédique":
@@ -1025,9 +1133,6 @@ def get_qa_chain(config, vectordb, model, mode, temp, top_p, k, show_sources, sy
         # Mode MJ : tous les documents
         retriever = vectordb.as_retriever(search_kwargs={"k": k})
 
-    # Retourner les sources si l'utilisateur veut voir les sources OU les chunks de debug
-    return_sources = st.session_state.get('show_sources', False) or st.session_state.get('show_debug_chunks', False)
-
     qa_chain = rag_chain.create_qa_chain(
         retriever=retriever,
         model_name=model,
@@ -1041,27 +1146,34 @@ def get_qa_chain(config, vectordb, model, mode, temp, top_p, k, show_sources, sy
         level=level,
         query=query  # 🆕 Passer la query pour le re-ranking
     )
+    st.session_state._qa_chain_last = (chain_key, qa_chain)
 
     return qa_chain, rag_chain
 
 
 def process_query(query: str, config, mode: str, level: str, vectordb):
     """Traite une requête utilisateur"""
+    ss = st.session_state
+
+    # Requête vide : pas d'aller-retour RAG/LLM ni de statistique d'échec
+    if not query or not query.strip():
+        raise ValueError("Requête vide")
+
     try:
         # Prompt système
         system_prompt = config['prompts']['mj_system' if mode == "MJ immersif" else 'encyclo_system']
 
         # Préparer la mémoire selon le mode
         if mode == "MJ immersif":
-            memory = st.session_state.mj_memory
+            memory = ss.mj_memory
             memory_text = memory.format_for_prompt(n=config['memory']['short_memory_context'])
             short_memory_text = ""
             # Utiliser k_retrieval standard pour le mode MJ
-            k_value = st.session_state.k_retrieval
+            k_value = ss.k_retrieval
             # Température normale pour le mode MJ
-            temp_value = st.session_state.temperature
+            temp_value = ss.temperature
         else:
-            memory = st.session_state.encyclo_memory
+            memory = ss.encyclo_memory
             memory_text = ""
             short_memory_text = memory.format_for_prompt(
                 n=config['memory']['short_memory_context'],
@@ -1069,23 +1181,23 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
                 prefix_assistant="Réponse"
             )
             # Utiliser la valeur du slider pour le mode encyclopédique
-            k_value = st.session_state.get('encyclo_k_retrieval', config['rag'].get('k_retrieval_encyclo', 50))
+            k_value = ss.get('encyclo_k_retrieval', config['rag'].get('k_retrieval_encyclo', 50))
             # Température à 0 pour éviter les hallucinations et forcer la fidélité au contexte
             temp_value = 0.0
 
         # Récupérer le filtre de source pour le mode encyclopédique
-        source_filter = st.session_state.get('encyclo_source_filter', 'rules_and_universe')
+        source_filter = ss.get('encyclo_source_filter', 'rules_and_universe')
 
         # Créer la qa_chain avec tous les paramètres intégrés (y compris query pour re-ranking)
         qa_chain, _ = get_qa_chain(
             config=config,
             vectordb=vectordb,
-            model=st.session_state.current_model,
+            model=ss.current_model,
             mode=mode,
             temp=temp_value,
-            top_p=st.session_state.top_p,
+            top_p=ss.top_p,
             k=k_value,
-            show_sources=st.session_state.show_sources,
+            show_sources=ss.show_sources,
             system_prompt=system_prompt,
             memory=memory_text,
             short_memory=short_memory_text,
@@ -1131,7 +1243,7 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
         # Calculer la confiance basée sur les scores des documents
         if source_docs:
             scores = [doc.metadata.get("score", 0.5) for doc in source_docs]
-            confidence = sum(scores) / len(scores) if scores else 0.5
+            confidence = relevance_confidence(scores)
         else:
             confidence = 0.0
 
@@ -1143,40 +1255,99 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
         }
         
         # Enregistrer dans la mémoire
-        memory.add(query, result_obj['response'])
+        timestamp = memory.add(query, result_obj['response'])
         
         # Parser la réponse (mode MJ uniquement)
         if mode == "MJ immersif":
             parsed = ResponseParser.parse(result_obj['response'])
-            st.session_state.game_state.update_from_parsed(parsed)
-            st.session_state.timeline.append({
+            ss.game_state.update_from_parsed(parsed)
+            ss.timeline.append({
                 "query": query,
                 "response": result_obj['response'],
                 "timestamp": datetime.now().isoformat()
             })
         
         # Statistiques
-        if hasattr(st.session_state, 'statistics'):
-            st.session_state.statistics.record_query(success=True)
+        if hasattr(ss, 'statistics'):
+            ss.statistics.record_query(success=True)
         
-        # Auto-save
-        st.session_state.message_count += 1
-        if st.session_state.message_count % st.session_state.auto_save_interval == 0:
-            st.session_state.session_manager.save_session(
-                session_name="auto_save",
-                mj_memory=st.session_state.mj_memory,
-                encyclo_memory=st.session_state.encyclo_memory,
-                metadata={"auto_save": True}
-            )
+        # Auto-save : une ligne au journal de la session, instantané périodique
+        ss.message_count += 1
+        ss.session_manager.auto_save(
+            "auto_save",
+            "mj" if mode == "MJ immersif" else "encyclo",
+            {"user": query, "assistant": result_obj['response'], "timestamp": timestamp},
+            ss.mj_memory,
+            ss.encyclo_memory,
+            # Premier échange de l'exécution : l'instantané remplace le journal des
+            # exécutions précédentes ; ensuite un instantané tous les auto_save_interval
+            snapshot=ss.message_count == 1 or ss.message_count % ss.auto_save_interval == 0
+        )
         
         return result_obj
     
     except Exception as e:
-        if hasattr(st.session_state, 'statistics'):
-            st.session_state.statistics.record_query(success=False)
+        if hasattr(ss, 'statistics'):
+            ss.statistics.record_query(success=False)
         raise e
 
 
+def _read_corpus_file_count(config) -> int:
+    """Lit le nombre de documents indexés depuis corpus_metadata.json (0 si absent)"""
+    metadata_file = config['paths']['db_dir'] / "corpus_metadata.json"
+    if not metadata_file.exists():
+        return 0
+    try:
+        return read_json(metadata_file).get('total_files', 0)
+    except Exception:
+        return 0
+
+
+def _render_corpus_stats(config, documents, total_chars: int):
+    """Affiche les statistiques du corpus après une reconstruction"""
+    st.markdown("### 📊 Statistiques du corpus")
+    col_stat1, col_stat2, col_stat3 = st.columns(3)
+    with col_stat1:
+        st.metric("📄 Documents", len(documents), delta="Prêt", delta_color="normal")
+    with col_stat2:
+        st.metric("📝 Caractères", f"{total_chars:,}")
+    with col_stat3:
+        # Estimer le nombre de chunks
+        estimated_chunks = total_chars // config['rag']['chunk_size']
+        st.metric("🧩 Chunks estimés", f"~{estimated_chunks:,}")
+
+
+def _ensure_rag_ready(config):
+    """Charge le corpus et la base vectorielle au premier besoin.
+
+    Les loaders sont en @st.cache_resource : seul le premier appel paie
+    l'extraction PDF et les embeddings, les suivants sont instantanés.
+    """
+    needs_reload, reason = check_corpus_changes(config)
+
+    if needs_reload:
+        print(f"🔄 Rechargement nécessaire : {reason}")
+        documents, total_chars = load_documents(config)
+
+        if not documents:
+            st.error("❌ **Aucun document trouvé !**")
+            st.warning(f"Vérifie que des PDFs sont présents dans : `{config['paths']['pdf_root']}`")
+            st.info("💡 Dépose tes PDFs de règles dans ce dossier et relance l'application.")
+            st.stop()
+
+        vectordb = build_vectorstore(config, documents)
+        _render_corpus_stats(config, documents, total_chars)
+    else:
+        # Chargement rapide (base existe et corpus inchangé)
+        vectordb = load_vectorstore_only(config)
+
+    # Notification non bloquante, une fois par session
+    if not st.session_state.get('rag_ready'):
+        st.toast("Base vectorielle prête", icon="✅")
+    st.session_state.rag_ready = True
+    return vectordb
+
+
 # =============================================================================
 # MAIN
 # =============================================================================
@@ -1195,6 +1366,8 @@ def main():
 
     # Sidebar avec les fiches de personnages
     render_sidebar()
+    if not st.session_state.get('rag_ready'):
+        st.sidebar.caption("⏳ Base RAG non initialisée (chargée à la première requête)")
 
     # Layout principal - colonne large pour le contenu principal, colonne droite pour la config
     col_main, col_config = st.columns([4, 1])
@@ -1210,8 +1383,9 @@ def main():
         if 'first_query_sent' not in st.session_state:
             st.session_state.first_query_sent = False
 
-        # Chargement des documents et vectorstore - LOGIQUE INTELLIGENTE
-        # Masquer après la première requête pour gagner de l'espace
+        # État du corpus - CHARGEMENT DIFFÉRÉ
+        # Seule la vérification des changements (stat des fichiers) est faite ici ;
+        # extraction des documents et base vectorielle attendent la première requête
         if not st.session_state.first_query_sent:
             st.markdown("---")
 
@@ -1220,80 +1394,24 @@ def main():
             with col_load1:
                 st.markdown("## 📚")
             with col_load2:
-                st.markdown("## Chargement du corpus")
+                st.markdown("## Corpus")
 
             st.markdown("---")
 
-        # Vérifier si un rechargement est nécessaire
-        needs_reload, reason = check_corpus_changes(config)
-        
-        if needs_reload:
-            if not st.session_state.first_query_sent:
-                # Afficher pourquoi on recharge
-                st.warning(f"🔄 **Rechargement nécessaire** : {reason}")
-
-            # Chargement complet avec progression
-            documents = load_documents(config)
-
-            if not documents:
-                st.error("❌ **Aucun document trouvé !**")
-                st.warning(f"Vérifie que des PDFs sont présents dans : `{config['paths']['pdf_root']}`")
-                st.info("💡 Dépose tes PDFs de règles dans ce dossier et relance l'application.")
-                st.stop()
-
-            # Construction de la base vectorielle
-            vectordb = build_vectorstore(config, documents)
-        else:
-            # Chargement rapide (base existe et corpus inchangé)
-            if not st.session_state.first_query_sent:
-                st.success(f"✅ **{reason}** - Chargement rapide activé !")
-
-            # Charger uniquement la base vectorielle (ultra rapide)
-            vectordb = load_vectorstore_only(config)
-
-            # Lire les métadonnées pour afficher les stats
-            if not st.session_state.first_query_sent:
-                metadata_file = config['paths']['db_dir'] / "corpus_metadata.json"
-                if metadata_file.exists():
-                    try:
-                        with open(metadata_file, 'r', encoding='utf-8') as f:
-                            metadata = json.load(f)
-                            num_docs = metadata.get('total_files', 0)
-                            st.info(f"📊 Base vectorielle contient {num_docs} documents")
-                    except Exception:
-                        pass
-
-        # Afficher stats finales (uniquement si on a rechargé ET si c'est avant la première requête)
-        if not st.session_state.first_query_sent and needs_reload and 'documents' in locals():
-            st.markdown("---")
-            st.markdown("### 📊 Statistiques du corpus")
-            col_stat1, col_stat2, col_stat3 = st.columns(3)
-            with col_stat1:
-                st.metric("📄 Documents", len(documents), delta="Prêt", delta_color="normal")
-            with col_stat2:
-                total_chars = sum(len(content) for content in documents.values())
-                st.metric("📝 Caractères", f"{total_chars:,}")
-            with col_stat3:
-                # Estimer le nombre de chunks
-                estimated_chunks = total_chars // config['rag']['chunk_size']
-                st.metric("🧩 Chunks estimés", f"~{estimated_chunks:,}")
-
-        # Petite note discrète après la première requête
-        if st.session_state.first_query_sent:
-            # Lire le nombre de docs pour affichage compact
-            metadata_file = config['paths']['db_dir'] / "corpus_metadata.json"
-            num_docs = 0
-            if metadata_file.exists():
-                try:
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                        num_docs = metadata.get('total_files', 0)
-                except Exception:
-                    pass
-            st.caption(f"📚 Base vectorielle chargée ({num_docs} documents)")
+            needs_reload, reason = check_corpus_changes(config)
+            if needs_reload:
+                st.warning(f"🔄 **Rechargement nécessaire** : {reason} — la base sera construite à la première requête")
+            else:
+                st.success(f"✅ **{reason}** - Chargement rapide à la première requête")
+                num_docs = _read_corpus_file_count(config)
+                if num_docs:
+                    st.info(f"📊 Base vectorielle contient {num_docs} documents")
+        elif st.session_state.get('rag_ready'):
+            # Petite note discrète après la première requête
+            st.caption(f"📚 Base vectorielle chargée ({_read_corpus_file_count(config)} documents)")
 
         st.markdown("---")
-        
+
         # Zone d'interaction
         st.markdown("### 💬 Interaction")
         
@@ -1326,6 +1444,7 @@ def main():
         if submit and user_query and user_query.strip():
             with st.spinner("🤔 Le MJ réfléchit..."):
                 try:
+                    vectordb = _ensure_rag_ready(config)
                     result = process_query(
                         query=user_query,
                         config=config,
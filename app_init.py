@@ -5,6 +5,7 @@ Fonctions d'initialisation de l'application
 
 import os
 from pathlib import Path
+from typing import Optional
 import streamlit as st
 from core.rag import DocumentExtractor
 from core.memory import Memory
@@ -22,6 +23,13 @@ if _env_file.exists():
             os.environ.setdefault(_k.strip(), _v.strip())
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_ollama_installed() -> bool:
+    """Vérifie l'installation d'Ollama au plus une fois toutes les 5 minutes"""
+    from core.utils import validate_ollama_installation
+    return validate_ollama_installation()
+
+
 def init_app():
     """Initialise l'application"""
     st.set_page_config(
@@ -39,20 +47,22 @@ def init_app():
 
     config = load_config(config_path)
 
-    # Créer la structure de répertoires
-    for path in config['paths'].values():
-        if isinstance(path, Path):
+    # Créer la structure de répertoires (embedding_cache est un fichier, pas un dossier)
+    for key, path in config['paths'].items():
+        if isinstance(path, Path) and key != 'embedding_cache':
             path.mkdir(parents=True, exist_ok=True)
 
-    # Démarrer Ollama si nécessaire
-    from core.utils import ensure_ollama_running, validate_ollama_installation
-    if not validate_ollama_installation():
+    # Démarrer Ollama si nécessaire (une fois par session : inutile de sonder à chaque rerun)
+    from core.utils import ensure_ollama_running
+    if st.session_state.get('_ollama_ready'):
+        pass
+    elif not _cached_ollama_installed():
         st.warning("⚠️ Ollama ne semble pas installé ou accessible.")
     elif not ensure_ollama_running():
         st.error("❌ Impossible de démarrer Ollama. Vérifie ton installation.")
     else:
         # Déjà prêt ou vient d'être démarré — rien à signaler
-        pass
+        st.session_state._ollama_ready = True
 
     return config
 
@@ -79,6 +89,30 @@ def load_prompt(config: dict, key: str) -> str:
     return prompts_cfg.get(key, '')
 
 
+@st.cache_resource(show_spinner=False)
+def _get_memory(max_size: int, memory_file_str: str) -> Memory:
+    """Mémoire persistante partagée par processus (clé : taille max + fichier)
+
+    Une seule instance pour tous les onglets : « Tout effacer » ou le chargement
+    d'une session s'appliquent à tous. Les accès concurrents (un thread par
+    session Streamlit) sont sérialisés par le verrou interne de Memory.
+    """
+    return Memory(max_size=max_size, memory_file=Path(memory_file_str))
+
+
+@st.cache_resource(show_spinner=False)
+def _get_session_manager(save_dir_str: str):
+    """Gestionnaire de sessions partagé par processus"""
+    from core.memory import SessionManager
+    return SessionManager(Path(save_dir_str))
+
+
+@st.cache_resource(show_spinner=False)
+def _get_char_manager(char_dir_str: str) -> CharacterManager:
+    """Gestionnaire de personnages partagé par processus"""
+    return CharacterManager(Path(char_dir_str))
+
+
 def init_session_state(config):
     """Initialise le session state"""
     if 'initialized' not in st.session_state:
@@ -96,13 +130,11 @@ def init_session_state(config):
         mj_file = paths['memory_dir'] / "mj_memory.json"
         encyclo_file = paths['memory_dir'] / "encyclo_memory.json"
 
-        st.session_state.mj_memory = Memory(
-            max_size=config['memory']['max_mj_memory'],
-            memory_file=mj_file
+        st.session_state.mj_memory = _get_memory(
+            config['memory']['max_mj_memory'], str(mj_file)
         )
-        st.session_state.encyclo_memory = Memory(
-            max_size=config['memory']['max_encyclo_memory'],
-            memory_file=encyclo_file
+        st.session_state.encyclo_memory = _get_memory(
+            config['memory']['max_encyclo_memory'], str(encyclo_file)
         )
 
         # État du jeu
@@ -117,12 +149,10 @@ def init_session_state(config):
             st.session_state.statistics = Statistics()
 
         # Sessions
-        from core.memory import SessionManager
-        st.session_state.session_manager = SessionManager(paths['save_dir'])
+        st.session_state.session_manager = _get_session_manager(str(paths['save_dir']))
 
         # Personnages
-        from core.characters import CharacterManager
-        st.session_state.char_manager = CharacterManager(paths['char_dir'])
+        st.session_state.char_manager = _get_char_manager(str(paths['char_dir']))
 
         # Paramètres UI
         st.session_state.current_model = config['model']['default']
@@ -147,59 +177,68 @@ def init_session_state(config):
         st.session_state.initialized = True
 
 
-def check_corpus_changes(config):
-    """Vérifie si le corpus a changé"""
+@st.cache_data(ttl=30, show_spinner=False)
+def _corpus_verdict(pdf_root_str: str, db_dir_str: str, metadata_mtime: float):
+    """Verdict de check_if_reload_needed, réutilisé par les reruns pendant 30 s"""
     from core.rag import DocumentExtractor
 
+    return DocumentExtractor.check_if_reload_needed(Path(pdf_root_str), Path(db_dir_str))
+
+
+def check_corpus_changes(config):
+    """Vérifie si le corpus a changé"""
     pdf_root = config['paths']['pdf_root']
     db_dir = config['paths']['db_dir']
 
-    needs_reload, reason = DocumentExtractor.check_if_reload_needed(pdf_root, db_dir)
+    # La date des métadonnées fait partie de la clé : une reconstruction
+    # de la base invalide le verdict sans attendre l'expiration du TTL
+    try:
+        metadata_mtime = (db_dir / "corpus_metadata.json").stat().st_mtime
+    except OSError:
+        metadata_mtime = 0.0
+
+    return _corpus_verdict(str(pdf_root), str(db_dir), metadata_mtime)
 
-    return needs_reload, reason
+
+@st.cache_data(persist="disk", show_spinner=False)
+def _extract_documents(pdf_root_str: str, max_pages, corpus_hash: str, text_cache_str: Optional[str] = None):
+    """Extraction des documents persistée sur disque (survit aux redémarrages)
+
+    corpus_hash (noms, tailles, dates de modification) fait partie de la clé :
+    tout changement du corpus invalide l'entrée. Les PDFs inchangés sont alors
+    relus depuis le cache texte par fichier (paths.text_cache).
+    """
+    cache_dir = Path(text_cache_str) if text_cache_str else None
+    return DocumentExtractor.extract_from_directory(Path(pdf_root_str), max_pages, cache_dir=cache_dir)
 
 
 @st.cache_resource(show_spinner=False)
 def load_documents(_config):
-    """Charge les documents (cached) avec progression"""
-    extractor = DocumentExtractor()
+    """Charge les documents (cached) avec progression
+
+    Retourne (documents, total_chars).
+    """
+    pdf_root = _config['paths']['pdf_root']
     max_pages = _config['advanced'].get('max_pdf_pages')
+    corpus_hash, file_metadata = DocumentExtractor.calculate_directory_hash(pdf_root)
 
     # Créer un placeholder principal unique
     main_container = st.empty()
 
     with main_container.container():
         st.markdown("### 📄 Lecture des documents")
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-
-    def progress_callback(current, total, message):
-        """Callback pour afficher la progression"""
-        if total > 0:
-            progress = current / total
-            with main_container.container():
-                st.markdown("### 📄 Lecture des documents")
-                progress_bar.progress(progress)
-                status_text.info(f"📖 Fichier {current}/{total} : {message}")
-
-    documents = extractor.extract_from_directory(
-        _config['paths']['pdf_root'],
-        max_pages,
-        progress_callback=progress_callback
-    )
+        st.info(f"📖 {len(file_metadata)} fichiers — cache disque réutilisé si le corpus est inchangé...")
 
-    # Message de succès
-    if documents:
-        with main_container.container():
-            st.markdown("### ✅ Documents chargés")
-            st.success(f"🎉 {len(documents)} fichiers extraits avec succès")
-        import time
-        time.sleep(1.5)
+    text_cache = _config['paths'].get('text_cache')
+    documents = _extract_documents(str(pdf_root), max_pages, corpus_hash,
+                                   str(text_cache) if text_cache else None)
+    # Calculé une fois ici (sous le cache) plutôt qu'à chaque affichage des statistiques
+    total_chars = sum(len(doc["content"]) for doc in documents.values())
 
     # Nettoyer complètement
     main_container.empty()
 
-    return documents
+    return documents, total_chars
 
 
 @st.cache_resource(show_spinner=False)
@@ -232,15 +271,6 @@ def build_vectorstore(_config, _documents):
         progress_callback=progress_callback
     )
 
-    # Message final
-    if _documents:
-        num_docs = len(_documents)
-        with main_container.container():
-            st.markdown("### ✅ Base vectorielle prête !")
-            st.success(f"🎉 {num_docs} documents indexés et prêts à l'emploi")
-        import time
-        time.sleep(2)
-
     # Nettoyer complètement
     main_container.empty()
 
@@ -251,7 +281,6 @@ def build_vectorstore(_config, _documents):
 def load_vectorstore_only(_config):
     """Charge uniquement la base vectorielle existante (ultra rapide)"""
     from core.rag import VectorStore
-    from langchain_chroma import Chroma
 
     vector_store = VectorStore(_config)
 
@@ -262,14 +291,11 @@ def load_vectorstore_only(_config):
         st.markdown("### ⚡ Chargement rapide")
         st.info("Utilisation de la base vectorielle existante...")
 
-    vectordb = Chroma(
-        persist_directory=str(_config['paths']['db_dir']),
-        embedding_function=vector_store.embeddings
-    )
+    vectordb = vector_store.load_existing(_config['paths']['db_dir'])
 
     # Vérifier que la base contient bien des vecteurs
     try:
-        count = vectordb._collection.count()
+        count = vector_store.count()
         if count == 0:
             main_container.empty()
             return None  # Force un rebuild complet
@@ -284,12 +310,6 @@ def load_vectorstore_only(_config):
             st.info("Création des métadonnées de suivi...")
         DocumentExtractor.save_corpus_metadata(_config['paths']['pdf_root'], _config['paths']['db_dir'])
 
-    with main_container.container():
-        st.markdown("### ✅ Prêt")
-        st.success("Base vectorielle chargée (aucun rechargement nécessaire)")
-
-    import time
-    time.sleep(1)
     main_container.empty()
 
     return vectordb
@@ -325,46 +345,91 @@ def _get_bm25_retriever(_db_dir):
         return None
 
 
+@st.cache_resource(show_spinner=False)
+def _get_rag_chain(_config, enable_reranking: bool, rerank_model: str, use_cuda: bool):
+    """RAGChain partagée, indexée par les réglages du re-ranker.
+
+    Le CrossEncoder n'est ainsi chargé qu'une fois par combinaison de réglages,
+    et non plus à chaque requête.
+    """
+    from core.rag import RAGChain
+    return RAGChain(_config)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _get_chat_llm(model: str, temperature: float, top_p: Optional[float] = None,
+                  num_ctx: Optional[int] = None, num_predict: Optional[int] = None):
+    """Client ChatOllama partagé par jeu de paramètres (pas de reconstruction à chaque tour)"""
+    from langchain_ollama import ChatOllama
+    kwargs = {"top_p": top_p, "num_ctx": num_ctx, "num_predict": num_predict}
+    return ChatOllama(model=model, temperature=temperature,
+                      **{k: v for k, v in kwargs.items() if v is not None})
+
+
 def get_qa_chain(config, vectordb, model, mode, temp, top_p, k, show_sources, system_prompt, memory, short_memory, level, source_filter="rules_and_universe", query=""):
-    """Crée la chaîne QA (doit être recréée à chaque requête car contient la mémoire)"""
-    from core.rag import RAGChain, BM25_AVAILABLE
-
-    rag_chain = RAGChain(config)
-
-    # Retriever vectoriel (avec filtre catégorie si mode encyclopédique)
-    if mode == "Encyclopédique":
-        if source_filter == "rules_only":
-            filter_config = {"category": {"$in": ["rules", "unknown"]}}
-        elif source_filter == "universe_only":
-            filter_config = {"category": {"$in": ["universe_book", "novel"]}}
-        else:  # rules_and_universe
-            filter_config = {"category": {"$in": ["rules", "universe_book", "unknown"]}}
-
-        vector_retriever = vectordb.as_retriever(
-            search_kwargs={"k": k, "filter": filter_config}
-        )
-    else:
-        vector_retriever = vectordb.as_retriever(search_kwargs={"k": k})
-
-    # Hybrid search : combiner BM25 (mots-clés) + vectoriel (sémantique)
-    # Le BM25Retriever est mis en cache — pas reconstruit à chaque requête
-    retriever = vector_retriever
-    if BM25_AVAILABLE:
-        bm25_retriever = _get_bm25_retriever(config['paths']['db_dir'])
-        if bm25_retriever:
-            try:
-                from core.rag import SimpleEnsembleRetriever
-                bm25_retriever.k = k  # Ajuster k sans reconstruire l'index
-                retriever = SimpleEnsembleRetriever(
-                    retrievers=[bm25_retriever, vector_retriever],
-                    weights=[0.4, 0.6]
-                )
-            except Exception as e:
-                print(f"⚠️ Hybrid search désactivé ({e}), fallback vectoriel")
+    """Crée la chaîne QA (retriever et chaîne mis en cache dans la session)"""
+    from core.rag import BM25_AVAILABLE, SimpleEnsembleRetriever
+
+    rag_cfg = config['rag']
+    rag_chain = _get_rag_chain(
+        config,
+        rag_cfg.get('enable_reranking', False),
+        rag_cfg.get('rerank_model', 'BAAI/bge-reranker-v2-m3'),
+        rag_cfg.get('use_cuda', False),
+    )
+
+    # Retriever réutilisé tant que la base, le mode, le filtre et k ne changent pas
+    retriever_key = (vectordb, mode, source_filter if mode == "Encyclopédique" else None, k)
+    retriever_cache = st.session_state.setdefault("_retriever_cache", {})
+    retriever = retriever_cache.get(retriever_key)
+    if retriever is None:
+        # Retriever vectoriel (avec filtre catégorie si mode encyclopédique)
+        if mode == "Encyclopédique":
+            if source_filter == "rules_only":
+                filter_config = {"category": {"$in": ["rules", "unknown"]}}
+            elif source_filter == "universe_only":
+                filter_config = {"category": {"$in": ["universe_book", "novel"]}}
+            else:  # rules_and_universe
+                filter_config = {"category": {"$in": ["rules", "universe_book", "unknown"]}}
+
+            vector_retriever = vectordb.as_retriever(
+                search_kwargs={"k": k, "filter": filter_config}
+            )
+        else:
+            vector_retriever = vectordb.as_retriever(search_kwargs={"k": k})
+
+        # Hybrid search : combiner BM25 (mots-clés) + vectoriel (sémantique)
+        # Le BM25Retriever est mis en cache — pas reconstruit à chaque requête
+        retriever = vector_retriever
+        if BM25_AVAILABLE:
+            bm25_retriever = _get_bm25_retriever(config['paths']['db_dir'])
+            if bm25_retriever:
+                try:
+                    bm25_retriever.k = k  # Ajuster k sans reconstruire l'index
+                    retriever = SimpleEnsembleRetriever(
+                        retrievers=[bm25_retriever, vector_retriever],
+                        weights=[0.4, 0.6]
+                    )
+                except Exception as e:
+                    print(f"⚠️ Hybrid search désactivé ({e}), fallback vectoriel")
+
+        if len(retriever_cache) >= 8:
+            retriever_cache.pop(next(iter(retriever_cache)))
+        retriever_cache[retriever_key] = retriever
+    elif isinstance(retriever, SimpleEnsembleRetriever):
+        # Le BM25 est partagé par tous les retrievers en cache : réaligner son k
+        retriever.retrievers[0].k = k
 
     # Retourner les sources si l'utilisateur veut voir les sources OU les chunks de debug
     return_sources = st.session_state.get('show_sources', False) or st.session_state.get('show_debug_chunks', False)
 
+    # La chaîne embarque le prompt (mémoire comprise) : réutilisée si rien n'a changé
+    # depuis la requête précédente (rerun, question reposée, bouton d'historique)
+    chain_key = (retriever_key, model, mode, temp, top_p, return_sources, system_prompt, memory, short_memory, level)
+    cached = st.session_state.get("_qa_chain_last")
+    if cached is not None and cached[0] == chain_key:
+        return cached[1], rag_chain
+
     qa_chain = rag_chain.create_qa_chain(
         retriever=retriever,
         model_name=model,
@@ -378,6 +443,7 @@ def get_qa_chain(config, vectordb, model, mode, temp, top_p, k, show_sources, sy
         level=level,
         query=query  # 🆕 Passer la query pour le re-ranking
     )
+    st.session_state._qa_chain_last = (chain_key, qa_chain)
 
     return qa_chain, rag_chain
 
@@ -395,8 +461,8 @@ def _load_glossary() -> dict:
         glossary_path = Path("prompts/glossary.json")
         if glossary_path.exists():
             try:
-                import json as _json
-                data = _json.loads(glossary_path.read_text(encoding="utf-8"))
+                from core.utils import read_json
+                data = read_json(glossary_path)
                 _GLOSSARY_CACHE = data.get("mappings", {})
                 print(f"📖 Glossaire chargé : {len(_GLOSSARY_CACHE)} termes ({glossary_path})")
             except Exception as _e:
@@ -444,10 +510,9 @@ def _expand_query_with_llm(query: str, model_name: str) -> str:
     vocabulaires dans BM25.
     """
     try:
-        from langchain_ollama import ChatOllama
         from langchain_core.messages import SystemMessage, HumanMessage
 
-        llm = ChatOllama(model=model_name, temperature=0.0, num_predict=100)
+        llm = _get_chat_llm(model_name, 0.0, num_predict=100)
         messages = [
             SystemMessage(content=(
                 "Tu es expert du jeu de rôle 'Les Lames du Cardinal'. "
@@ -485,23 +550,45 @@ def _expand_query(query: str, model_name: str) -> str:
     return _expand_query_with_llm(query, model_name)
 
 
+def _stream_response(runnable, inputs):
+    """Affiche la réponse au fil des tokens ; retourne (texte complet, response_metadata)"""
+    from core.rag import RAGChain
+
+    meta = {}
+    tokens = RAGChain.stream(runnable, inputs, meta)
+    write_stream = getattr(st, "write_stream", None)
+    if write_stream is not None:
+        response_text = write_stream(tokens)
+    else:
+        response_text = "".join(tokens)
+    if not isinstance(response_text, str):
+        response_text = "".join(str(t) for t in response_text)
+    return response_text, meta
+
+
 def process_query(query: str, config, mode: str, level: str, vectordb):
     """Traite une requête utilisateur"""
+    ss = st.session_state
+
+    # Requête vide : pas d'aller-retour RAG/LLM ni de statistique d'échec
+    if not query or not query.strip():
+        raise ValueError("Requête vide")
+
     try:
         # Prompt système
         system_prompt = load_prompt(config, 'mj_system' if mode == "MJ immersif" else 'encyclo_system')
 
         # Préparer la mémoire selon le mode
         if mode == "MJ immersif":
-            memory = st.session_state.mj_memory
+            memory = ss.mj_memory
             memory_text = memory.format_for_prompt(n=config['memory']['short_memory_context'])
             short_memory_text = ""
             # Utiliser k_retrieval standard pour le mode MJ
-            k_value = st.session_state.k_retrieval
+            k_value = ss.k_retrieval
             # Température normale pour le mode MJ
-            temp_value = st.session_state.temperature
+            temp_value = ss.temperature
         else:
-            memory = st.session_state.encyclo_memory
+            memory = ss.encyclo_memory
             memory_text = ""
             short_memory_text = memory.format_for_prompt(
                 n=config['memory']['short_memory_context'],
@@ -509,25 +596,18 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
                 prefix_assistant="Réponse"
             )
             # Utiliser la valeur du slider pour le mode encyclopédique
-            k_value = st.session_state.get('encyclo_k_retrieval', config['rag'].get('k_retrieval_encyclo', 50))
+            k_value = ss.get('encyclo_k_retrieval', config['rag'].get('k_retrieval_encyclo', 50))
             # Température à 0 pour éviter les hallucinations et forcer la fidélité au contexte
             temp_value = 0.0
 
         # ── Mode MJ immersif : chemin direct sans RAG ──────────────────────────
         if mode == "MJ immersif":
-            from langchain_ollama import ChatOllama
             from langchain_core.messages import SystemMessage, HumanMessage
 
-            model_name = st.session_state.current_model
+            model_name = ss.current_model
             num_ctx = config['model'].get('num_ctx', 32768)
             num_predict = config['model'].get('num_predict', 2048)
-            llm = ChatOllama(
-                model=model_name,
-                temperature=temp_value,
-                top_p=st.session_state.top_p,
-                num_ctx=num_ctx,
-                num_predict=num_predict,
-            )
+            llm = _get_chat_llm(model_name, temp_value, ss.top_p, num_ctx, num_predict)
 
             messages = [SystemMessage(content=system_prompt)]
             if memory_text.strip():
@@ -537,12 +617,9 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
             import time as _time
             import re as _re
             _t0 = _time.time()
-            result = llm.invoke(messages)
+            response_text, _meta = _stream_response(llm, messages)
             _elapsed = _time.time() - _t0
 
-            _meta = getattr(result, 'response_metadata', {}) or {}
-            response_text = result.content if hasattr(result, 'content') else str(result)
-
             if '<think>' in response_text:
                 after_think = _re.sub(r'<think>.*?</think>', '', response_text, flags=_re.DOTALL).strip()
                 response_text = after_think if after_think else response_text
@@ -557,33 +634,36 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
                 "cited_sources": [],
             }
 
-            memory.add(query, response_text)
+            timestamp = memory.add(query, response_text)
 
             from datetime import datetime
             from core.parser import ResponseParser
             parsed = ResponseParser.parse(response_text)
-            st.session_state.game_state.update_from_parsed(parsed)
-            st.session_state.timeline.append({
+            ss.game_state.update_from_parsed(parsed)
+            ss.timeline.append({
                 "query": query,
                 "response": response_text,
                 "timestamp": datetime.now().isoformat(),
                 "mode": mode,
             })
-            if hasattr(st.session_state, 'statistics'):
-                st.session_state.statistics.record_query(success=True)
-            st.session_state.message_count += 1
-            if st.session_state.message_count % st.session_state.auto_save_interval == 0:
-                st.session_state.session_manager.save_session(
-                    session_name="auto_save",
-                    mj_memory=st.session_state.mj_memory,
-                    encyclo_memory=st.session_state.encyclo_memory,
-                    metadata={"auto_save": True}
-                )
+            if hasattr(ss, 'statistics'):
+                ss.statistics.record_query(success=True)
+            ss.message_count += 1
+            ss.session_manager.auto_save(
+                "auto_save",
+                "mj" if mode == "MJ immersif" else "encyclo",
+                {"user": query, "assistant": result_obj['response'], "timestamp": timestamp},
+                ss.mj_memory,
+                ss.encyclo_memory,
+                # Premier échange de l'exécution : l'instantané remplace le journal des
+                # exécutions précédentes ; ensuite un instantané tous les auto_save_interval
+                snapshot=ss.message_count == 1 or ss.message_count % ss.auto_save_interval == 0
+            )
             return result_obj
 
         # ── Mode Encyclopédique : chemin RAG ───────────────────────────────────
         # Récupérer le filtre de source pour le mode encyclopédique
-        source_filter = st.session_state.get('encyclo_source_filter', 'rules_and_universe')
+        source_filter = ss.get('encyclo_source_filter', 'rules_and_universe')
 
         # Encyclopédique : two-phase retrieval (large fetch → re-rank CrossEncoder → k_final au LLM)
         # MJ immersif : retrieval direct avec k_value
@@ -595,12 +675,12 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
         qa_chain, rag_chain = get_qa_chain(
             config=config,
             vectordb=vectordb,
-            model=st.session_state.current_model,
+            model=ss.current_model,
             mode=mode,
             temp=temp_value,
-            top_p=st.session_state.top_p,
+            top_p=ss.top_p,
             k=k_fetch,
-            show_sources=st.session_state.show_sources,
+            show_sources=ss.show_sources,
             system_prompt=system_prompt,
             memory=memory_text,
             short_memory=short_memory_text,
@@ -688,16 +768,17 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
         # Automatique, sans maintenance manuelle. Utilisé uniquement pour le retrieval.
         _qe_enabled = config.get('rag', {}).get('enable_query_expansion', True)
         if mode == "Encyclopédique" and _qe_enabled:
-            _retrieval_query = _expand_query(query, st.session_state.current_model)
+            _retrieval_query = _expand_query(query, ss.current_model)
         else:
             _retrieval_query = query
 
         # Score de pertinence réel via Chroma (0=hors-sujet, 1=parfait)
+        from core.rag import relevance_confidence
         confidence = 0.0
         try:
             scored_docs = vectordb.similarity_search_with_relevance_scores(_retrieval_query, k=5)
             if scored_docs:
-                confidence = sum(s for _, s in scored_docs) / len(scored_docs)
+                confidence = relevance_confidence([s for _, s in scored_docs])
                 print(f"📊 Scores de pertinence : {[round(s,2) for _,s in scored_docs[:3]]}")
         except Exception:
             pass
@@ -707,7 +788,7 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
 
         # Filtrer par catégorie APRÈS retrieval (le BM25 n'a pas de filtre natif)
         if mode == "Encyclopédique":
-            _sf = st.session_state.get('encyclo_source_filter', 'rules_and_universe')
+            _sf = ss.get('encyclo_source_filter', 'rules_and_universe')
             if _sf == "rules_only":
                 _allowed = {"rules", "unknown"}
             elif _sf == "universe_only":
@@ -768,24 +849,22 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
         import time as _time
         import re as _re
         _t0 = _time.time()
-        result = qa_chain["chain"].invoke({"context": context_text, "question": _query_to_use})
+        # 1. Réponse streamée token par token (premier token visible immédiatement)
+        response_text, _meta = _stream_response(
+            qa_chain["chain"], {"context": context_text, "question": _query_to_use}
+        )
         _elapsed = _time.time() - _t0
 
-        _meta = getattr(result, 'response_metadata', {}) or {}
         _tokens_in = _meta.get('prompt_eval_count', 0)
         _tokens_out = _meta.get('eval_count', 0)
 
-        # 1. Récupérer le contenu brut
-        if hasattr(result, 'content'):
-            response_text = result.content or ""
-        else:
-            response_text = str(result)
-
-        # 2. Si vide, chercher dans additional_kwargs (certaines versions de langchain-ollama
-        #    placent le contenu des modèles "thinking" dans ce champ plutôt que dans content)
-        if not response_text.strip() and hasattr(result, 'additional_kwargs'):
-            ak = result.additional_kwargs
+        # 2. Si vide, relancer sans streaming pour chercher dans additional_kwargs (certaines
+        #    versions de langchain-ollama y placent le contenu des modèles "thinking")
+        if not response_text.strip():
+            result = qa_chain["chain"].invoke({"context": context_text, "question": _query_to_use})
+            ak = getattr(result, 'additional_kwargs', {}) or {}
             response_text = (
+                getattr(result, 'content', '') or
                 ak.get('thinking') or ak.get('reasoning_content') or ak.get('think') or ""
             ).strip()
             if response_text:
@@ -850,15 +929,15 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
         }
 
         # Enregistrer dans la mémoire
-        memory.add(query, result_obj['response'])
+        timestamp = memory.add(query, result_obj['response'])
 
         # Parser la réponse + alimenter la timeline
         from datetime import datetime
         if mode == "MJ immersif":
             from core.parser import ResponseParser
             parsed = ResponseParser.parse(result_obj['response'])
-            st.session_state.game_state.update_from_parsed(parsed)
-        st.session_state.timeline.append({
+            ss.game_state.update_from_parsed(parsed)
+        ss.timeline.append({
             "query": query,
             "response": result_obj['response'],
             "timestamp": datetime.now().isoformat(),
@@ -866,29 +945,32 @@ def process_query(query: str, config, mode: str, level: str, vectordb):
         })
 
         # Statistiques
-        if hasattr(st.session_state, 'statistics'):
-            st.session_state.statistics.record_query(success=True)
-
-        # Auto-save
-        st.session_state.message_count += 1
-        if st.session_state.message_count % st.session_state.auto_save_interval == 0:
-            st.session_state.session_manager.save_session(
-                session_name="auto_save",
-                mj_memory=st.session_state.mj_memory,
-                encyclo_memory=st.session_state.encyclo_memory,
-                metadata={"auto_save": True}
-            )
+        if hasattr(ss, 'statistics'):
+            ss.statistics.record_query(success=True)
+
+        # Auto-save : une ligne au journal de la session, instantané périodique
+        ss.message_count += 1
+        ss.session_manager.auto_save(
+            "auto_save",
+            "mj" if mode == "MJ immersif" else "encyclo",
+            {"user": query, "assistant": result_obj['response'], "timestamp": timestamp},
+            ss.mj_memory,
+            ss.encyclo_memory,
+            # Premier échange de l'exécution : l'instantané remplace le journal des
+            # exécutions précédentes ; ensuite un instantané tous les auto_save_interval
+            snapshot=ss.message_count == 1 or ss.message_count % ss.auto_save_interval == 0
+        )
 
         return result_obj
 
     except Exception as e:
-        if hasattr(st.session_state, 'statistics'):
-            st.session_state.statistics.record_query(success=False)
+        if hasattr(ss, 'statistics'):
+            ss.statistics.record_query(success=False)
 
         err_str = str(e)
         # Crash VRAM / llama-server killed
         if "CUDA error" in err_str or "llama-server process has terminated" in err_str or "ResponseError" in type(e).__name__:
-            model = st.session_state.get('current_model', '?')
+            model = ss.get('current_model', '?')
             raise RuntimeError(
                 f"💥 **Mémoire GPU insuffisante** — le modèle `{model}` a manqué de VRAM "
                 f"pour cette génération.\n\n"
@@ -1090,6 +1172,308 @@ def _find_pdf_path(filename: str, config: dict) -> str:
     return None
 
 
+def _read_corpus_file_count(config) -> int:
+    """Lit le nombre de documents indexés depuis corpus_metadata.json (0 si absent)"""
+    metadata_file = config['paths']['db_dir'] / "corpus_metadata.json"
+    if not metadata_file.exists():
+        return 0
+    try:
+        from core.utils import read_json
+        return read_json(metadata_file).get('total_files', 0)
+    except Exception:
+        return 0
+
+
+def _render_corpus_stats(config, documents, total_chars: int):
+    """Affiche les statistiques du corpus après une reconstruction"""
+    st.markdown("### 📊 Statistiques du corpus")
+    col_stat1, col_stat2, col_stat3 = st.columns(3)
+    with col_stat1:
+        st.metric("📄 Documents", len(documents), delta="Prêt", delta_color="normal")
+    with col_stat2:
+        st.metric("📝 Caractères", f"{total_chars:,}")
+    with col_stat3:
+        # Estimer le nombre de chunks
+        estimated_chunks = total_chars // config['rag']['chunk_size']
+        st.metric("🧩 Chunks estimés", f"~{estimated_chunks:,}")
+
+
+def _ensure_rag_ready(config):
+    """Charge le corpus et la base vectorielle au premier besoin.
+
+    Les loaders sont en @st.cache_resource : seul le premier appel paie
+    l'extraction PDF et les embeddings, les suivants sont instantanés.
+    """
+    needs_reload, reason = check_corpus_changes(config)
+
+    if needs_reload:
+        print(f"🔄 Rechargement nécessaire : {reason}")
+        documents, total_chars = load_documents(config)
+
+        if not documents:
+            st.error("❌ **Aucun document trouvé !**")
+            st.warning(f"Vérifie que des PDFs sont présents dans : `{config['paths']['pdf_root']}`")
+            st.info("💡 Dépose tes PDFs de règles dans ce dossier et relance l'application.")
+            st.stop()
+
+        vectordb = build_vectorstore(config, documents)
+        _render_corpus_stats(config, documents, total_chars)
+    else:
+        # Chargement rapide (base existe et corpus inchangé)
+        vectordb = load_vectorstore_only(config)
+
+        # Si la base est vide (0 vecteurs), forcer un rebuild complet
+        if vectordb is None:
+            st.warning("⚠️ Base vectorielle vide détectée — reconstruction en cours...")
+            load_vectorstore_only.clear()
+            documents, total_chars = load_documents(config)
+            if not documents:
+                st.error("❌ **Aucun document trouvé !**")
+                st.stop()
+            vectordb = build_vectorstore(config, documents)
+
+    # Notification non bloquante, une fois par session
+    if not st.session_state.get('rag_ready'):
+        st.toast("Base vectorielle prête", icon="✅")
+    st.session_state.rag_ready = True
+    return vectordb
+
+
+# Reruns limités à la zone de chat (Streamlit >= 1.37, sinon rendu classique)
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+
+def _rerun_chat():
+    """Relance uniquement le fragment de chat si possible"""
+    try:
+        st.rerun(scope="fragment")
+    except TypeError:
+        st.rerun()
+
+
+@_fragment
+def _chat_fragment(config):
+    """Zone d'interaction + affichage du dernier résultat.
+
+    Isolée dans un fragment : les widgets de cette zone (saisie, historique,
+    boutons de sources, visionneuse PDF) ne relancent que ce sous-arbre.
+    """
+    # Zone d'interaction
+    st.markdown("### 💬 Interaction")
+
+    # Niveau de narration / détail selon le mode
+    if st.session_state.mode == "MJ immersif":
+        level = st.selectbox(
+            "Niveau de narration:",
+            ["Résumé court", "Scène détaillée", "Longue narration immersive"],
+            key="narration_level",
+            help="Contrôle la longueur et la richesse de la réponse du MJ"
+        )
+    else:
+        level = st.selectbox(
+            "Niveau de détail:",
+            ["Points clés", "Explication complète", "Détail exhaustif"],
+            key="narration_level",
+            help="Points clés = bullet points concis | Explication complète = règles + exemples | Détail exhaustif = tout, y compris cas particuliers"
+        )
+
+    # Historique des requêtes — clic = renvoi immédiat (sans passer par le form)
+    if st.session_state.query_history:
+        with st.expander(f"🕐 Historique ({len(st.session_state.query_history)} requêtes)", expanded=False):
+            for _i, _past_q in enumerate(st.session_state.query_history):
+                if st.button(
+                    f"↩ {_past_q[:80]}{'…' if len(_past_q) > 80 else ''}",
+                    key=f"hist_btn_{_i}",
+                    use_container_width=True
+                ):
+                    st.session_state["_prefill_query"] = _past_q
+                    _rerun_chat()
+
+    # Pré-remplir le champ si une question historique a été sélectionnée
+    if "_prefill_query" in st.session_state:
+        st.session_state["user_input"] = st.session_state.pop("_prefill_query")
+
+    # Formulaire pour les nouvelles requêtes
+    with st.form(key="query_form", clear_on_submit=True):
+        user_query = st.text_input(
+            "Ta question ou action (Entrée pour envoyer):",
+            placeholder="Ex: Explique-moi le Voleur sans Mémoire",
+            key="user_input"
+        )
+
+        # Avertissement pour questions trop larges
+        if user_query and any(word in user_query.lower() for word in ["liste", "tous", "toutes", "22", "vingt"]):
+            st.warning("⚠️ **Attention** : Les questions demandant des listes complètes peuvent générer des hallucinations. Le RAG fonctionne mieux avec des questions ciblées (ex: 'Explique l'arcane X').")
+
+        submit = st.form_submit_button("📤 Envoyer", type="primary", use_container_width=True)
+
+    active_query = user_query.strip() if submit and user_query else None
+
+    if active_query:
+        # Sauvegarder dans l'historique (10 entrées max, sans doublons consécutifs)
+        history = st.session_state.query_history
+        if not history or history[0] != active_query:
+            history.insert(0, active_query)
+            st.session_state.query_history = history[:10]
+
+        timeline_len = len(st.session_state.timeline)
+
+        with st.spinner("✨ Le MJ crée..." if st.session_state.mode == "MJ immersif" else "🤔 Recherche en cours..."):
+            try:
+                # Le mode MJ immersif n'interroge pas le corpus — pas de base à charger
+                vectordb = _ensure_rag_ready(config) if st.session_state.mode == "Encyclopédique" else None
+                result = process_query(
+                    query=active_query,
+                    config=config,
+                    mode=st.session_state.mode,
+                    level=level,
+                    vectordb=vectordb
+                )
+
+                st.session_state.first_query_sent = True
+                st.session_state._last_result = result
+                st.session_state._last_query = active_query
+
+            except RuntimeError as e:
+                st.error(str(e))
+            except Exception as e:
+                err_str = str(e)
+                if "CUDA error" in err_str or "llama-server process has terminated" in err_str:
+                    model = st.session_state.get('current_model', '?')
+                    st.error(f"💥 **Crash VRAM** — `{model}` est trop grand pour cette génération.")
+                    st.info("Utilise `mistral-nemo` ou `gemma4-12b` pour les scènes créatives longues.")
+                else:
+                    st.error(f"❌ Erreur: {e}")
+                    import traceback
+                    st.exception(traceback.format_exc())
+
+        # Timeline, état du jeu et mémoire sont rendus hors du fragment :
+        # rerun complet uniquement si un tour a effectivement été enregistré
+        if len(st.session_state.timeline) != timeline_len:
+            st.rerun()
+
+    # ─── Affichage du dernier résultat ────────────────────────────────────
+    # Séparé du traitement pour survivre aux reruns (boutons PDF, etc.)
+    if st.session_state.get('_last_result'):
+        _r = st.session_state._last_result
+        _q = st.session_state._last_query
+
+        st.markdown("### 💬 Question")
+        st.info(f"**{_q}**")
+        st.markdown("### ✅ Réponse")
+
+        if _r.get('confidence') is not None and _r['confidence'] < 0.3:
+            st.warning(
+                f"⚠️ **Pertinence faible ({_r['confidence']:.0%})** — "
+                "Les documents récupérés sont peut-être hors-sujet. "
+                "Pour les questions de règles, utilise le mode **Encyclopédique** "
+                "avec le filtre **Règles uniquement**."
+            )
+
+        if _r['response'] and len(_r['response'].strip()) > 0:
+            # Détection de boucle de répétition :
+            # - même phrase longue (>60 chars) répétée 4+ fois
+            # - OU patron suspect répété 3+ fois
+            # Seuil élevé pour éviter les faux positifs sur les réponses structurées
+            from collections import Counter as _Counter
+            _lines = [l.strip() for l in _r['response'].split('\n') if len(l.strip()) > 60]
+            _line_counts = _Counter(_lines)
+            _suspicious = ["une créature ou un lieu en danger", "selon le contexte fourni", "Il est également mentionné que"]
+            hallucination_detected = (
+                any(c >= 4 for c in _line_counts.values()) or
+                any(_r['response'].count(p) >= 3 for p in _suspicious)
+            )
+
+            if hallucination_detected:
+                st.error("⚠️ ALERTE : Boucle de répétition détectée — réponse tronquée ci-dessous")
+                st.warning("Le modèle a tourné en boucle. Essaie une question plus ciblée ou un autre modèle.")
+                with st.expander("⚠️ Réponse (répétitions présentes)"):
+                    st.markdown(_r['response'])
+            else:
+                st.markdown(_r['response'])
+        else:
+            st.error("❌ Le modèle n'a pas généré de réponse.")
+            if st.session_state.get('show_sources', True) and _r.get('sources'):
+                with st.expander("🔍 Sources récupérées (pour diagnostic)"):
+                    for i, doc in enumerate(_r['sources'][:5], 1):
+                        st.markdown(f"**Chunk {i}** (source: {doc.metadata.get('source', 'inconnu')})")
+                        st.text(doc.page_content[:400].replace("\n", " ") + "...")
+                        st.markdown("---")
+
+        # Métriques (confiance + temps + tokens)
+        _caption_parts = []
+        if _r.get('confidence') is not None and _r['confidence'] > 0:
+            _cc = "🟢" if _r['confidence'] > 0.7 else "🟡" if _r['confidence'] > 0.4 else "🔴"
+            _caption_parts.append(f"{_cc} Confiance RAG: {_r['confidence']:.0%}")
+        if _r.get('elapsed'):
+            _caption_parts.append(f"⏱️ {_r['elapsed']:.1f}s")
+        if _r.get('tokens_in'):
+            _caption_parts.append(f"📥 {_r['tokens_in']} tk")
+        if _r.get('tokens_out'):
+            _caption_parts.append(f"📤 {_r['tokens_out']} tk")
+        if _caption_parts:
+            st.caption(" · ".join(_caption_parts))
+
+        # Boutons sources citées (encyclopédique)
+        if st.session_state.mode == "Encyclopédique" and _r.get('cited_sources'):
+            st.markdown("**📚 Sources :**")
+            _btn_cols = st.columns(min(len(_r['cited_sources']), 5))
+            for _i, _ref in enumerate(_r['cited_sources']):
+                _col = _btn_cols[_i % len(_btn_cols)]
+                _page_lbl = f"p.{_ref['page']}" if _ref['page'] != '?' else _ref['source']
+                with _col:
+                    if st.button(f"📄 {_page_lbl}", key=f"pdfref_{_ref['source']}_{_ref['page']}_{_i}"):
+                        st.session_state._pdf_view = _ref
+                        st.session_state._pdf_view_config = config
+
+        # Debug chunks
+        if st.session_state.get('show_debug_chunks', False) and _r.get('sources'):
+            filter_names = {
+                "rules_only": "📖 Règles uniquement",
+                "universe_only": "🌍 Univers + Romans",
+                "rules_and_universe": "📖🌍 Règles + Univers (sans romans)"
+            }
+            _sf = st.session_state.get('encyclo_source_filter', 'rules_and_universe')
+            with st.expander(f"🔍 DEBUG: Chunks récupérés ({len(_r['sources'])} chunks)"):
+                st.info(f"🎯 Filtre actif : **{filter_names.get(_sf, _sf)}**")
+                for i, doc in enumerate(_r['sources'], 1):
+                    st.markdown(f"### Chunk {i}/{len(_r['sources'])}")
+                    if hasattr(doc, 'metadata') and doc.metadata:
+                        st.caption(f"Source: {doc.metadata.get('source', '?')} | p.{doc.metadata.get('page', '?')} | {doc.metadata.get('category', '?')}")
+                    st.text_area(f"Contenu chunk {i}", doc.page_content, height=200, key=f"debug_chunk_{i}")
+                    st.markdown("---")
+
+        # Sources normales
+        if st.session_state.show_sources and _r.get('sources'):
+            with st.expander(f"📚 Sources ({len(_r['sources'])} documents)"):
+                for i, doc in enumerate(_r['sources'], 1):
+                    _page = doc.metadata.get('page', '?')
+                    _src = doc.metadata.get('source', 'inconnu')
+                    st.markdown(f"**Source {i}** — {_src}, p.{_page}")
+                    st.text(doc.page_content[:400].replace("\n", " ") + "...")
+
+    # Visionneuse PDF (persiste entre requêtes, s'affiche quand une source est cliquée)
+    if '_pdf_view' in st.session_state and st.session_state._pdf_view:
+        _view = st.session_state._pdf_view
+        _cfg = st.session_state.get('_pdf_view_config', config)
+        _view_title = f"📄 {_view['source']} — p.{_view['page']}"
+        if _view.get('section'):
+            _view_title += f"  ({_view['section']})"
+        with st.expander(_view_title, expanded=True):
+            _pdf_path = _find_pdf_path(_view['source'], _cfg)
+            if _pdf_path and _view['page'] != '?':
+                _png = _render_pdf_page(_pdf_path, int(_view['page']))
+                if _png:
+                    st.image(_png, use_container_width=True)
+                else:
+                    st.warning("Impossible de rendre cette page.")
+            else:
+                st.info(f"Source : {_view['source']}, p.{_view['page']}")
+            if st.button("✖ Fermer la visionneuse", key="close_pdf_viewer"):
+                del st.session_state['_pdf_view']
+                st.rerun()
+
+
 def main():
     """Fonction principale"""
     # Initialisation
@@ -1106,14 +1490,15 @@ def main():
     # Sidebar avec les fiches de personnages
     from app_ui import render_sidebar
     render_sidebar()
+    if not st.session_state.get('rag_ready'):
+        st.sidebar.caption("⏳ Base RAG non initialisée (chargée à la première requête)")
 
     # ── Presets de mode : détection AVANT le rendu des colonnes ──────────────
     # Le sélecteur de mode est dans col_config, mais le toggle creative_mode est
     # dans col_main (rendu en premier). On doit appliquer les presets ici pour
     # pouvoir modifier creative_mode avant que son widget soit instancié.
-    from app_ui import _apply_mode_presets, _EXCLUDED
-    from core.utils import get_ollama_models
-    _avail_models = [m for m in get_ollama_models() if m not in _EXCLUDED]
+    from app_ui import _apply_mode_presets, _EXCLUDED, _cached_ollama_models
+    _avail_models = [m for m in _cached_ollama_models() if m not in _EXCLUDED]
     _incoming_mode = st.session_state.get("mode_selector",
                                           st.session_state.get("mode", "MJ immersif"))
     # Synchroniser st.session_state.mode immédiatement — le selectbox de mode
@@ -1139,8 +1524,9 @@ def main():
         if 'first_query_sent' not in st.session_state:
             st.session_state.first_query_sent = False
 
-        # Chargement des documents et vectorstore - LOGIQUE INTELLIGENTE
-        # Masquer après la première requête pour gagner de l'espace
+        # État du corpus - CHARGEMENT DIFFÉRÉ
+        # Seule la vérification des changements (stat des fichiers) est faite ici ;
+        # extraction des documents et base vectorielle attendent la première requête
         if not st.session_state.first_query_sent:
             st.markdown("---")
 
@@ -1149,297 +1535,25 @@ def main():
             with col_load1:
                 st.markdown("## 📚")
             with col_load2:
-                st.markdown("## Chargement du corpus")
+                st.markdown("## Corpus")
 
             st.markdown("---")
 
-        # Vérifier si un rechargement est nécessaire
-        needs_reload, reason = check_corpus_changes(config)
-
-        if needs_reload:
-            if not st.session_state.first_query_sent:
-                # Afficher pourquoi on recharge
-                st.warning(f"🔄 **Rechargement nécessaire** : {reason}")
-
-            # Chargement complet avec progression
-            documents = load_documents(config)
-
-            if not documents:
-                st.error("❌ **Aucun document trouvé !**")
-                st.warning(f"Vérifie que des PDFs sont présents dans : `{config['paths']['pdf_root']}`")
-                st.info("💡 Dépose tes PDFs de règles dans ce dossier et relance l'application.")
-                st.stop()
-
-            # Construction de la base vectorielle
-            vectordb = build_vectorstore(config, documents)
-        else:
-            # Chargement rapide (base existe et corpus inchangé)
-            if not st.session_state.first_query_sent:
-                st.success(f"✅ **{reason}** - Chargement rapide activé !")
-
-            # Charger uniquement la base vectorielle (ultra rapide)
-            vectordb = load_vectorstore_only(config)
-
-            # Si la base est vide (0 vecteurs), forcer un rebuild complet
-            if vectordb is None:
-                st.warning("⚠️ Base vectorielle vide détectée — reconstruction en cours...")
-                load_vectorstore_only.clear()
-                documents = load_documents(config)
-                if not documents:
-                    st.error("❌ **Aucun document trouvé !**")
-                    st.stop()
-                vectordb = build_vectorstore(config, documents)
-
-            # Lire les métadonnées pour afficher les stats
-            if not st.session_state.first_query_sent:
-                metadata_file = config['paths']['db_dir'] / "corpus_metadata.json"
-                if metadata_file.exists():
-                    try:
-                        with open(metadata_file, 'r', encoding='utf-8') as f:
-                            import json
-                            metadata = json.load(f)
-                            num_docs = metadata.get('total_files', 0)
-                            st.info(f"📊 Base vectorielle contient {num_docs} documents")
-                    except Exception:
-                        pass
-
-        # Afficher stats finales (uniquement si on a rechargé ET si c'est avant la première requête)
-        if not st.session_state.first_query_sent and needs_reload and 'documents' in locals():
-            st.markdown("---")
-            st.markdown("### 📊 Statistiques du corpus")
-            col_stat1, col_stat2, col_stat3 = st.columns(3)
-            with col_stat1:
-                st.metric("📄 Documents", len(documents), delta="Prêt", delta_color="normal")
-            with col_stat2:
-                total_chars = sum(len(content) for content in documents.values())
-                st.metric("📝 Caractères", f"{total_chars:,}")
-            with col_stat3:
-                # Estimer le nombre de chunks
-                estimated_chunks = total_chars // config['rag']['chunk_size']
-                st.metric("🧩 Chunks estimés", f"~{estimated_chunks:,}")
-
-        # Petite note discrète après la première requête
-        if st.session_state.first_query_sent:
-            # Lire le nombre de docs pour affichage compact
-            metadata_file = config['paths']['db_dir'] / "corpus_metadata.json"
-            num_docs = 0
-            if metadata_file.exists():
-                try:
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        import json
-                        metadata = json.load(f)
-                        num_docs = metadata.get('total_files', 0)
-                except Exception:
-                    pass
-            st.caption(f"📚 Base vectorielle chargée ({num_docs} documents)")
-
-        st.markdown("---")
-
-        # Zone d'interaction
-        st.markdown("### 💬 Interaction")
-
-        # Niveau de narration / détail selon le mode
-        if st.session_state.mode == "MJ immersif":
-            level = st.selectbox(
-                "Niveau de narration:",
-                ["Résumé court", "Scène détaillée", "Longue narration immersive"],
-                key="narration_level",
-                help="Contrôle la longueur et la richesse de la réponse du MJ"
-            )
-        else:
-            level = st.selectbox(
-                "Niveau de détail:",
-                ["Points clés", "Explication complète", "Détail exhaustif"],
-                key="narration_level",
-                help="Points clés = bullet points concis | Explication complète = règles + exemples | Détail exhaustif = tout, y compris cas particuliers"
-            )
-
-        # Historique des requêtes — clic = renvoi immédiat (sans passer par le form)
-        if st.session_state.query_history:
-            with st.expander(f"🕐 Historique ({len(st.session_state.query_history)} requêtes)", expanded=False):
-                for _i, _past_q in enumerate(st.session_state.query_history):
-                    if st.button(
-                        f"↩ {_past_q[:80]}{'…' if len(_past_q) > 80 else ''}",
-                        key=f"hist_btn_{_i}",
-                        use_container_width=True
-                    ):
-                        st.session_state["_prefill_query"] = _past_q
-                        st.rerun()
-
-        # Pré-remplir le champ si une question historique a été sélectionnée
-        if "_prefill_query" in st.session_state:
-            st.session_state["user_input"] = st.session_state.pop("_prefill_query")
-
-        # Formulaire pour les nouvelles requêtes
-        with st.form(key="query_form", clear_on_submit=True):
-            user_query = st.text_input(
-                "Ta question ou action (Entrée pour envoyer):",
-                placeholder="Ex: Explique-moi le Voleur sans Mémoire",
-                key="user_input"
-            )
-
-            # Avertissement pour questions trop larges
-            if user_query and any(word in user_query.lower() for word in ["liste", "tous", "toutes", "22", "vingt"]):
-                st.warning("⚠️ **Attention** : Les questions demandant des listes complètes peuvent générer des hallucinations. Le RAG fonctionne mieux avec des questions ciblées (ex: 'Explique l'arcane X').")
-
-            submit = st.form_submit_button("📤 Envoyer", type="primary", use_container_width=True)
-
-        active_query = user_query.strip() if submit and user_query else None
-
-        if active_query:
-            # Sauvegarder dans l'historique (10 entrées max, sans doublons consécutifs)
-            history = st.session_state.query_history
-            if not history or history[0] != active_query:
-                history.insert(0, active_query)
-                st.session_state.query_history = history[:10]
-
-            with st.spinner("✨ Le MJ crée..." if st.session_state.mode == "MJ immersif" else "🤔 Recherche en cours..."):
-                try:
-                    result = process_query(
-                        query=active_query,
-                        config=config,
-                        mode=st.session_state.mode,
-                        level=level,
-                        vectordb=vectordb
-                    )
-
-                    st.session_state.first_query_sent = True
-                    st.session_state._last_result = result
-                    st.session_state._last_query = active_query
-
-                except RuntimeError as e:
-                    st.error(str(e))
-                except Exception as e:
-                    err_str = str(e)
-                    if "CUDA error" in err_str or "llama-server process has terminated" in err_str:
-                        model = st.session_state.get('current_model', '?')
-                        st.error(f"💥 **Crash VRAM** — `{model}` est trop grand pour cette génération.")
-                        st.info("Utilise `mistral-nemo` ou `gemma4-12b` pour les scènes créatives longues.")
-                    else:
-                        st.error(f"❌ Erreur: {e}")
-                        import traceback
-                        st.exception(traceback.format_exc())
-
-        # ─── Affichage du dernier résultat ────────────────────────────────────
-        # Séparé du traitement pour survivre aux reruns (boutons PDF, etc.)
-        if st.session_state.get('_last_result'):
-            _r = st.session_state._last_result
-            _q = st.session_state._last_query
-
-            st.markdown("### 💬 Question")
-            st.info(f"**{_q}**")
-            st.markdown("### ✅ Réponse")
-
-            if _r.get('confidence') is not None and _r['confidence'] < 0.3:
-                st.warning(
-                    f"⚠️ **Pertinence faible ({_r['confidence']:.0%})** — "
-                    "Les documents récupérés sont peut-être hors-sujet. "
-                    "Pour les questions de règles, utilise le mode **Encyclopédique** "
-                    "avec le filtre **Règles uniquement**."
-                )
-
-            if _r['response'] and len(_r['response'].strip()) > 0:
-                # Détection de boucle de répétition :
-                # - même phrase longue (>60 chars) répétée 4+ fois
-                # - OU patron suspect répété 3+ fois
-                # Seuil élevé pour éviter les faux positifs sur les réponses structurées
-                from collections import Counter as _Counter
-                _lines = [l.strip() for l in _r['response'].split('\n') if len(l.strip()) > 60]
-                _line_counts = _Counter(_lines)
-                _suspicious = ["une créature ou un lieu en danger", "selon le contexte fourni", "Il est également mentionné que"]
-                hallucination_detected = (
-                    any(c >= 4 for c in _line_counts.values()) or
-                    any(_r['response'].count(p) >= 3 for p in _suspicious)
-                )
-
-                if hallucination_detected:
-                    st.error("⚠️ ALERTE : Boucle de répétition détectée — réponse tronquée ci-dessous")
-                    st.warning("Le modèle a tourné en boucle. Essaie une question plus ciblée ou un autre modèle.")
-                    with st.expander("⚠️ Réponse (répétitions présentes)"):
-                        st.markdown(_r['response'])
-                else:
-                    st.markdown(_r['response'])
+            needs_reload, reason = check_corpus_changes(config)
+            if needs_reload:
+                st.warning(f"🔄 **Rechargement nécessaire** : {reason} — la base sera construite à la première requête")
             else:
-                st.error("❌ Le modèle n'a pas généré de réponse.")
-                if st.session_state.get('show_sources', True) and _r.get('sources'):
-                    with st.expander("🔍 Sources récupérées (pour diagnostic)"):
-                        for i, doc in enumerate(_r['sources'][:5], 1):
-                            st.markdown(f"**Chunk {i}** (source: {doc.metadata.get('source', 'inconnu')})")
-                            st.text(doc.page_content[:400].replace("\n", " ") + "...")
-                            st.markdown("---")
-
-            # Métriques (confiance + temps + tokens)
-            _caption_parts = []
-            if _r.get('confidence') is not None and _r['confidence'] > 0:
-                _cc = "🟢" if _r['confidence'] > 0.7 else "🟡" if _r['confidence'] > 0.4 else "🔴"
-                _caption_parts.append(f"{_cc} Confiance RAG: {_r['confidence']:.0%}")
-            if _r.get('elapsed'):
-                _caption_parts.append(f"⏱️ {_r['elapsed']:.1f}s")
-            if _r.get('tokens_in'):
-                _caption_parts.append(f"📥 {_r['tokens_in']} tk")
-            if _r.get('tokens_out'):
-                _caption_parts.append(f"📤 {_r['tokens_out']} tk")
-            if _caption_parts:
-                st.caption(" · ".join(_caption_parts))
-
-            # Boutons sources citées (encyclopédique)
-            if st.session_state.mode == "Encyclopédique" and _r.get('cited_sources'):
-                st.markdown("**📚 Sources :**")
-                _btn_cols = st.columns(min(len(_r['cited_sources']), 5))
-                for _i, _ref in enumerate(_r['cited_sources']):
-                    _col = _btn_cols[_i % len(_btn_cols)]
-                    _page_lbl = f"p.{_ref['page']}" if _ref['page'] != '?' else _ref['source']
-                    with _col:
-                        if st.button(f"📄 {_page_lbl}", key=f"pdfref_{_ref['source']}_{_ref['page']}_{_i}"):
-                            st.session_state._pdf_view = _ref
-                            st.session_state._pdf_view_config = config
-
-            # Debug chunks
-            if st.session_state.get('show_debug_chunks', False) and _r.get('sources'):
-                filter_names = {
-                    "rules_only": "📖 Règles uniquement",
-                    "universe_only": "🌍 Univers + Romans",
-                    "rules_and_universe": "📖🌍 Règles + Univers (sans romans)"
-                }
-                _sf = st.session_state.get('encyclo_source_filter', 'rules_and_universe')
-                with st.expander(f"🔍 DEBUG: Chunks récupérés ({len(_r['sources'])} chunks)"):
-                    st.info(f"🎯 Filtre actif : **{filter_names.get(_sf, _sf)}**")
-                    for i, doc in enumerate(_r['sources'], 1):
-                        st.markdown(f"### Chunk {i}/{len(_r['sources'])}")
-                        if hasattr(doc, 'metadata') and doc.metadata:
-                            st.caption(f"Source: {doc.metadata.get('source', '?')} | p.{doc.metadata.get('page', '?')} | {doc.metadata.get('category', '?')}")
-                        st.text_area(f"Contenu chunk {i}", doc.page_content, height=200, key=f"debug_chunk_{i}")
-                        st.markdown("---")
+                st.success(f"✅ **{reason}** - Chargement rapide à la première requête")
+                num_docs = _read_corpus_file_count(config)
+                if num_docs:
+                    st.info(f"📊 Base vectorielle contient {num_docs} documents")
+        elif st.session_state.get('rag_ready'):
+            # Petite note discrète après la première requête
+            st.caption(f"📚 Base vectorielle chargée ({_read_corpus_file_count(config)} documents)")
 
-            # Sources normales
-            if st.session_state.show_sources and _r.get('sources'):
-                with st.expander(f"📚 Sources ({len(_r['sources'])} documents)"):
-                    for i, doc in enumerate(_r['sources'], 1):
-                        _page = doc.metadata.get('page', '?')
-                        _src = doc.metadata.get('source', 'inconnu')
-                        st.markdown(f"**Source {i}** — {_src}, p.{_page}")
-                        st.text(doc.page_content[:400].replace("\n", " ") + "...")
+        st.markdown("---")
 
-        # Visionneuse PDF (persiste entre requêtes, s'affiche quand une source est cliquée)
-        if '_pdf_view' in st.session_state and st.session_state._pdf_view:
-            _view = st.session_state._pdf_view
-            _cfg = st.session_state.get('_pdf_view_config', config)
-            _view_title = f"📄 {_view['source']} — p.{_view['page']}"
-            if _view.get('section'):
-                _view_title += f"  ({_view['section']})"
-            with st.expander(_view_title, expanded=True):
-                _pdf_path = _find_pdf_path(_view['source'], _cfg)
-                if _pdf_path and _view['page'] != '?':
-                    _png = _render_pdf_page(_pdf_path, int(_view['page']))
-                    if _png:
-                        st.image(_png, use_container_width=True)
-                    else:
-                        st.warning("Impossible de rendre cette page.")
-                else:
-                    st.info(f"Source : {_view['source']}, p.{_view['page']}")
-                if st.button("✖ Fermer la visionneuse", key="close_pdf_viewer"):
-                    del st.session_state['_pdf_view']
-                    st.rerun()
+        _chat_fragment(config)
 
         # Affichage de la mémoire
         st.markdown("---")
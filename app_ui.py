@@ -6,13 +6,30 @@ Interface utilisateur de l'application
 import sys
 import streamlit as st
 from datetime import datetime
-import pandas as pd
-import plotly.express as px
+
+
+# Reruns limités à la sidebar (Streamlit >= 1.37, sinon rendu classique)
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+
+def _rerun_sidebar():
+    """Relance uniquement le fragment de la sidebar si possible"""
+    try:
+        st.rerun(scope="fragment")
+    except TypeError:
+        st.rerun()
 
 
 def render_sidebar():
     """Affiche la sidebar avec les fiches de personnages"""
-    st.sidebar.title("📇 Fiches de personnage")
+    with st.sidebar:
+        _sidebar_fragment()
+
+
+@_fragment
+def _sidebar_fragment():
+    """Contenu de la sidebar : la navigation dans une fiche ne relance pas toute la page"""
+    st.title("📇 Fiches de personnage")
 
     char_manager = st.session_state.char_manager
     char_manager.refresh()
@@ -20,8 +37,8 @@ def render_sidebar():
     characters = char_manager.characters
 
     if not characters:
-        st.sidebar.info(f"Aucune fiche trouvée dans {st.session_state.char_dir}")
-        st.sidebar.caption("Dépose des fichiers .txt, .md ou .pdf dans ce dossier.")
+        st.info(f"Aucune fiche trouvée dans {st.session_state.char_dir}")
+        st.caption("Dépose des fichiers .txt, .md ou .pdf dans ce dossier.")
         return
 
     # Sélection - SAUVEGARDER la sélection dans session_state
@@ -35,7 +52,7 @@ def render_sidebar():
         except ValueError:
             default_index = 0
 
-    selected = st.sidebar.selectbox(
+    selected = st.selectbox(
         "Choisir un personnage:",
         char_names,
         index=default_index,
@@ -46,7 +63,7 @@ def render_sidebar():
     if selected:
         st.session_state.selected_character = selected
 
-    st.sidebar.markdown("---")
+    st.markdown("---")
 
     if selected:
         char = char_manager.get_character(selected)
@@ -58,22 +75,15 @@ def render_sidebar():
             # Affichage selon le type de fichier
             if char.is_pdf:
                 # Affichage du PDF
-                st.sidebar.markdown(f"**📄 Fichier:** {char.file_path.name}")
+                st.markdown(f"**📄 Fichier:** {char.file_path.name}")
 
-                col1, col2 = st.sidebar.columns([1, 1])
+                col1, col2 = st.columns([1, 1])
 
                 with col1:
                     # Bouton pour ouvrir dans l'explorateur
                     if st.button("📂 Ouvrir", key="open_pdf", use_container_width=True):
-                        import subprocess
-                        import platform
-                        if platform.system() == 'Windows':
-                            import os
-                            os.startfile(str(char.file_path))
-                        elif platform.system() == 'Darwin':  # macOS
-                            subprocess.run(['open', str(char.file_path)])
-                        else:  # Linux
-                            subprocess.run(['xdg-open', str(char.file_path)])
+                        from core.utils import open_with_default_app
+                        open_with_default_app(char.file_path)
 
                 with col2:
                     # Bouton de téléchargement
@@ -91,7 +101,7 @@ def render_sidebar():
                     except Exception:
                         pass
 
-                st.sidebar.markdown("---")
+                st.markdown("---")
 
                 # Visualiseur PDF dans la sidebar - convertir en image avec pdf2image
                 try:
@@ -133,12 +143,12 @@ def render_sidebar():
                             st.session_state.pdf_page = 1
 
                         # Contrôles de navigation dans la sidebar
-                        col_prev, col_info, col_next = st.sidebar.columns([1, 2, 1])
+                        col_prev, col_info, col_next = st.columns([1, 2, 1])
 
                         with col_prev:
                             if st.button("◀", key="pdf_prev", use_container_width=True, disabled=(st.session_state.pdf_page <= 1)):
                                 st.session_state.pdf_page -= 1
-                                st.rerun()
+                                _rerun_sidebar()
 
                         with col_info:
                             st.markdown(f"<center>Page {st.session_state.pdf_page}/{total_pages}</center>", unsafe_allow_html=True)
@@ -146,7 +156,7 @@ def render_sidebar():
                         with col_next:
                             if st.button("▶", key="pdf_next", use_container_width=True, disabled=(st.session_state.pdf_page >= total_pages)):
                                 st.session_state.pdf_page += 1
-                                st.rerun()
+                                _rerun_sidebar()
 
                         # Convertir uniquement la page courante en image (plus rapide)
                         # DPI 200 pour une bonne qualité
@@ -176,23 +186,23 @@ def render_sidebar():
 
                         if images:
                             # Afficher l'image dans la sidebar
-                            st.sidebar.image(images[0], use_container_width=True)
+                            st.image(images[0], use_container_width=True)
 
                     except ImportError as e:
-                        st.sidebar.error(f"❌ Import Error: {e}")
-                        st.sidebar.info("1. Installe pdf2image: pip install pdf2image")
-                        st.sidebar.info("2. Vérifie que Poppler est dans: D:\\IA\\poppler-25.07.0\\Library\\bin")
-                        st.sidebar.info("💡 En attendant, utilise le bouton 'Ouvrir' ci-dessus.")
+                        st.error(f"❌ Import Error: {e}")
+                        st.info("1. Installe pdf2image: pip install pdf2image")
+                        st.info("2. Vérifie que Poppler est dans: D:\\IA\\poppler-25.07.0\\Library\\bin")
+                        st.info("💡 En attendant, utilise le bouton 'Ouvrir' ci-dessus.")
                     except Exception as e:
-                        st.sidebar.error(f"❌ Erreur détaillée: {type(e).__name__}: {e}")
+                        st.error(f"❌ Erreur détaillée: {type(e).__name__}: {e}")
                         _poppler = locals().get('poppler_path', r"D:\IA\poppler-25.07.0\Library\bin")
-                        st.sidebar.code(f"Chemin Poppler: {_poppler}")
-                        st.sidebar.code(f"Poppler existe: {os.path.exists(_poppler)}")
-                        st.sidebar.info("💡 Utilise le bouton 'Ouvrir' ci-dessus.")
+                        st.code(f"Chemin Poppler: {_poppler}")
+                        st.code(f"Poppler existe: {os.path.exists(_poppler)}")
+                        st.info("💡 Utilise le bouton 'Ouvrir' ci-dessus.")
 
                 except Exception as e:
-                    st.sidebar.error(f"❌ Erreur: {e}")
-                    st.sidebar.info("💡 Utilise le bouton 'Ouvrir' ci-dessus.")
+                    st.error(f"❌ Erreur: {e}")
+                    st.info("💡 Utilise le bouton 'Ouvrir' ci-dessus.")
             else:
                 # Affichage texte/markdown
                 st.text_area(
@@ -203,20 +213,18 @@ def render_sidebar():
                     disabled=True
                 )
 
-        # Info supplémentaire
-        st.sidebar.markdown("---")
-        try:
-            with open(char.file_path, 'r', encoding='utf-8') as f:
-                import json
-                try:
-                    content = json.load(f)
-                    if isinstance(content, dict):
-                        with st.sidebar.expander("ℹ️ Info fiche"):
-                            st.json(content)
-                except:
-                    pass
-        except Exception:
-            pass
+        # Info supplémentaire : fiche texte au format JSON (contenu déjà en mémoire,
+        # pas de relecture du fichier à chaque rerun)
+        st.markdown("---")
+        if not char.is_pdf and char.content.lstrip().startswith("{"):
+            try:
+                from core.utils import loads_json
+                content = loads_json(char.content)
+                if isinstance(content, dict):
+                    with st.expander("ℹ️ Info fiche"):
+                        st.json(content)
+            except ValueError:
+                pass
 
 
 def render_timeline():
@@ -305,6 +313,16 @@ _MODE_PRESETS = {
 }
 
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_ollama_models() -> list:
+    """Liste des modèles Ollama, rafraîchie au plus une fois par minute.
+
+    Évite de lancer `ollama list` à chaque rerun Streamlit.
+    """
+    from core.utils import get_ollama_models
+    return get_ollama_models()
+
+
 def _preload_model_bg(model_name: str):
     """Charge le modèle en mémoire GPU via l'API Ollama (thread background)."""
     import threading
@@ -380,8 +398,7 @@ def render_config_panel(config):
     """Affiche le panneau de configuration"""
     st.markdown("### ⚙️ Configuration")
 
-    from core.utils import get_ollama_models
-    raw_models = get_ollama_models()
+    raw_models = _cached_ollama_models()
     filtered_models = [m for m in raw_models if m not in _EXCLUDED]
 
     def _label(m):
@@ -407,6 +424,10 @@ def render_config_panel(config):
         st.session_state._last_preloaded_model = selected_model
         st.toast(f"⏳ Chargement de **{selected_model}** en mémoire...", icon="🔄")
 
+    if st.button("🔄 Rafraîchir les modèles", key="refresh_models", use_container_width=True):
+        _cached_ollama_models.clear()
+        st.rerun()
+
     st.markdown("---")
 
     # Mode
@@ -421,49 +442,63 @@ def render_config_panel(config):
 
     st.markdown("---")
 
-    # Sliders
-    col1, col2 = st.columns(2)
+    # Sliders regroupés dans un formulaire : un seul rerun à la validation
+    # au lieu d'un rerun complet par cran de glissement
+    with st.form("model_settings", border=False):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            if mode == "MJ immersif":
+                st.session_state.setdefault('temp_slider', float(st.session_state.get('temperature', 0.8)))
+                temp = st.slider(
+                    "Température",
+                    0.0, 1.0,
+                    key="temp_slider",
+                    step=0.05,
+                    help="0.0 = Factuel/fidèle au contexte | 1.0 = Créatif (hallucine plus)"
+                )
+                st.session_state.temperature = temp
+                st.caption(f"Actuel: {temp}")
+            else:
+                st.caption("🔒 Température fixée à 0.0 en mode Encyclopédique")
 
-    with col1:
-        if mode == "MJ immersif":
-            st.session_state.setdefault('temp_slider', float(st.session_state.get('temperature', 0.8)))
-            temp = st.slider(
-                "Température",
+        with col2:
+            st.session_state.setdefault('top_p_slider', float(st.session_state.get('top_p', 0.95)))
+            top_p = st.slider(
+                "Top-p",
                 0.0, 1.0,
-                key="temp_slider",
+                key="top_p_slider",
                 step=0.05,
-                help="0.0 = Factuel/fidèle au contexte | 1.0 = Créatif (hallucine plus)"
+                help="Diversité du vocabulaire — 1.0 = tous les tokens possibles"
             )
-            st.session_state.temperature = temp
-            st.caption(f"Actuel: {temp}")
-        else:
-            st.caption("🔒 Température fixée à 0.0 en mode Encyclopédique")
-
-    with col2:
-        st.session_state.setdefault('top_p_slider', float(st.session_state.get('top_p', 0.95)))
-        top_p = st.slider(
-            "Top-p",
-            0.0, 1.0,
-            key="top_p_slider",
-            step=0.05,
-            help="Diversité du vocabulaire — 1.0 = tous les tokens possibles"
+            st.session_state.top_p = top_p
+            st.caption(f"Actuel: {top_p}")
+
+        # Taille du contexte (num_ctx)
+        _ctx_default = config.get('model', {}).get('num_ctx', 32768)
+        _ctx_options = [16384, 32768, 49152, 65536]
+        _ctx_labels  = {16384: "16K", 32768: "32K", 49152: "48K", 65536: "64K"}
+        st.session_state.setdefault('num_ctx_slider', st.session_state.get('num_ctx', _ctx_default))
+        ctx_val = st.select_slider(
+            "Contexte (num_ctx)",
+            options=_ctx_options,
+            format_func=lambda x: _ctx_labels[x],
+            key="num_ctx_slider",
+            help="Taille de la fenêtre de contexte du modèle. 32K = bon équilibre. 64K = plus lent, plus de VRAM."
         )
-        st.session_state.top_p = top_p
-        st.caption(f"Actuel: {top_p}")
-
-    # Taille du contexte (num_ctx)
-    _ctx_default = config.get('model', {}).get('num_ctx', 32768)
-    _ctx_options = [16384, 32768, 49152, 65536]
-    _ctx_labels  = {16384: "16K", 32768: "32K", 49152: "48K", 65536: "64K"}
-    st.session_state.setdefault('num_ctx_slider', st.session_state.get('num_ctx', _ctx_default))
-    ctx_val = st.select_slider(
-        "Contexte (num_ctx)",
-        options=_ctx_options,
-        format_func=lambda x: _ctx_labels[x],
-        key="num_ctx_slider",
-        help="Taille de la fenêtre de contexte du modèle. 32K = bon équilibre. 64K = plus lent, plus de VRAM."
-    )
-    st.session_state.num_ctx = ctx_val
+        st.session_state.num_ctx = ctx_val
+
+        if mode == "Encyclopédique":
+            st.session_state.setdefault('k_retrieval_slider', st.session_state.get('encyclo_k_retrieval', 50))
+            k_retrieval = st.slider(
+                "Nombre de chunks (RAG)",
+                1, 100,
+                key="k_retrieval_slider",
+                help="Chunks à récupérer du corpus (plus = plus de contexte, mais plus lent)"
+            )
+            st.session_state.encyclo_k_retrieval = k_retrieval
+
+        st.form_submit_button("✅ Appliquer", use_container_width=True)
 
     st.markdown("---")
 
@@ -489,15 +524,6 @@ def render_config_panel(config):
         )
         st.session_state.encyclo_source_filter = source_filter[1]
 
-        st.session_state.setdefault('k_retrieval_slider', st.session_state.get('encyclo_k_retrieval', 50))
-        k_retrieval = st.slider(
-            "Nombre de chunks (RAG)",
-            1, 100,
-            key="k_retrieval_slider",
-            help="Chunks à récupérer du corpus (plus = plus de contexte, mais plus lent)"
-        )
-        st.session_state.encyclo_k_retrieval = k_retrieval
-
         col5, col6 = st.columns(2)
         with col5:
             show_sources = st.checkbox(
@@ -524,7 +550,6 @@ def render_config_panel(config):
 
     with col7:
         if st.button("💾 Sauvegarder la session"):
-            from core.memory import SessionManager
             st.session_state.session_manager.save_session(
                 session_name="manual_save",
                 mj_memory=st.session_state.mj_memory,
@@ -535,12 +560,21 @@ def render_config_panel(config):
 
     with col8:
         if st.button("🗑️ Tout effacer"):
+            from core.parser import GameState
+            from core.memory import Statistics
             st.session_state.mj_memory.clear()
             st.session_state.encyclo_memory.clear()
+            # Instantané vide : tronque le journal auto_save (l'historique effacé ne revient pas au chargement)
+            st.session_state.session_manager.save_session(
+                "auto_save",
+                st.session_state.mj_memory,
+                st.session_state.encyclo_memory,
+                metadata=st.session_state.session_manager.AUTO_SAVE_METADATA
+            )
             st.session_state.game_state = GameState()
             st.session_state.timeline.clear()
             if hasattr(st.session_state, 'statistics'):
-                st.session_state.statistics = SessionManager(paths['save_dir'])
+                st.session_state.statistics = Statistics()
             st.rerun()
 
     st.markdown("---")
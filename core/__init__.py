@@ -12,20 +12,45 @@ Ce module contient tous les composants principaux de l'application :
 __version__ = "2.0.0"
 __author__ = "Assistant MJ Team"
 
-# Imports pour faciliter l'utilisation
-from .rag import DocumentExtractor, VectorStore, RAGChain
-from .memory import Memory, MemoryEntry, SessionManager, Statistics
-from .parser import ResponseParser, ParsedResponse, GameState
-from .characters import Character, CharacterManager
-from .utils import (
-    load_config,
-    get_ollama_models,
-    validate_ollama_installation,
-    format_file_size,
-    truncate_text,
-    export_session_to_markdown,
-    ColorScheme
-)
+# Imports paresseux (PEP 562) : « from core.memory import Memory » ne charge
+# plus toute la pile RAG (langchain, torch) ; chaque nom est résolu à la demande
+_LAZY_ATTRS = {
+    "DocumentExtractor": "rag",
+    "VectorStore": "rag",
+    "RAGChain": "rag",
+    "Memory": "memory",
+    "MemoryEntry": "memory",
+    "SessionManager": "memory",
+    "Statistics": "memory",
+    "ResponseParser": "parser",
+    "ParsedResponse": "parser",
+    "GameState": "parser",
+    "Character": "characters",
+    "CharacterManager": "characters",
+    "load_config": "utils",
+    "get_ollama_models": "utils",
+    "validate_ollama_installation": "utils",
+    "format_file_size": "utils",
+    "truncate_text": "utils",
+    "export_session_to_markdown": "utils",
+    "open_with_default_app": "utils",
+    "ColorScheme": "utils",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f".{module_name}", __name__), name)
+    globals()[name] = value  # résolu une seule fois
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
+
 
 __all__ = [
     # RAG
@@ -51,5 +76,6 @@ __all__ = [
     "format_file_size",
     "truncate_text",
     "export_session_to_markdown",
+    "open_with_default_app",
     "ColorScheme",
 ]
\ No newline at end of file
@@ -3,25 +3,91 @@ core/characters.py
 Gestion des fiches de personnages
 """
 
+import mmap
+import os
+import re
+import stat
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Optional, Iterator, Tuple
+from functools import cached_property, lru_cache
+
+# Même ordre de préférence que core/rag.py : PyMuPDF (moteur C), puis pdfplumber, puis PyPDF2
+try:
+    import fitz  # PyMuPDF
+    USE_PYMUPDF = True
+except ImportError:
+    USE_PYMUPDF = False
 
 try:
     import pdfplumber
     USE_PDFPLUMBER = True
 except ImportError:
-    import PyPDF2
     USE_PDFPLUMBER = False
+    try:
+        import PyPDF2
+    except ImportError:
+        PyPDF2 = None
 
 
-@dataclass
 class Character:
-    """Représente un personnage"""
-    name: str
-    file_path: Path
-    content: str
-    is_pdf: bool = False
+    """Représente un personnage
+    
+    Le contenu est lu au premier accès seulement : lister les fiches ne coûte
+    qu'un stat par fichier, le parsing PDF n'a lieu que pour les fiches consultées.
+    """
+    
+    def __init__(self, name: str, file_path: Path, content: Optional[str] = None, is_pdf: bool = False):
+        self.name = name
+        self.file_path = file_path
+        self.is_pdf = is_pdf
+        self._content = content
+    
+    def __repr__(self) -> str:
+        return f"Character(name={self.name!r}, file_path={self.file_path!r}, is_pdf={self.is_pdf})"
+    
+    @property
+    def content(self) -> str:
+        """Contenu de la fiche (chargé paresseusement)"""
+        if self._content is None:
+            try:
+                self._content = _read_character_file(self.file_path)
+            except Exception as e:
+                self._content = f"Erreur lecture fichier: {e}"
+        return self._content
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._content is not None
+    
+    @cached_property
+    def search_text(self) -> str:
+        """Nom + contenu en minuscules, calculé une fois par fiche chargée"""
+        return f"{self.name}\n{self.content}".lower()
+    
+    def contains(self, query_lower: str) -> bool:
+        """Recherche insensible à la casse dans le nom et le contenu
+        
+        Fiche texte pas encore lue : recherche sur le fichier mappé en mémoire,
+        sans le décoder ni le garder en RAM.
+        """
+        if not query_lower:
+            return True
+        if self.is_loaded or self.is_pdf:
+            return query_lower in self.search_text
+        if query_lower in self.name.lower():
+            return True
+        try:
+            with open(self.file_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return False
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return _bytes_pattern(query_lower).search(mm) is not None
+        except (OSError, ValueError):
+            return query_lower in self.search_text
     
     @property
     def short_preview(self, length: int = 200) -> str:
@@ -37,80 +103,189 @@ class Character:
         return ""
 
 
+@lru_cache(maxsize=64)
+def _bytes_pattern(query_lower: str) -> "re.Pattern[bytes]":
+    """Motif UTF-8 insensible à la casse (accents compris : re.IGNORECASE sur bytes
+    ne couvre que l'ASCII), chaque caractère acceptant sa forme minuscule ou majuscule"""
+    parts = []
+    for ch in query_lower:
+        variants = {ch, ch.upper()}
+        parts.append(b"(?:" + b"|".join(re.escape(v.encode("utf-8")) for v in sorted(variants)) + b")")
+    return re.compile(b"".join(parts))
+
+
+# Extensions reconnues, insensibles à la casse (glob est sensible à la casse sous Linux)
+_CHARACTER_PATTERNS = ("*.[tT][xX][tT]", "*.[mM][dD]", "*.[pP][dD][fF]")
+
+
+def _read_character_file(file_path: Path) -> str:
+    """Charge le contenu d'une fiche (texte ou PDF)"""
+    if file_path.suffix.lower() == ".pdf":
+        return _load_pdf(file_path)
+    return file_path.read_text(encoding="utf-8", errors="ignore")
+
+
+def _load_pdf(pdf_path: Path) -> str:
+    """Charge un PDF (fonction de module : picklable pour le pool de processus)"""
+    if USE_PYMUPDF:
+        try:
+            with fitz.open(str(pdf_path)) as doc:
+                return "\n".join(page.get_text("text") for page in doc)
+        except Exception as e:
+            print(f"⚠️ PyMuPDF a échoué sur {pdf_path.name} ({e}), parseur de secours")
+
+    try:
+        if USE_PDFPLUMBER:
+            with pdfplumber.open(pdf_path) as pdf:
+                return "\n".join([p.extract_text() or "" for p in pdf.pages])
+        elif PyPDF2 is not None:
+            with open(pdf_path, "rb") as f:
+                reader = PyPDF2.PdfReader(f)
+                return "\n".join([p.extract_text() or "" for p in reader.pages])
+        return "Erreur lecture PDF: aucun parseur PDF installé"
+    except Exception as e:
+        return f"Erreur lecture PDF: {e}"
+
+
 class CharacterManager:
-    """Gestion des fiches de personnages"""
+    """Gestion des fiches de personnages
+    
+    Partagé par tout le processus : chargement, rafraîchissement et recherche
+    sont sérialisés par un verrou (un thread par session Streamlit).
+    """
     
     def __init__(self, char_dir: Path):
         self.char_dir = char_dir
         self.char_dir.mkdir(parents=True, exist_ok=True)
         self._characters: Optional[List[Character]] = None
+        # Fiches déjà parsées, indexées par chemin avec leur mtime au moment du parsing
+        self._mtimes: Dict[Path, float] = {}
+        self._by_path: Dict[Path, Character] = {}
+        self._by_name: Dict[str, Character] = {}
+        # Résultats de recherche par requête, invalidés à chaque rechargement
+        self._search_cache: Dict[str, List[Character]] = {}
+        self._lock = threading.RLock()
     
     @property
     def characters(self) -> List[Character]:
         """Liste des personnages (avec cache)"""
-        if self._characters is None:
-            self._characters = self._load_characters()
-        return self._characters
+        with self._lock:
+            if self._characters is None:
+                self._characters = self._load_characters()
+                self._search_cache.clear()
+            return self._characters
     
     def refresh(self):
-        """Force le rechargement des personnages"""
-        self._characters = None
+        """Recharge les personnages si le répertoire a changé (mtime des fichiers)"""
+        with self._lock:
+            if self._characters is not None and not self._has_changed():
+                return
+            self._characters = None
     
-    def _load_characters(self) -> List[Character]:
-        """Charge tous les personnages du répertoire"""
-        characters = []
-        
+    def _iter_files(self) -> Iterator[Path]:
+        """Fiches du répertoire, énumérées paresseusement"""
         if not self.char_dir.exists():
-            return characters
-        
-        for file_path in sorted(self.char_dir.iterdir()):
-            if not file_path.is_file():
-                continue
-            
-            suffix = file_path.suffix.lower()
-            if suffix not in [".txt", ".md", ".pdf"]:
+            return iter(())
+        return chain.from_iterable(self.char_dir.glob(p) for p in _CHARACTER_PATTERNS)
+    
+    def _has_changed(self) -> bool:
+        """Compare le répertoire au dernier chargement, arrêt au premier écart"""
+        seen = 0
+        for file_path in self._iter_files():
+            try:
+                st = file_path.stat()
+            except OSError:
+                return True
+            if not stat.S_ISREG(st.st_mode):
                 continue
-            
+            if self._mtimes.get(file_path) != st.st_mtime:
+                return True
+            seen += 1
+        return seen != len(self._mtimes)
+    
+    def _scan_mtimes(self) -> Dict[Path, float]:
+        """mtime de chaque fiche du répertoire (un simple stat par fichier)"""
+        mtimes = {}
+        for file_path in self._iter_files():
             try:
-                content = self._load_file(file_path)
-                is_pdf = (file_path.suffix.lower() == ".pdf")
-                characters.append(Character(
+                st = file_path.stat()
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                mtimes[file_path] = st.st_mtime
+        
+        return mtimes
+    
+    def _load_characters(self) -> List[Character]:
+        """Liste les personnages du répertoire (les fiches inchangées sont conservées)"""
+        current = self._scan_mtimes()
+        by_path = {}
+        
+        for file_path in sorted(current):
+            cached = self._by_path.get(file_path)
+            if cached is not None and self._mtimes.get(file_path) == current[file_path]:
+                by_path[file_path] = cached
+            else:
+                # Contenu lu au premier accès (voir Character.content)
+                by_path[file_path] = Character(
                     name=file_path.stem,
                     file_path=file_path,
-                    content=content,
-                    is_pdf=is_pdf
-                ))
-            except Exception as e:
-                print(f"Erreur chargement {file_path.name}: {e}")
+                    is_pdf=(file_path.suffix.lower() == ".pdf")
+                )
         
+        self._mtimes = current
+        self._by_path = by_path
+        characters = [by_path[p] for p in sorted(by_path)]
+        # Index par nom : en cas d'homonymes (.txt et .pdf), la première fiche l'emporte
+        self._by_name = {}
+        for char in characters:
+            self._by_name.setdefault(char.name, char)
         return characters
     
+    def _ensure_loaded(self, characters: List[Character]):
+        """Charge d'un coup le contenu des fiches pas encore lues (PDF en parallèle)"""
+        pending = {c.file_path: c for c in characters if not c.is_loaded}
+        for file_path, content in self._read_files(list(pending)):
+            if isinstance(content, Exception):
+                print(f"Erreur chargement {file_path.name}: {content}")
+                content = f"Erreur lecture fichier: {content}"
+            pending[file_path]._content = content
+    
+    def _read_files(self, paths: List[Path]) -> Iterator[Tuple[Path, object]]:
+        """Lit les fiches à (re)charger ; les PDF sont parsés en parallèle s'il y en a plusieurs"""
+        pdfs = [p for p in paths if p.suffix.lower() == ".pdf"]
+        if len(pdfs) < 2:
+            for file_path in paths:
+                try:
+                    yield file_path, self._load_file(file_path)
+                except Exception as e:
+                    yield file_path, e
+            return
+        
+        with ProcessPoolExecutor(max_workers=min(len(pdfs), os.cpu_count() or 1)) as pool:
+            futures = {p: pool.submit(_read_character_file, p) for p in pdfs}
+            for file_path in paths:
+                fut = futures.get(file_path)
+                try:
+                    content = fut.result() if fut else self._load_file(file_path)
+                except BrokenProcessPool:
+                    # Worker tué : on relit la fiche dans le processus courant
+                    try:
+                        content = self._load_file(file_path)
+                    except Exception as e:
+                        content = e
+                except Exception as e:
+                    content = e
+                yield file_path, content
+    
     def _load_file(self, file_path: Path) -> str:
         """Charge le contenu d'un fichier"""
-        if file_path.suffix.lower() == ".pdf":
-            return self._load_pdf(file_path)
-        else:
-            return file_path.read_text(encoding="utf-8", errors="ignore")
-    
-    def _load_pdf(self, pdf_path: Path) -> str:
-        """Charge un PDF"""
-        try:
-            if USE_PDFPLUMBER:
-                with pdfplumber.open(pdf_path) as pdf:
-                    return "\n".join([p.extract_text() or "" for p in pdf.pages])
-            else:
-                with open(pdf_path, "rb") as f:
-                    reader = PyPDF2.PdfReader(f)
-                    return "\n".join([p.extract_text() or "" for p in reader.pages])
-        except Exception as e:
-            return f"Erreur lecture PDF: {e}"
+        return _read_character_file(file_path)
     
     def get_character(self, name: str) -> Optional[Character]:
         """Récupère un personnage par son nom"""
-        for char in self.characters:
-            if char.name == name:
-                return char
-        return None
+        self.characters  # (re)construit l'index si nécessaire
+        return self._by_name.get(name)
     
     def get_character_names(self) -> List[str]:
         """Retourne la liste des noms de personnages"""
@@ -118,45 +293,58 @@ class CharacterManager:
     
     def search_in_characters(self, query: str) -> List[Character]:
         """Recherche dans le contenu des personnages"""
-        query_lower = query.lower()
-        results = []
-        
-        for char in self.characters:
-            if query_lower in char.name.lower() or query_lower in char.content.lower():
-                results.append(char)
+        with self._lock:
+            query_lower = query.lower()
+            characters = self.characters
+            results = self._search_cache.get(query_lower)
+            if results is None:
+                # Seuls les PDF non lus doivent être parsés ; les fiches texte non lues
+                # sont cherchées directement dans le fichier mappé (voir Character.contains)
+                self._ensure_loaded([c for c in characters if c.is_pdf])
+                results = [char for char in characters if char.contains(query_lower)]
+                self._search_cache[query_lower] = results
         
-        return results
+            return list(results)
     
     def add_character(self, name: str, content: str, extension: str = ".txt") -> bool:
         """Ajoute un nouveau personnage"""
-        try:
-            file_path = self.char_dir / f"{name}{extension}"
-            file_path.write_text(content, encoding="utf-8")
-            self.refresh()
-            return True
-        except Exception as e:
-            print(f"Erreur ajout personnage: {e}")
-            return False
-    
-    def delete_character(self, name: str) -> bool:
-        """Supprime un personnage"""
-        char = self.get_character(name)
-        if char:
+        with self._lock:
             try:
-                char.file_path.unlink()
+                file_path = self.char_dir / f"{name}{extension}"
+                file_path.write_text(content, encoding="utf-8")
+                # Fiche réécrite : relue même si le mtime n'a pas bougé (résolution du FS)
+                self._mtimes.pop(file_path, None)
                 self.refresh()
                 return True
             except Exception as e:
-                print(f"Erreur suppression personnage: {e}")
+                print(f"Erreur ajout personnage: {e}")
                 return False
-        return False
+    
+    def delete_character(self, name: str) -> bool:
+        """Supprime un personnage"""
+        with self._lock:
+            char = self.get_character(name)
+            if char:
+                try:
+                    char.file_path.unlink()
+                    self.refresh()
+                    return True
+                except Exception as e:
+                    print(f"Erreur suppression personnage: {e}")
+                    return False
+            return False
     
     def export_all_as_text(self) -> str:
         """Exporte tous les personnages en un seul texte"""
-        lines = []
-        for char in self.characters:
-            lines.append(f"=== {char.name} ===\n")
-            lines.append(char.content)
-            lines.append("\n" + "="*50 + "\n")
+        with self._lock:
+            characters = self.characters
+            self._ensure_loaded(characters)
+            separator = "\n" + "=" * 50 + "\n"
+        
+            def _emit() -> Iterator[str]:
+                for char in characters:
+                    yield f"=== {char.name} ===\n"
+                    yield char.content
+                    yield separator
         
-        return "\n".join(lines)
\ No newline at end of file
+            return "\n".join(_emit())
\ No newline at end of file
@@ -3,11 +3,31 @@ core/memory.py
 Gestion de la mémoire des sessions (MJ et Encyclopédique)
 """
 
+import os
 import json
+import mmap
+import threading
+from collections import deque
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+from .utils import read_json, write_json
+
+try:
+    import orjson
+
+    def _dumps_line(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps_line(obj) -> bytes:
+        return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+    _loads = json.loads
+
 
 class MemoryEntry:
     """Représente un échange dans la mémoire"""
@@ -38,94 +58,272 @@ class MemoryEntry:
 
 
 class Memory:
-    """Gestion de la mémoire avec limite de taille"""
+    """Gestion de la mémoire avec limite de taille
+    
+    Stockage en colonnes (users / assistants / timestamps), chacune une
+    deque(maxlen=max_size) : l'ajout évince le plus ancien échange en O(1), et
+    les exports et le formatage du prompt travaillent par zip sans objet intermédiaire.
+    
+    Persistance en JSONL append-only : chaque échange ajouté est écrit sur une
+    ligne en fin de fichier. Le fichier est compacté (réécrit intégralement)
+    tous les COMPACT_EVERY échanges au-delà de max_size.
+    
+    Une instance est partagée par tout le processus (st.cache_resource dans
+    l'application) : tous les onglets voient la même mémoire, et les méthodes
+    qui la lisent, la modifient ou l'écrivent sont sérialisées par un verrou
+    (les scripts Streamlit de chaque session tournent dans leur propre thread).
+    """
+    
+    COMPACT_EVERY = 10
     
     def __init__(self, max_size: int, memory_file: Optional[Path] = None):
         self.max_size = max_size
         self.memory_file = memory_file
-        self.entries: List[MemoryEntry] = []
+        self._lock = threading.RLock()
+        self._lines_on_disk = 0
+        self._set_columns([], [], [])
         
-        if memory_file and memory_file.exists():
+        if memory_file:
             self.load()
     
-    def add(self, user_message: str, assistant_message: str):
-        """Ajoute un nouvel échange"""
-        entry = MemoryEntry(user_message, assistant_message)
-        self.entries.append(entry)
-        
-        # Limite la taille
-        if len(self.entries) > self.max_size:
-            self.entries = self.entries[-self.max_size:]
+    def _set_columns(self, users: List[str], assistants: List[str], timestamps: List[str]):
+        # Toute réaffectation (chargement de session, etc.) invalide les caches
+        # et désynchronise le fichier : la prochaine écriture sera une réécriture complète
+        self.users = deque(users, maxlen=self.max_size)
+        self.assistants = deque(assistants, maxlen=self.max_size)
+        self.timestamps = deque(timestamps, maxlen=self.max_size)
+        self._dict_cache = None
+        self._format_cache = None
+        self._formatted = None  # (préfixes, deque des échanges déjà formatés)
+        self._disk_in_sync = False
+    
+    @property
+    def entries(self) -> List[MemoryEntry]:
+        """Vue objet des échanges (compatibilité ; préférer les colonnes ou to_dict_list)"""
+        return [
+            MemoryEntry(u, a, t)
+            for u, a, t in zip(self.users, self.assistants, self.timestamps)
+        ]
+    
+    @entries.setter
+    def entries(self, value: List[MemoryEntry]):
+        self._set_columns(
+            [e.user for e in value],
+            [e.assistant for e in value],
+            [e.timestamp for e in value]
+        )
+    
+    def replace_all(self, new_entries: List[MemoryEntry]):
+        """Remplace tous les échanges (chargement de session) en une seule réécriture du fichier"""
+        with self._lock:
+            self.entries = list(new_entries)[-self.max_size:]
+            if self.memory_file:
+                self.save()
+    
+    def to_dict_list(self) -> List[Dict[str, str]]:
+        """Échanges en dictionnaires (cache invalidé à chaque modification)"""
+        with self._lock:
+            if self._dict_cache is None:
+                self._dict_cache = [
+                    {"user": u, "assistant": a, "timestamp": t}
+                    for u, a, t in zip(self.users, self.assistants, self.timestamps)
+                ]
+            return self._dict_cache
+    
+    def add(self, user_message: str, assistant_message: str) -> str:
+        """Ajoute un nouvel échange et retourne son horodatage
+
+        L'horodatage est fixé sous le verrou : l'appelant n'a pas à relire
+        timestamps[-1], qu'une autre session peut avoir modifié entre-temps.
+        """
+        with self._lock:
+            timestamp = datetime.now().isoformat()
+            self.users.append(user_message)
+            self.assistants.append(assistant_message)
+            self.timestamps.append(timestamp)
+            self._dict_cache = None
+            self._format_cache = None
+            if self._formatted is not None:
+                # deque(maxlen=max_size) : suit le même élagage que les colonnes
+                (prefix_user, prefix_assistant), formatted = self._formatted
+                formatted.append(f"{prefix_user}: {user_message}\n{prefix_assistant}: {assistant_message}")
         
-        # Auto-save si fichier défini
-        if self.memory_file:
-            self.save()
+            # Auto-save si fichier défini : ajout d'une ligne, compaction périodique
+            if self.memory_file:
+                if self._disk_in_sync and self._lines_on_disk < self.max_size + self.COMPACT_EVERY:
+                    self._append({"user": user_message, "assistant": assistant_message, "timestamp": timestamp})
+                else:
+                    self.save()
+            return timestamp
     
-    def get_recent(self, n: int) -> List[MemoryEntry]:
-        """Récupère les n derniers échanges"""
-        return self.entries[-n:] if self.entries else []
+    def get_recent(self, n: int, reverse: bool = False) -> List[Tuple[str, str, str]]:
+        """Récupère les n derniers échanges sous forme de tuples (user, assistant, timestamp)
+
+        Avec reverse=True, le plus récent vient en premier (parcours depuis la fin des deques).
+        """
+        with self._lock:
+            if not self.users or n <= 0:
+                return []
+            # Parcours depuis la fin : O(n) quel que soit max_size
+            recent = list(islice(zip(reversed(self.users), reversed(self.assistants), reversed(self.timestamps)), n))
+            if not reverse:
+                recent.reverse()
+            return recent
     
     def format_for_prompt(self, n: Optional[int] = None, prefix_user: str = "Joueur", prefix_assistant: str = "MJ") -> str:
-        """Formate la mémoire pour injection dans un prompt"""
-        entries = self.get_recent(n) if n else self.entries
-        if not entries:
-            return "Aucune mémoire de partie pour le moment."
+        """Formate la mémoire pour injection dans un prompt
+        
+        Le dernier résultat est conservé tant que la mémoire n'est pas modifiée
+        (les reruns Streamlit ne reconstruisent pas la chaîne).
+        """
+        with self._lock:
+            key = (n, prefix_user, prefix_assistant)
+            if self._format_cache is not None and self._format_cache[0] == key:
+                return self._format_cache[1]
+        
+            if not self.users:
+                text = "Aucune mémoire de partie pour le moment."
+            else:
+                formatted = self._formatted_tail(prefix_user, prefix_assistant)
+                if n and n < len(formatted):
+                    tail = list(islice(reversed(formatted), max(n, 0)))
+                    tail.reverse()
+                    text = "\n\n".join(tail)
+                else:
+                    text = "\n\n".join(formatted)
+        
+            self._format_cache = (key, text)
+            return text
+    
+    def _formatted_tail(self, prefix_user: str, prefix_assistant: str) -> deque:
+        """Échanges formatés, tenus à jour incrémentalement par add()
         
-        return "\n\n".join([
-            entry.format_for_prompt(prefix_user, prefix_assistant)
-            for entry in entries
-        ])
+        Reconstruit uniquement si les préfixes changent ou après une réaffectation.
+        """
+        prefixes = (prefix_user, prefix_assistant)
+        if self._formatted is None or self._formatted[0] != prefixes:
+            formatted = deque(
+                (f"{prefix_user}: {u}\n{prefix_assistant}: {a}" for u, a in zip(self.users, self.assistants)),
+                maxlen=self.max_size
+            )
+            self._formatted = (prefixes, formatted)
+        return self._formatted[1]
     
     def clear(self):
         """Efface la mémoire"""
-        self.entries = []
-        if self.memory_file:
-            self.save()
+        with self._lock:
+            self._set_columns([], [], [])
+            if self.memory_file:
+                self.save()
     
     def save(self):
-        """Sauvegarde la mémoire"""
-        if not self.memory_file:
-            return
+        """Sauvegarde complète de la mémoire (réécrit le fichier JSONL)"""
+        with self._lock:
+            if not self.memory_file:
+                return
         
-        try:
-            self.memory_file.parent.mkdir(parents=True, exist_ok=True)
-            data = [entry.to_dict() for entry in self.entries]
-            self.memory_file.write_text(
-                json.dumps(data, ensure_ascii=False, indent=2),
-                encoding="utf-8"
-            )
-        except Exception as e:
-            print(f"Erreur sauvegarde mémoire: {e}")
+            try:
+                self.memory_file.parent.mkdir(parents=True, exist_ok=True)
+                self.memory_file.write_bytes(
+                    b"".join(_dumps_line(e) for e in self.to_dict_list())
+                )
+                self._disk_in_sync = True
+                self._lines_on_disk = len(self.users)
+            except Exception as e:
+                print(f"Erreur sauvegarde mémoire: {e}")
+    
+    def _append(self, record: Dict[str, str]):
+        """Ajoute un échange en fin de fichier (O(1) quelle que soit la taille)"""
+        with self._lock:
+            try:
+                with open(self.memory_file, "ab") as f:
+                    f.write(_dumps_line(record))
+                self._lines_on_disk += 1
+            except Exception as e:
+                print(f"Erreur sauvegarde mémoire: {e}")
+                self._disk_in_sync = False
     
     def load(self):
-        """Charge la mémoire depuis le fichier"""
-        if not self.memory_file or not self.memory_file.exists():
-            return
+        """Charge la mémoire depuis le fichier (JSONL, ou ancien format JSON)"""
+        with self._lock:
+            if not self.memory_file:
+                return
         
-        try:
-            data = json.loads(self.memory_file.read_text(encoding="utf-8"))
-            self.entries = [MemoryEntry.from_dict(e) for e in data]
+            try:
+                data, legacy, complete, line_count = [], False, True, 0
+                try:
+                    f = open(self.memory_file, "rb")
+                except FileNotFoundError:
+                    # Pas encore de fichier : mémoire vide, sans stat préalable
+                    return
+                with f:
+                    # Fichier mappé en mémoire : pas de copie read() de tout l'historique
+                    if os.fstat(f.fileno()).st_size > 0:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            complete = mm[-1:] == b"\n"
+                            if mm[:64].lstrip().startswith(b"["):
+                                # Ancien format : liste JSON complète, convertie en JSONL à la prochaine écriture
+                                data = _loads(mm[:])
+                                legacy = True
+                            else:
+                                lines = [line for line in iter(mm.readline, b"") if line.strip()]
+                                line_count = len(lines)
+                                # Seules les max_size dernières lignes valides sont décodées
+                                for line in reversed(lines):
+                                    if len(data) >= self.max_size:
+                                        break
+                                    try:
+                                        data.append(_loads(line))
+                                    except json.JSONDecodeError:
+                                        # Ligne tronquée (écriture interrompue) : ignorée
+                                        continue
+                                data.reverse()
             
-            # Limite après chargement
-            if len(self.entries) > self.max_size:
-                self.entries = self.entries[-self.max_size:]
-        except Exception as e:
-            print(f"Erreur chargement mémoire: {e}")
-            self.entries = []
+                # Limite après chargement
+                kept = data[-self.max_size:] if len(data) > self.max_size else data
+            
+                records = [
+                    {"user": e["user"], "assistant": e["assistant"],
+                     "timestamp": e.get("timestamp") or datetime.now().isoformat()}
+                    for e in kept
+                ]
+                self._set_columns(
+                    [r["user"] for r in records],
+                    [r["assistant"] for r in records],
+                    [r["timestamp"] for r in records]
+                )
+                # Les dictionnaires relus servent directement de cache à to_dict_list
+                # (sauvegarde de session ou export juste après le chargement)
+                self._dict_cache = records
+            
+                # Fichier non terminé par un saut de ligne : réécriture complète avant tout ajout
+                self._disk_in_sync = not legacy and complete
+                self._lines_on_disk = len(data) if legacy else line_count
+            except Exception as e:
+                print(f"Erreur chargement mémoire: {e}")
+                self._set_columns([], [], [])
     
     def __len__(self) -> int:
-        return len(self.entries)
+        return len(self.users)
     
     def __bool__(self) -> bool:
-        return len(self.entries) > 0
+        return len(self.users) > 0
 
 
 class SessionManager:
-    """Gestion des sessions complètes"""
+    """Gestion des sessions complètes
+    
+    Partagé par tout le processus : les écritures (instantanés, journal) sont
+    sérialisées par un verrou.
+    """
+    
+    AUTO_SAVE_METADATA = {"auto_save": True}
     
     def __init__(self, save_dir: Path):
         self.save_dir = save_dir
         self.save_dir.mkdir(parents=True, exist_ok=True)
+        self._journal_lines: Dict[str, int] = {}  # lignes de journal .jsonl par session
+        self._lock = threading.RLock()
     
     def save_session(
         self,
@@ -135,41 +333,118 @@ class SessionManager:
         metadata: Optional[Dict[str, Any]] = None
     ) -> bool:
         """Sauvegarde une session complète"""
-        try:
-            session_file = self.save_dir / f"{session_name}.json"
-            data = {
-                "session_name": session_name,
-                "timestamp": datetime.now().isoformat(),
-                "mj_memory": [e.to_dict() for e in mj_memory.entries],
-                "encyclo_memory": [e.to_dict() for e in encyclo_memory.entries],
-                "metadata": metadata or {}
-            }
+        with self._lock:
+            try:
+                session_file = self.save_dir / f"{session_name}.json"
+                data = {
+                    "session_name": session_name,
+                    "timestamp": datetime.now().isoformat(),
+                    "mj_memory": mj_memory.to_dict_list(),
+                    "encyclo_memory": encyclo_memory.to_dict_list(),
+                    "metadata": metadata or {}
+                }
             
-            session_file.write_text(
-                json.dumps(data, ensure_ascii=False, indent=2),
-                encoding="utf-8"
-            )
-            return True
-        except Exception as e:
-            print(f"Erreur sauvegarde session: {e}")
-            return False
+                # Fichier machine (relu par load_session uniquement) : sérialisation compacte
+                write_json(session_file, data, indent=False)
+                # L'instantané contient déjà tout : le journal éventuel est obsolète
+                (self.save_dir / f"{session_name}.jsonl").unlink(missing_ok=True)
+                self._journal_lines[session_name] = 0
+                return True
+            except Exception as e:
+                print(f"Erreur sauvegarde session: {e}")
+                return False
+    
+    def append_entry(self, session_name: str, role: str, entry: Dict[str, str]) -> bool:
+        """Ajoute un échange au journal JSONL de la session (O(1), sans réécrire la session)
+        
+        role : "mj" ou "encyclo". Le journal est rejoué par load_session après
+        le dernier instantané complet.
+        """
+        with self._lock:
+            try:
+                count = self._journal_length(session_name)
+                with open(self.save_dir / f"{session_name}.jsonl", "ab") as f:
+                    f.write(_dumps_line({"role": role, **entry}))
+                self._journal_lines[session_name] = count + 1
+                return True
+            except Exception as e:
+                print(f"Erreur sauvegarde session: {e}")
+                return False
+    
+    def auto_save(
+        self,
+        session_name: str,
+        role: str,
+        entry: Dict[str, str],
+        mj_memory: Memory,
+        encyclo_memory: Memory,
+        snapshot: bool = False
+    ) -> bool:
+        """Auto-save borné : une ligne de journal par échange, sinon instantané complet
+        
+        L'instantané (qui supprime le journal) est écrit si snapshot est demandé
+        (tous les auto_save_interval échanges) ou dès que le journal atteint la
+        taille des mémoires, comme la compaction de Memory.add : le journal, et
+        donc le rejeu de load_session, reste borné.
+        """
+        with self._lock:
+            limit = max(mj_memory.max_size, encyclo_memory.max_size)
+            if snapshot or self._journal_length(session_name) >= limit:
+                return self.save_session(session_name, mj_memory, encyclo_memory, metadata=self.AUTO_SAVE_METADATA)
+            return self.append_entry(session_name, role, entry)
+    
+    def _journal_length(self, session_name: str) -> int:
+        """Nombre de lignes du journal (compté une fois sur disque, puis suivi en mémoire)"""
+        count = self._journal_lines.get(session_name)
+        if count is None:
+            try:
+                with open(self.save_dir / f"{session_name}.jsonl", "rb") as f:
+                    count = sum(1 for line in f if line.strip())
+            except FileNotFoundError:
+                count = 0
+            self._journal_lines[session_name] = count
+        return count
     
     def load_session(
         self,
         session_name: str
     ) -> Optional[Dict[str, Any]]:
-        """Charge une session"""
+        """Charge une session (instantané .json + journal .jsonl s'il existe)"""
         try:
             session_file = self.save_dir / f"{session_name}.json"
-            if not session_file.exists():
-                return None
+            journal_file = self.save_dir / f"{session_name}.jsonl"
             
-            data = json.loads(session_file.read_text(encoding="utf-8"))
+            # Ouverture directe plutôt que exists() puis lecture
+            try:
+                data = read_json(session_file)
+            except FileNotFoundError:
+                if not journal_file.exists():
+                    return None
+                data = {"session_name": session_name}
             
             # Convertir en objets Memory
             mj_entries = [MemoryEntry.from_dict(e) for e in data.get("mj_memory", [])]
             encyclo_entries = [MemoryEntry.from_dict(e) for e in data.get("encyclo_memory", [])]
             
+            # Rejouer le journal des auto-saves
+            try:
+                journal = open(journal_file, "rb")
+            except FileNotFoundError:
+                journal = None
+            if journal is not None:
+                with journal as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            record = _loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        target = mj_entries if record.get("role") == "mj" else encyclo_entries
+                        target.append(MemoryEntry.from_dict(record))
+                        data["timestamp"] = record.get("timestamp", data.get("timestamp"))
+            
             return {
                 "session_name": data.get("session_name"),
                 "timestamp": data.get("timestamp"),
@@ -186,21 +461,25 @@ class SessionManager:
         if not self.save_dir.exists():
             return []
         
-        return sorted([
-            f.stem for f in self.save_dir.glob("*.json")
-        ])
+        return sorted({
+            f.stem for pattern in ("*.json", "*.jsonl") for f in self.save_dir.glob(pattern)
+        })
     
     def delete_session(self, session_name: str) -> bool:
         """Supprime une session"""
-        try:
-            session_file = self.save_dir / f"{session_name}.json"
-            if session_file.exists():
-                session_file.unlink()
-                return True
-            return False
-        except Exception as e:
-            print(f"Erreur suppression session: {e}")
-            return False
+        with self._lock:
+            try:
+                deleted = False
+                for suffix in (".json", ".jsonl"):
+                    session_file = self.save_dir / f"{session_name}{suffix}"
+                    if session_file.exists():
+                        session_file.unlink()
+                        deleted = True
+                self._journal_lines.pop(session_name, None)
+                return deleted
+            except Exception as e:
+                print(f"Erreur suppression session: {e}")
+                return False
 
 
 class Statistics:
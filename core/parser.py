@@ -6,6 +6,14 @@ Parsing des réponses du LLM pour extraire les éléments structurés
 import re
 from typing import List, Dict, Tuple, Any
 from dataclasses import dataclass, field
+from functools import lru_cache
+
+# Moteur DFA optionnel (pip install google-re2) : temps linéaire garanti, sans
+# retour arrière catastrophique sur une sortie LLM mal formée
+try:
+    import re2 as _entity_re_engine
+except ImportError:
+    _entity_re_engine = re
 
 
 @dataclass
@@ -36,15 +44,53 @@ class ResponseParser:
     LOCATION_PATTERN = r"\[Lieu\s*:\s*([^\]:]+?)\s*:\s*([^\]]+?)\]"
     INTRIGUE_PATTERN = r"\[Intrigue\s*:\s*([^\]:]+?)\s*:\s*([^\]]+?)\]"
     
+    # Versions compilées une fois au chargement de la classe. Le 3e motif
+    # (« - Option N: ») n'est pas essayé : tout texte qu'il reconnaît l'est déjà
+    # par le 1er (insensible à la casse), il ne ferait qu'un balayage de plus
+    # sur chaque réponse sans option
+    _OPTION_RES = tuple(re.compile(p, re.MULTILINE | re.DOTALL | re.IGNORECASE) for p in OPTION_PATTERNS[:2])
+    # Les trois marqueurs fusionnés : un seul passage sur le texte
+    # (drapeau en ligne (?i) : syntaxe commune à re et re2)
+    _ENTITY_RE = _entity_re_engine.compile(
+        r"(?i)\[(?P<kind>PNJ|Lieu|Intrigue)\s*:\s*([^\]:]+?)\s*:\s*([^\]]+?)\]"
+    )
+    _ENTITY_FIELDS = {"pnj": "npcs", "lieu": "locations", "intrigue": "intrigues"}
+    # Patterns publics précompilés pour extract_entities
+    _COMPILED_ENTITY_PATTERNS = {
+        p: re.compile(p, re.IGNORECASE)
+        for p in (NPC_PATTERN, LOCATION_PATTERN, INTRIGUE_PATTERN)
+    }
+    _BLANK_LINES_RE = re.compile(r"\n{3,}")
+    
     @classmethod
     def parse(cls, response_text: str) -> ParsedResponse:
-        """Parse une réponse complète"""
+        """Parse une réponse complète
+        
+        Le résultat du parsing est mémoïsé par texte (réponses rejouées à chaque
+        rerun Streamlit) ; un ParsedResponse neuf est rendu à chaque appel.
+        """
+        options, npcs, locations, intrigues = _parse_fields(response_text)
         return ParsedResponse(
             raw_text=response_text,
-            options=cls.extract_options(response_text),
-            npcs=cls.extract_entities(response_text, cls.NPC_PATTERN),
-            locations=cls.extract_entities(response_text, cls.LOCATION_PATTERN),
-            intrigues=cls.extract_entities(response_text, cls.INTRIGUE_PATTERN)
+            options=list(options),
+            npcs=dict(npcs),
+            locations=dict(locations),
+            intrigues=dict(intrigues)
+        )
+    
+    @classmethod
+    def _parse_uncached(cls, response_text: str):
+        """Options et entités sous forme immuable (tuples), sans mémoïsation"""
+        fields = {"npcs": {}, "locations": {}, "intrigues": {}}
+        # Sans crochet, aucun marqueur possible : balayage regex évité
+        if "[" in response_text:
+            for m in cls._ENTITY_RE.finditer(response_text):
+                fields[cls._ENTITY_FIELDS[m.group("kind").lower()]][m.group(2).strip()] = m.group(3).strip()
+        return (
+            tuple(cls.extract_options(response_text)),
+            tuple(fields["npcs"].items()),
+            tuple(fields["locations"].items()),
+            tuple(fields["intrigues"].items()),
         )
     
     @classmethod
@@ -53,8 +99,8 @@ class ResponseParser:
         options = []
         
         # Essayer chaque pattern
-        for pattern in cls.OPTION_PATTERNS:
-            matches = re.findall(pattern, text, re.MULTILINE | re.DOTALL | re.IGNORECASE)
+        for pattern in cls._OPTION_RES:
+            matches = pattern.findall(text)
             if matches:
                 options = [match[1].strip() for match in matches]
                 break
@@ -65,7 +111,10 @@ class ResponseParser:
     def extract_entities(cls, text: str, pattern: str) -> Dict[str, str]:
         """Extrait les entités (PNJ, Lieux, Intrigues)"""
         entities = {}
-        matches = re.findall(pattern, text, re.IGNORECASE)
+        compiled = cls._COMPILED_ENTITY_PATTERNS.get(pattern)
+        if compiled is None:
+            compiled = re.compile(pattern, re.IGNORECASE)
+        matches = compiled.findall(text)
         
         for name, status in matches:
             entities[name.strip()] = status.strip()
@@ -76,16 +125,51 @@ class ResponseParser:
     def clean_response(cls, text: str) -> str:
         """Nettoie la réponse en retirant les marqueurs structurels"""
         # Retire les marqueurs [PNJ:...], [Lieu:...], [Intrigue:...]
-        text = re.sub(cls.NPC_PATTERN, "", text, flags=re.IGNORECASE)
-        text = re.sub(cls.LOCATION_PATTERN, "", text, flags=re.IGNORECASE)
-        text = re.sub(cls.INTRIGUE_PATTERN, "", text, flags=re.IGNORECASE)
+        if "[" in text:
+            text = cls._ENTITY_RE.sub("", text)
         
         # Nettoie les lignes vides multiples
-        text = re.sub(r"\n{3,}", "\n\n", text)
+        text = cls._BLANK_LINES_RE.sub("\n\n", text)
         
         return text.strip()
 
 
+@lru_cache(maxsize=128)
+def _parse_fields(response_text: str):
+    """Cache du parsing : valeurs immuables, les appelants peuvent modifier leur copie"""
+    return ResponseParser._parse_uncached(response_text)
+
+
+# Mots-clés de statut -> icône, testés dans l'ordre (le premier trouvé l'emporte)
+_NPC_ICONS = (
+    ("ami", "🤝"), ("allié", "🤝"),
+    ("ennemi", "⚔️"), ("hostile", "⚔️"),
+    ("neutre", "😐"),
+    ("mort", "💀"),
+)
+_LOCATION_ICONS = (
+    ("visité", "✅"), ("découvert", "✅"),
+    ("inconnu", "❌"), ("non visité", "❌"),
+    ("dangereux", "⚠️"),
+)
+_INTRIGUE_ICONS = (
+    ("résolue", "🟢"), ("terminée", "🟢"),
+    ("en cours", "🟡"), ("active", "🟡"),
+    ("bloquée", "🔴"), ("échouée", "🔴"),
+    ("partielle", "🟠"),
+)
+
+
+@lru_cache(maxsize=512)
+def _match_icon(table: Tuple[Tuple[str, str], ...], status: str, default: str) -> str:
+    """Icône du premier mot-clé présent dans le statut (mémoïsé : peu de statuts distincts)"""
+    status_lower = status.lower()
+    for keyword, icon in table:
+        if keyword in status_lower:
+            return icon
+    return default
+
+
 class GameState:
     """État du jeu (PNJ, lieux, intrigues)"""
     
@@ -102,43 +186,15 @@ class GameState:
     
     def get_npc_icon(self, status: str) -> str:
         """Retourne une icône pour un statut de PNJ"""
-        status_lower = status.lower()
-        if "ami" in status_lower or "allié" in status_lower:
-            return "🤝"
-        elif "ennemi" in status_lower or "hostile" in status_lower:
-            return "⚔️"
-        elif "neutre" in status_lower:
-            return "😐"
-        elif "mort" in status_lower:
-            return "💀"
-        else:
-            return "❓"
+        return _match_icon(_NPC_ICONS, status, "❓")
     
     def get_location_icon(self, status: str) -> str:
         """Retourne une icône pour un statut de lieu"""
-        status_lower = status.lower()
-        if "visité" in status_lower or "découvert" in status_lower:
-            return "✅"
-        elif "inconnu" in status_lower or "non visité" in status_lower:
-            return "❌"
-        elif "dangereux" in status_lower:
-            return "⚠️"
-        else:
-            return "📍"
+        return _match_icon(_LOCATION_ICONS, status, "📍")
     
     def get_intrigue_icon(self, status: str) -> str:
         """Retourne une icône pour un statut d'intrigue"""
-        status_lower = status.lower()
-        if "résolue" in status_lower or "terminée" in status_lower:
-            return "🟢"
-        elif "en cours" in status_lower or "active" in status_lower:
-            return "🟡"
-        elif "bloquée" in status_lower or "échouée" in status_lower:
-            return "🔴"
-        elif "partielle" in status_lower:
-            return "🟠"
-        else:
-            return "⚪"
+        return _match_icon(_INTRIGUE_ICONS, status, "⚪")
     
     def to_dict(self) -> Dict[str, Any]:
         """Export en dictionnaire"""
@@ -7,20 +7,29 @@ import os
 import pickle
 import shutil
 import hashlib
-import json
+import sqlite3
+import uuid
+from array import array
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, Iterator
 import streamlit as st
 
+from .utils import read_json, write_json
+
 # Imports LangChain - obligatoires
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.prompts import PromptTemplate
 from langchain_core.callbacks import BaseCallbackHandler
 from langchain_ollama import ChatOllama
 from langchain_core.tools import tool
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableParallel, RunnablePassthrough
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 # Import de l'agent pour les outils personnalisés
@@ -57,6 +66,8 @@ try:
     import fitz  # PyMuPDF
     USE_PYMUPDF = True
     USE_PDFPLUMBER = False
+    # Extraction "dict" sans les images : seuls les blocs texte sont exploités
+    _DICT_FLAGS = getattr(fitz, "TEXTFLAGS_DICT", 0) & ~getattr(fitz, "TEXT_PRESERVE_IMAGES", 0) or None
 except ImportError:
     USE_PYMUPDF = False
     try:
@@ -92,6 +103,46 @@ except ImportError:
     SEMANTIC_CHUNKER_AVAILABLE = False
     print("⚠️ SemanticChunker non disponible. Installe avec: pip install langchain-experimental")
 
+# Réglages du client Chroma (télémétrie coupée) ; absents sur les très vieilles versions
+try:
+    from chromadb.config import Settings as ChromaSettings
+    CHROMA_SETTINGS_AVAILABLE = True
+except ImportError:
+    CHROMA_SETTINGS_AVAILABLE = False
+
+# Chroma refuse les lots au-delà de ~5461 éléments
+CHROMA_MAX_BATCH = 5000
+
+# Splitter à taille fixe en Rust (optionnel, rag.rust_splitter: true)
+try:
+    from semantic_text_splitter import TextSplitter as _RustSplitter
+    RUST_SPLITTER_AVAILABLE = True
+except ImportError:
+    RUST_SPLITTER_AVAILABLE = False
+
+# Import pour le backend FAISS (optionnel, rag.vector_backend: "faiss")
+try:
+    import faiss
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Import pour la confiance compilée (optionnel)
+try:
+    import numpy as np
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Hash des chunks pour le cache d'embeddings : blake3 si installé, sinon sha1
+try:
+    from blake3 import blake3 as _content_hash
+except ImportError:
+    _content_hash = hashlib.sha1
+
 # Import pour hybrid search (BM25)
 try:
     from langchain_community.retrievers.bm25 import BM25Retriever
@@ -101,6 +152,24 @@ except Exception:
     print("⚠️ BM25 non disponible. Installe avec: pip install rank_bm25")
 
 
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _confidence(scores):
+        total = 0.0
+        for s in scores:
+            total += min(max(s, 0.0), 1.0)
+        return total / scores.shape[0]
+
+
+def relevance_confidence(scores) -> float:
+    """Confiance moyenne (0-1) à partir des scores de pertinence des documents."""
+    if not len(scores):
+        return 0.0
+    if NUMBA_AVAILABLE:
+        return float(_confidence(np.asarray(scores, dtype=np.float64)))
+    return sum(min(max(s, 0.0), 1.0) for s in scores) / len(scores)
+
+
 class SimpleEnsembleRetriever:
     """Fusion BM25 + vectoriel sans dépendance EnsembleRetriever."""
 
@@ -121,48 +190,182 @@ class SimpleEnsembleRetriever:
                 pass
         return results
 
+class CachedEmbeddings(Embeddings):
+    """Embeddings avec cache persistant (SQLite) indexé par hash (modèle, texte du chunk)
+
+    Reconstruire la base après l'ajout d'un PDF ne recalcule que les chunks
+    nouveaux ou modifiés ; les requêtes ne sont pas mises en cache.
+    """
+
+    def __init__(self, inner: Embeddings, cache_file: Path, model_name: str):
+        self.inner = inner
+        self.cache_file = cache_file
+        self._prefix = model_name.encode("utf-8") + b"\0"
+
+    def _key(self, text: str) -> bytes:
+        # Clés blake3 (32 octets) ou sha1 (20 octets) : jamais de collision entre les deux,
+        # installer blake3 invalide simplement le cache existant une fois
+        return _content_hash(self._prefix + text.encode("utf-8")).digest()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.cache_file))
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL) WITHOUT ROWID"
+        )
+        return conn
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        found: Dict[bytes, List[float]] = {}
+        try:
+            with closing(self._connect()) as conn:
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i + 500]
+                    rows = conn.execute(
+                        f"SELECT hash, vec FROM embeddings WHERE hash IN ({','.join('?' * len(batch))})",
+                        batch
+                    )
+                    for key, blob in rows:
+                        found[key] = array("f", blob).tolist()
+
+                hits = sum(1 for k in keys if k in found)
+                # Un indice par texte manquant distinct
+                misses = list({k: i for i, k in reversed(list(enumerate(keys))) if k not in found}.values())
+                if misses:
+                    vectors = self.inner.embed_documents([texts[i] for i in misses])
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO embeddings (hash, vec) VALUES (?, ?)",
+                            [(keys[i], array("f", v).tobytes()) for i, v in zip(misses, vectors)]
+                        )
+                    for i, v in zip(misses, vectors):
+                        found[keys[i]] = v
+                if hits:
+                    print(f"♻️ Cache embeddings : {hits}/{len(keys)} chunks réutilisés")
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache embeddings indisponible ({e}), calcul direct")
+            return self.inner.embed_documents(texts)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+
+class RustTextSplitter:
+    """Adaptateur semantic-text-splitter (Rust) exposant l'interface utilisée des splitters LangChain"""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self._splitter = _RustSplitter(chunk_size, overlap=chunk_overlap)
+
+    def split_text(self, text: str) -> List[str]:
+        return self._splitter.chunks(text)
+
+    def create_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        return [
+            Document(page_content=chunk, metadata=dict(metadata))
+            for text, metadata in zip(texts, metadatas)
+            for chunk in self._splitter.chunks(text)
+        ]
+
+
 # Import pour typing
 from typing import Any
 
 
+def _worker_init():
+    """Initialisation unique d'un worker d'extraction (backend PDF déjà importé avec le module)"""
+    if USE_PYMUPDF:
+        # Les avertissements MuPDF de N workers s'entremêlent dans la console
+        fitz.TOOLS.mupdf_display_errors(False)
+
+
 class DocumentExtractor:
     """Extrait le texte de différents types de documents"""
     
+    # Pool d'extraction conservé entre deux reconstructions du corpus :
+    # l'import des backends PDF n'est payé qu'une fois par worker
+    _pool: Optional[ProcessPoolExecutor] = None
+    _pool_workers = 0
+
+    @classmethod
+    def _get_pool(cls, workers: int) -> ProcessPoolExecutor:
+        """Retourne le pool persistant, recréé seulement si la taille demandée change"""
+        if cls._pool is None or cls._pool_workers != workers:
+            cls.shutdown()
+            cls._pool = ProcessPoolExecutor(max_workers=workers, initializer=_worker_init)
+            cls._pool_workers = workers
+        return cls._pool
+
+    @classmethod
+    def shutdown(cls):
+        """Arrête le pool d'extraction (à appeler en fin d'application si besoin)"""
+        if cls._pool is not None:
+            cls._pool.shutdown(cancel_futures=True)
+            cls._pool = None
+            cls._pool_workers = 0
+    
     @staticmethod
     def calculate_directory_hash(directory: Path) -> Tuple[str, Dict[str, Any]]:
         """Calcule un hash du répertoire et retourne les métadonnées des fichiers"""
         if not directory.exists():
             return "", {}
         
+        entries = DocumentExtractor._scan_corpus(directory)
+
+        # stat() : gratuit sous Windows (données du scandir), un appel système sinon ;
+        # sur les gros corpus (ou disques réseau) les appels sont faits en parallèle
+        if len(entries) >= 256:
+            with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+                stats = list(executor.map(lambda item: item[1].stat(), entries))
+        else:
+            stats = [entry.stat() for _, entry in entries]
+
         file_metadata = {}
-        hash_content = []
+        # Hash global : nom + taille + date modif, séparés par "|" (même valeur
+        # que l'ancien hash de la chaîne jointe, les métadonnées restent valides)
+        hasher = hashlib.md5()
         
-        for file_path in sorted(directory.rglob("*")):
-            if not file_path.is_file():
-                continue
-            
-            suffix = file_path.suffix.lower()
-            if suffix not in [".pdf", ".txt", ".md"]:
-                continue
-            
-            # Métadonnées du fichier
-            stat = file_path.stat()
-            file_info = {
-                "name": file_path.name,
-                "path": str(file_path.relative_to(directory)),
+        for i, ((parts, entry), stat) in enumerate(zip(entries, stats)):
+            relative_path = os.sep.join(parts)
+            file_metadata[relative_path] = {
+                "name": entry.name,
+                "path": relative_path,
                 "size": stat.st_size,
                 "modified": stat.st_mtime
             }
-            file_metadata[str(file_path.relative_to(directory))] = file_info
-            
-            # Pour le hash : nom + taille + date modif
-            hash_content.append(f"{file_path.name}|{stat.st_size}|{stat.st_mtime}")
+            if i:
+                hasher.update(b"|")
+            hasher.update(f"{entry.name}|{stat.st_size}|{stat.st_mtime}".encode())
         
-        # Calculer hash global
-        hash_str = "|".join(hash_content)
-        directory_hash = hashlib.md5(hash_str.encode()).hexdigest()
-        
-        return directory_hash, file_metadata
+        return hasher.hexdigest(), file_metadata
+
+    @staticmethod
+    def _scan_corpus(directory: Path) -> List[Tuple[Tuple[str, ...], os.DirEntry]]:
+        """Parcours récursif par os.scandir des fichiers du corpus (.pdf, .txt, .md)
+
+        Retourne [(parties du chemin relatif, entrée)] dans l'ordre de tri des Path.
+        """
+        found = []
+        stack = [(str(directory), ())]
+        while stack:
+            folder, parts = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            stack.append((entry.path, parts + (entry.name,)))
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in (".pdf", ".txt", ".md"):
+                            found.append((parts + (entry.name,), entry))
+            except OSError:
+                continue
+        # Même ordre que sorted(Path) : par composantes, insensible à la casse sous Windows
+        if os.name == "nt":
+            found.sort(key=lambda item: tuple(p.lower() for p in item[0]))
+        else:
+            found.sort(key=lambda item: item[0])
+        return found
     
     @staticmethod
     def check_if_reload_needed(directory: Path, db_dir: Path) -> Tuple[bool, str]:
@@ -178,27 +381,16 @@ class DocumentExtractor:
         
         # Charger les métadonnées précédentes
         try:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                saved_data = json.load(f)
-                saved_hash = saved_data.get('hash', '')
-                saved_metadata = saved_data.get('files', {})
+            saved_data = read_json(metadata_file)
+            saved_hash = saved_data.get('hash', '')
+            saved_metadata = saved_data.get('files', {})
         except Exception:
             return True, "Métadonnées corrompues"
         
         # Comparer les hash
         if current_hash != saved_hash:
             # Analyser les différences
-            current_files = set(current_metadata.keys())
-            saved_files = set(saved_metadata.keys())
-            
-            added = current_files - saved_files
-            removed = saved_files - current_files
-            modified = []
-            
-            for file_path in current_files & saved_files:
-                if (current_metadata[file_path]['size'] != saved_metadata[file_path]['size'] or
-                    current_metadata[file_path]['modified'] != saved_metadata[file_path]['modified']):
-                    modified.append(file_path)
+            added, removed, modified = DocumentExtractor.diff_metadata(current_metadata, saved_metadata)
             
             # Construire le message de différence
             changes = []
@@ -215,13 +407,66 @@ class DocumentExtractor:
         return False, "Corpus inchangé"
     
     @staticmethod
-    def save_corpus_metadata(directory: Path, db_dir: Path):
-        """Sauvegarde les métadonnées du corpus"""
-        directory_hash, file_metadata = DocumentExtractor.calculate_directory_hash(directory)
+    def diff_metadata(current_metadata: Dict[str, Any], saved_metadata: Dict[str, Any]) -> Tuple[set, set, List[str]]:
+        """Compare deux relevés de fichiers. Retourne (ajoutés, supprimés, modifiés)
+
+        Chaque relevé peut être au format colonnes (sauvegardé) ou par fichier.
+        """
+        # Une empreinte (taille, date) par fichier : une comparaison de tuples par fichier commun
+        current = DocumentExtractor._fingerprints(current_metadata)
+        saved = DocumentExtractor._fingerprints(saved_metadata)
+
+        added = current.keys() - saved.keys()
+        removed = saved.keys() - current.keys()
+        modified = [p for p in current.keys() & saved.keys() if current[p] != saved[p]]
+
+        return added, removed, modified
+
+    @staticmethod
+    def _fingerprints(files: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+        """{chemin: (taille, date)} depuis le format colonnes ou l'ancien format par fichier"""
+        if isinstance(files.get("paths"), list):
+            return dict(zip(files["paths"], zip(files["sizes"], files["mtimes"])))
+        return {p: (m.get('size'), m.get('modified')) for p, m in files.items()}
+
+    @staticmethod
+    def _files_as_columns(file_metadata: Dict[str, Dict[str, Any]]) -> Dict[str, list]:
+        """Relevé par fichier → colonnes (les noms de clés ne sont plus répétés par fichier)"""
+        entries = file_metadata.values()
+        return {
+            "paths": [m["path"] for m in entries],
+            "names": [m["name"] for m in entries],
+            "sizes": [m["size"] for m in entries],
+            "mtimes": [m["modified"] for m in entries],
+        }
+
+    @staticmethod
+    def corpus_changes(directory: Path, db_dir: Path,
+                       precomputed: Optional[Tuple[str, Dict[str, Any]]] = None) -> Optional[Tuple[set, set, List[str]]]:
+        """Fichiers ajoutés/supprimés/modifiés depuis la dernière sauvegarde des métadonnées
+
+        precomputed : résultat de calculate_directory_hash déjà obtenu par l'appelant.
+        Retourne None si les métadonnées sont absentes ou illisibles.
+        """
+        metadata_file = db_dir / "corpus_metadata.json"
+        if not metadata_file.exists():
+            return None
+        try:
+            saved_metadata = read_json(metadata_file).get('files', {})
+        except Exception:
+            return None
+        _, current_metadata = precomputed or DocumentExtractor.calculate_directory_hash(directory)
+        return DocumentExtractor.diff_metadata(current_metadata, saved_metadata)
+
+    @staticmethod
+    def save_corpus_metadata(directory: Path, db_dir: Path,
+                             precomputed: Optional[Tuple[str, Dict[str, Any]]] = None):
+        """Sauvegarde les métadonnées du corpus (precomputed : (hash, fichiers) déjà calculés)"""
+        directory_hash, file_metadata = precomputed or DocumentExtractor.calculate_directory_hash(directory)
         
         metadata = {
             'hash': directory_hash,
-            'files': file_metadata,
+            'files': DocumentExtractor._files_as_columns(file_metadata),
             'timestamp': __import__('datetime').datetime.now().isoformat(),
             'total_files': len(file_metadata)
         }
@@ -229,8 +474,8 @@ class DocumentExtractor:
         metadata_file = db_dir / "corpus_metadata.json"
         db_dir.mkdir(parents=True, exist_ok=True)
         
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        # Fichier machine (relu par read_json uniquement) : pas d'indentation
+        write_json(metadata_file, metadata, indent=False)
     
     @staticmethod
     def extract_from_pdf(pdf_path: Path, max_pages: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -238,8 +483,6 @@ class DocumentExtractor:
 
         Returns: [{"page": int, "text": str, "section": str}, ...]
         """
-        import re as _re
-
         if not USE_PYMUPDF:
             pages_out = []
             try:
@@ -260,137 +503,147 @@ class DocumentExtractor:
             return pages_out
 
         try:
-            doc = fitz.open(pdf_path)
-            num_pages = len(doc) if not max_pages else min(len(doc), max_pages)
-
-            # ── Pass 1 : détection des headers/footers répétitifs ────────────────
-            sample_size = min(num_pages, 40)
-            hf_count = {}
-            for pn in range(sample_size):
-                page = doc[pn]
-                h = page.rect.height
-                for block in page.get_text("blocks"):
-                    if block[6] != 0:
-                        continue
-                    _, y0, _, y1, text = block[:5]
-                    text = text.strip()
-                    if not text or len(text) > 120:
-                        continue
-                    norm = _re.sub(r'\d+', 'N', text).strip()
-                    if not norm:
-                        continue
-                    if y0 < h * 0.09 or y1 > h * 0.91:
-                        hf_count[norm] = hf_count.get(norm, 0) + 1
+            with fitz.open(pdf_path) as doc:
+                return DocumentExtractor._extract_pymupdf(doc, max_pages)
+        except Exception as e:
+            return [{"page": 1, "text": f"[Erreur extraction PDF: {e}]", "section": ""}]
 
-            repeated = {t for t, c in hf_count.items() if c / sample_size > 0.28}
+    @staticmethod
+    def _extract_pymupdf(doc, max_pages: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Extraction PyMuPDF d'un document ouvert (voir extract_from_pdf)"""
+        import re as _re
 
-            # ── Taille de police médiane pour détecter les titres de section ─────
-            font_sizes = []
-            for pn in range(min(10, num_pages)):
-                page = doc[pn]
-                try:
-                    for block in page.get_text("dict")["blocks"]:
-                        if block.get("type") == 0:
-                            for line in block.get("lines", []):
-                                for span in line.get("spans", []):
-                                    sz = span.get("size", 0)
-                                    if sz > 0:
-                                        font_sizes.append(sz)
-                except Exception:
-                    pass
+        num_pages = len(doc) if not max_pages else min(len(doc), max_pages)
+
+        # ── Pass 1 : détection des headers/footers répétitifs ────────────────
+        sample_size = min(num_pages, 40)
+        hf_count = {}
+        for pn in range(sample_size):
+            page = doc[pn]
+            h = page.rect.height
+            for block in page.get_text("blocks"):
+                if block[6] != 0:
+                    continue
+                _, y0, _, y1, text = block[:5]
+                text = text.strip()
+                if not text or len(text) > 120:
+                    continue
+                norm = _re.sub(r'\d+', 'N', text).strip()
+                if not norm:
+                    continue
+                if y0 < h * 0.09 or y1 > h * 0.91:
+                    hf_count[norm] = hf_count.get(norm, 0) + 1
+
+        repeated = {t for t, c in hf_count.items() if c / sample_size > 0.28}
+
+        # ── Taille de police médiane pour détecter les titres de section ─────
+        # Les blocs "dict" des pages échantillonnées sont gardés pour la passe 2
+        font_sizes = []
+        dict_blocks = {}
+        for pn in range(min(10, num_pages)):
+            page = doc[pn]
+            try:
+                dict_blocks[pn] = page.get_text("dict", flags=_DICT_FLAGS)["blocks"]
+                for block in dict_blocks[pn]:
+                    if block.get("type") == 0:
+                        for line in block.get("lines", []):
+                            for span in line.get("spans", []):
+                                sz = span.get("size", 0)
+                                if sz > 0:
+                                    font_sizes.append(sz)
+            except Exception:
+                pass
 
-            if font_sizes:
-                font_sizes.sort()
-                median_font = font_sizes[len(font_sizes) // 2]
-            else:
-                median_font = 11.0
-            title_threshold = median_font * 1.3
+        if font_sizes:
+            font_sizes.sort()
+            median_font = font_sizes[len(font_sizes) // 2]
+        else:
+            median_font = 11.0
+        title_threshold = median_font * 1.3
 
-            # ── Pass 2 : extraction filtrée page par page ─────────────────────────
-            pages_out = []
-            current_section = ""
+        # ── Pass 2 : extraction filtrée page par page ─────────────────────────
+        pages_out = []
+        current_section = ""
 
-            for pn in range(num_pages):
-                try:
-                    page = doc[pn]
-                    h = page.rect.height
-                    page_width = page.rect.width
-                    mid_x = page_width / 2
+        for pn in range(num_pages):
+            try:
+                page = doc[pn]
+                h = page.rect.height
+                page_width = page.rect.width
+                mid_x = page_width / 2
 
+                raw_blocks = dict_blocks.pop(pn, None)
+                if raw_blocks is None:
                     try:
-                        raw_blocks = page.get_text("dict")["blocks"]
+                        raw_blocks = page.get_text("dict", flags=_DICT_FLAGS)["blocks"]
                     except Exception:
                         raw_blocks = []
 
-                    # Construire (bbox, texte, police_max) pour chaque bloc texte
-                    text_blocks = []
-                    for block in raw_blocks:
-                        if block.get("type") != 0:
-                            continue
-                        bbox = block["bbox"]
-                        block_text = ""
-                        max_font = 0.0
-                        for line in block.get("lines", []):
-                            for span in line.get("spans", []):
-                                block_text += span.get("text", "")
-                                max_font = max(max_font, span.get("size", 0))
-                            block_text += "\n"
-                        block_text = block_text.strip()
-                        if block_text:
-                            text_blocks.append((bbox, block_text, max_font))
-
-                    # Filtrer headers/footers
-                    filtered = []
-                    for bbox, text, font in text_blocks:
-                        _, y0, _, y1 = bbox
-                        if y0 < h * 0.09 or y1 > h * 0.91:
-                            norm = _re.sub(r'\d+', 'N', text).strip()
-                            if norm in repeated:
-                                continue
-                        filtered.append((bbox, text, font))
-
-                    if not filtered:
-                        pages_out.append({"page": pn + 1, "text": "", "section": current_section})
+                # Construire (bbox, texte, police_max) pour chaque bloc texte
+                text_blocks = []
+                for block in raw_blocks:
+                    if block.get("type") != 0:
                         continue
+                    bbox = block["bbox"]
+                    line_texts = []
+                    max_font = 0.0
+                    for line in block.get("lines", []):
+                        spans = line.get("spans", [])
+                        line_texts.append("".join(span.get("text", "") for span in spans))
+                        for span in spans:
+                            max_font = max(max_font, span.get("size", 0))
+                    block_text = "\n".join(line_texts).strip()
+                    if block_text:
+                        text_blocks.append((bbox, block_text, max_font))
+
+                # Filtrer headers/footers
+                filtered = []
+                for bbox, text, font in text_blocks:
+                    _, y0, _, y1 = bbox
+                    if y0 < h * 0.09 or y1 > h * 0.91:
+                        norm = _re.sub(r'\d+', 'N', text).strip()
+                        if norm in repeated:
+                            continue
+                    filtered.append((bbox, text, font))
 
-                    # Détection 2 colonnes
-                    left_blocks = [(b, t, f) for b, t, f in filtered if (b[0] + b[2]) / 2 < mid_x]
-                    right_blocks = [(b, t, f) for b, t, f in filtered if (b[0] + b[2]) / 2 >= mid_x]
+                if not filtered:
+                    pages_out.append({"page": pn + 1, "text": "", "section": current_section})
+                    continue
 
-                    if left_blocks and right_blocks:
-                        columns = [
-                            sorted(left_blocks, key=lambda x: x[0][1]),
-                            sorted(right_blocks, key=lambda x: x[0][1]),
-                        ]
-                    else:
-                        columns = [sorted(filtered, key=lambda x: x[0][1])]
+                # Détection 2 colonnes
+                left_blocks = [(b, t, f) for b, t, f in filtered if (b[0] + b[2]) / 2 < mid_x]
+                right_blocks = [(b, t, f) for b, t, f in filtered if (b[0] + b[2]) / 2 >= mid_x]
 
-                    page_text = ""
-                    for col_idx, col_blocks in enumerate(columns):
-                        if col_idx > 0:
-                            page_text += "\n"
-                        for bbox, text, font in col_blocks:
-                            if font >= title_threshold and len(text) < 100:
-                                current_section = text.strip()
-                                page_text += "\n## " + text.strip() + "\n"
-                            else:
-                                page_text += text + "\n"
+                if left_blocks and right_blocks:
+                    columns = [
+                        sorted(left_blocks, key=lambda x: x[0][1]),
+                        sorted(right_blocks, key=lambda x: x[0][1]),
+                    ]
+                else:
+                    columns = [sorted(filtered, key=lambda x: x[0][1])]
+
+                parts = []
+                for col_idx, col_blocks in enumerate(columns):
+                    if col_idx > 0:
+                        parts.append("\n")
+                    for bbox, text, font in col_blocks:
+                        if font >= title_threshold and len(text) < 100:
+                            current_section = text.strip()
+                            parts.append("\n## " + current_section + "\n")
+                        else:
+                            parts.append(text + "\n")
 
-                    pages_out.append({"page": pn + 1, "text": page_text.strip(), "section": current_section})
+                pages_out.append({"page": pn + 1, "text": "".join(parts).strip(), "section": current_section})
 
-                except Exception as e:
-                    print(f"⚠️  Page {pn + 1} ignorée (erreur: {str(e)[:60]})")
-                    try:
-                        fallback_text = doc[pn].get_text("text")
-                        pages_out.append({"page": pn + 1, "text": fallback_text, "section": current_section})
-                    except Exception:
-                        pages_out.append({"page": pn + 1, "text": "", "section": current_section})
-
-            doc.close()
-            return pages_out
+            except Exception as e:
+                print(f"⚠️  Page {pn + 1} ignorée (erreur: {str(e)[:60]})")
+                try:
+                    fallback_text = doc[pn].get_text("text")
+                    pages_out.append({"page": pn + 1, "text": fallback_text, "section": current_section})
+                except Exception:
+                    pages_out.append({"page": pn + 1, "text": "", "section": current_section})
 
-        except Exception as e:
-            return [{"page": 1, "text": f"[Erreur extraction PDF: {e}]", "section": ""}]
+        return pages_out
     
     @staticmethod
     def extract_from_text(file_path: Path) -> str:
@@ -401,7 +654,9 @@ class DocumentExtractor:
             return f"[Erreur lecture fichier: {e}]"
     
     @staticmethod
-    def extract_from_directory(directory: Path, max_pages: Optional[int] = None, progress_callback=None) -> Dict[str, Dict[str, Any]]:
+    def extract_from_directory(directory: Path, max_pages: Optional[int] = None, progress_callback=None,
+                               max_workers: Optional[int] = None,
+                               cache_dir: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
         """Extrait tous les documents d'un répertoire avec callback de progression
 
         Returns:
@@ -413,9 +668,92 @@ class DocumentExtractor:
                 }
             }
         """
-        documents = {}
+        return dict(DocumentExtractor.iter_directory(directory, max_pages, progress_callback, max_workers, cache_dir))
+
+    @staticmethod
+    def categorize(file_path: Path, directory: Path) -> Tuple[str, str]:
+        """Détermine la catégorie d'un fichier d'après son dossier. Retourne (catégorie, chemin relatif)"""
+        relative_path = file_path.relative_to(directory)
+        parts = relative_path.parts
+
+        category = "unknown"
+        if len(parts) > 0:
+            folder = parts[0].lower()
+            file_name = file_path.name.lower()
+
+            if folder == "regles" or "règles" in folder:
+                category = "rules"
+            elif folder == "univers":
+                if "livre 1" in file_name or "l'univers" in file_name or "univers" in file_name:
+                    category = "universe_book"
+                else:
+                    category = "novel"
+            elif folder == "scenarii" or "scenario" in folder:
+                category = "scenario"
+        return category, str(relative_path)
+
+    @staticmethod
+    def extract_pdf_cached(pdf_path: Path, max_pages: Optional[int] = None,
+                           cache_dir: Optional[Path] = None) -> List[Dict[str, Any]]:
+        """extract_from_pdf avec cache disque par (chemin, date, taille, max_pages, backend)
+
+        Un PDF inchangé n'est jamais ré-extrait, même après un reset de la base.
+        """
+        if cache_dir is None:
+            return DocumentExtractor.extract_from_pdf(pdf_path, max_pages)
+
+        stat = pdf_path.stat()
+        backend = "pymupdf" if USE_PYMUPDF else "pdfplumber" if USE_PDFPLUMBER else "pypdf2"
+        key = hashlib.sha1(
+            f"{pdf_path.resolve()}|{stat.st_mtime}|{stat.st_size}|{max_pages}|{backend}".encode()
+        ).hexdigest()
+        cache_file = cache_dir / f"{key}.json"
+        try:
+            return read_json(cache_file)
+        except (OSError, ValueError):
+            pass
+
+        pages_data = DocumentExtractor.extract_from_pdf(pdf_path, max_pages)
+        # Les échecs d'extraction ne sont pas mis en cache (fichier verrouillé, en cours de copie...)
+        if not (len(pages_data) == 1 and pages_data[0]["text"].startswith("[Erreur extraction PDF")):
+            try:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                write_json(cache_file, pages_data, indent=False)
+            except OSError as e:
+                print(f"⚠️ Cache texte non écrit pour {pdf_path.name} : {e}")
+        return pages_data
+
+    @staticmethod
+    def extract_file(file_path: Path, directory: Path, max_pages: Optional[int] = None,
+                     cache_dir: Optional[Path] = None) -> Dict[str, Any]:
+        """Extrait un fichier du corpus (PDF ou texte) avec sa catégorie"""
+        if file_path.suffix.lower() == ".pdf":
+            pages_data = DocumentExtractor.extract_pdf_cached(file_path, max_pages, cache_dir)
+            content = "\n".join(p["text"] for p in pages_data if p["text"])
+        else:
+            content = DocumentExtractor.extract_from_text(file_path)
+            pages_data = None
+
+        category, relative_path = DocumentExtractor.categorize(file_path, directory)
+        return {
+            "content": content,
+            "category": category,
+            "path": relative_path,
+            "pages": pages_data,
+        }
+
+    @staticmethod
+    def iter_directory(directory: Path, max_pages: Optional[int] = None, progress_callback=None,
+                       max_workers: Optional[int] = None,
+                       cache_dir: Optional[Path] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Générateur : produit (nom_fichier, données) au fil de l'extraction
+
+        L'extraction PDF (CPU) est répartie sur un pool de processus. La progression
+        suit l'ordre de fin des workers, les résultats restent produits dans l'ordre
+        des fichiers pour garder un corpus déterministe.
+        """
         if not directory.exists():
-            return documents
+            return
 
         # Compter d'abord le nombre total de fichiers
         all_files = [f for f in directory.rglob("*")
@@ -425,59 +763,83 @@ class DocumentExtractor:
         if progress_callback:
             progress_callback(0, total_files, "Scan des fichiers...")
 
-        for idx, file_path in enumerate(all_files, 1):
+        def extract(idx):
+            try:
+                return DocumentExtractor.extract_file(all_files[idx], directory, max_pages, cache_dir)
+            except Exception as e:
+                return e
+
+        # Le pool n'a d'intérêt que pour les PDFs ; sa taille ne dépend pas du corpus
+        # afin d'être réutilisé d'une reconstruction à l'autre
+        workers = max_workers or os.cpu_count() or 1
+        n_pdfs = sum(1 for f in all_files if f.suffix.lower() == ".pdf")
+        futures = {}
+        if workers > 1 and n_pdfs > 1:
             try:
+                pool = DocumentExtractor._get_pool(workers)
+                futures = {pool.submit(DocumentExtractor.extract_file, f, directory, max_pages, cache_dir): idx
+                           for idx, f in enumerate(all_files)}
+            except (OSError, RuntimeError, BrokenProcessPool) as e:
+                print(f"⚠️ Extraction parallèle indisponible ({e}), passage en séquentiel")
+                DocumentExtractor.shutdown()
+                futures = {}
+
+        def completed():
+            """(index, données ou exception) dans l'ordre de fin d'extraction"""
+            if not futures:
+                for idx in range(total_files):
+                    yield idx, extract(idx)
+                return
+            seen = set()
+            try:
+                for future in as_completed(futures):
+                    idx = futures[future]
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        result = e
+                    seen.add(idx)
+                    yield idx, result
+            except BrokenProcessPool:
+                # Worker tué (mémoire, antivirus...) : on termine en séquentiel
+                print("⚠️ Pool d'extraction interrompu, passage en séquentiel")
+                DocumentExtractor.shutdown()
+                for idx in range(total_files):
+                    if idx not in seen:
+                        yield idx, extract(idx)
+
+        ready = {}
+        next_idx = 0
+        try:
+            for done, (idx, result) in enumerate(completed(), 1):
+                name = all_files[idx].name
                 # Affichage console ET callback Streamlit
-                print(f"📖 [{idx}/{total_files}] Extraction de : {file_path.name}")
-
-                if progress_callback:
-                    progress_callback(idx, total_files, file_path.name)
-
-                suffix = file_path.suffix.lower()
-                if suffix == ".pdf":
-                    pages_data = DocumentExtractor.extract_from_pdf(file_path, max_pages)
-                    content = "\n".join(p["text"] for p in pages_data if p["text"])
+                print(f"📖 [{done}/{total_files}] Extraction de : {name}")
+                if isinstance(result, Exception):
+                    if progress_callback:
+                        progress_callback(done, total_files, f"⚠️ Erreur: {name}")
+                    print(f"❌ Erreur lecture {name}: {result}")
                 else:
-                    content = DocumentExtractor.extract_from_text(file_path)
-                    pages_data = None
-
-                # Déterminer la catégorie basée sur le chemin
-                relative_path = file_path.relative_to(directory)
-                parts = relative_path.parts
-
-                category = "unknown"
-                if len(parts) > 0:
-                    folder = parts[0].lower()
-                    file_name = file_path.name.lower()
-
-                    if folder == "regles" or "règles" in folder:
-                        category = "rules"
-                    elif folder == "univers":
-                        if "livre 1" in file_name or "l'univers" in file_name or "univers" in file_name:
-                            category = "universe_book"
-                        else:
-                            category = "novel"
-                    elif folder == "scenarii" or "scenario" in folder:
-                        category = "scenario"
-
-                documents[file_path.name] = {
-                    "content": content,
-                    "category": category,
-                    "path": str(relative_path),
-                    "pages": pages_data,
-                }
-                print(f"   ✅ {len(content)} caractères extraits (catégorie: {category})")
-
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(idx, total_files, f"⚠️ Erreur: {file_path.name}")
-                print(f"❌ Erreur lecture {file_path.name}: {e}")
-
-        return documents
+                    if progress_callback:
+                        progress_callback(done, total_files, name)
+                    print(f"   ✅ {len(result['content'])} caractères extraits (catégorie: {result['category']})")
+
+                ready[idx] = result
+                while next_idx in ready:
+                    result = ready.pop(next_idx)
+                    if not isinstance(result, Exception):
+                        yield all_files[next_idx].name, result
+                    next_idx += 1
+        finally:
+            # Le pool reste ouvert : on annule seulement ce qui n'a pas démarré
+            for future in futures:
+                future.cancel()
 
 
 class VectorStore:
-    """Gestion du stockage vectoriel avec Chroma"""
+    """Gestion du stockage vectoriel (Chroma par défaut, FAISS en option)"""
     
     def __init__(self, config: Dict[str, Any]):
         self.config = config
@@ -485,7 +847,17 @@ class VectorStore:
         self.use_cuda = config['rag'].get('use_cuda', True)
         self.chunk_size = config['rag']['chunk_size']
         self.chunk_overlap = config['rag']['chunk_overlap']
+        # "auto" (défaut) : lots de 128 sur GPU, 32 sur CPU
+        self.embedding_batch_size = config['rag'].get('embedding_batch_size', 'auto')
+        self.embedding_fp16 = config['rag'].get('embedding_fp16', True)
+        # Nombre de chunks par add_documents Chroma (une transaction SQLite par lot)
+        self.chroma_batch_size = min(config['rag'].get('chroma_batch_size', 1000), CHROMA_MAX_BATCH)
+        self.backend = config['rag'].get('vector_backend', 'chroma')
+        if self.backend == "faiss" and not FAISS_AVAILABLE:
+            print("⚠️ FAISS non disponible (pip install faiss-cpu), utilisation de Chroma")
+            self.backend = "chroma"
         self._embeddings = None
+        self._fp16 = False
         self._vectordb = None
     
     @property
@@ -496,191 +868,268 @@ class VectorStore:
                 device = "cuda" if self.use_cuda else "cpu"
                 self._embeddings = HuggingFaceEmbeddings(
                     model_name=self.embedding_model,
-                    model_kwargs={"device": device}
+                    model_kwargs={"device": device},
+                    encode_kwargs={"batch_size": self._batch_size(device)}
                 )
+                if device == "cuda" and self.embedding_fp16:
+                    self._fp16 = self._to_half(self._embeddings)
             except Exception:
                 # Fallback to CPU
                 self._embeddings = HuggingFaceEmbeddings(
-                    model_name=self.embedding_model
+                    model_name=self.embedding_model,
+                    encode_kwargs={"batch_size": self._batch_size("cpu")}
                 )
         return self._embeddings
+
+    def _batch_size(self, device: str) -> int:
+        """Taille des lots d'embedding : valeur de la config, ou selon le device ("auto")"""
+        if isinstance(self.embedding_batch_size, int):
+            return self.embedding_batch_size
+        return 128 if device == "cuda" else 32
     
-    def build_or_load(self, documents: Dict[str, Dict[str, Any]], db_dir: Path, source_dir: Path, progress_callback=None) -> Chroma:
-        """Construit ou charge la base vectorielle avec progression"""
-        db_dir_str = str(db_dir)
-        metadata_file = db_dir / "corpus_metadata.json"
+    @staticmethod
+    def _to_half(embeddings) -> bool:
+        """Passe le modèle SentenceTransformer en FP16 (GPU : ~2x plus rapide, VRAM divisée par 2)"""
+        client = getattr(embeddings, "_client", None) or getattr(embeddings, "client", None)
+        if client is None or not hasattr(client, "half"):
+            return False
+        try:
+            client.half()
+            print("⚡ Embeddings en FP16 sur GPU")
+            return True
+        except Exception as e:
+            print(f"⚠️ FP16 indisponible pour les embeddings ({e}), FP32 conservé")
+            return False
+    
+    @property
+    def indexing_embeddings(self) -> Embeddings:
+        """Embeddings utilisés pour indexer le corpus (avec cache disque si paths.embedding_cache)"""
+        cache_file = self.config.get('paths', {}).get('embedding_cache')
+        if not cache_file:
+            return self.embeddings
+        inner = self.embeddings
+        # Précision incluse dans la clé : vecteurs FP16 et FP32 ne sont pas mélangés
+        cache_model = f"{self.embedding_model}@fp16" if self._fp16 else self.embedding_model
+        return CachedEmbeddings(inner, Path(cache_file), cache_model)
+    
+    def _fixed_splitter(self):
+        """Splitter à taille fixe : Rust (semantic-text-splitter) si activé, sinon LangChain"""
+        if self.config['rag'].get('rust_splitter', False) and RUST_SPLITTER_AVAILABLE:
+            try:
+                splitter = RustTextSplitter(self.chunk_size, self.chunk_overlap)
+                print("🦀 Chunking fixe via semantic-text-splitter")
+                return splitter
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ semantic-text-splitter inutilisable ({e}), splitter LangChain")
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
+        )
 
-        # Créer ou charger
-        if not db_dir.exists() or not any(db_dir.iterdir()):
-            print("\n🔧 Préparation des documents...")
-            if progress_callback:
-                progress_callback("Préparation des documents...")
+    def _chunk_documents(self, documents: Dict[str, Dict[str, Any]],
+                         progress_callback=None) -> Tuple[List[Document], bool]:
+        """Découpe les documents en chunks enrichis et dédoublonnés
 
-            # Préparer les chunks avec métadonnées
-            all_chunks = []
+        Returns: (chunks, chunking_semantique_utilise)
+        """
+        # Préparer les chunks avec métadonnées
+        all_chunks = []
 
-            # Préparer le splitter (sémantique si disponible, sinon fixe)
-            if SEMANTIC_CHUNKER_AVAILABLE:
-                print("🧠 Chunking sémantique activé (BAAI/bge-m3)")
-                if progress_callback:
-                    progress_callback("Chargement du modèle de chunking sémantique...")
-                try:
-                    splitter = SemanticChunker(
-                        self.embeddings,
-                        breakpoint_threshold_type="percentile",
-                        breakpoint_threshold_amount=85
-                    )
-                    use_semantic = True
-                except Exception as e:
-                    print(f"⚠️ SemanticChunker échoué ({e}), fallback sur chunking fixe")
-                    splitter = RecursiveCharacterTextSplitter(
-                        chunk_size=self.chunk_size,
-                        chunk_overlap=self.chunk_overlap
-                    )
-                    use_semantic = False
-            else:
-                splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=self.chunk_size,
-                    chunk_overlap=self.chunk_overlap
+        # Préparer le splitter (sémantique si disponible, sinon fixe)
+        if SEMANTIC_CHUNKER_AVAILABLE:
+            print("🧠 Chunking sémantique activé (BAAI/bge-m3)")
+            if progress_callback:
+                progress_callback("Chargement du modèle de chunking sémantique...")
+            try:
+                splitter = SemanticChunker(
+                    self.embeddings,
+                    breakpoint_threshold_type="percentile",
+                    breakpoint_threshold_amount=85
                 )
+                use_semantic = True
+            except Exception as e:
+                print(f"⚠️ SemanticChunker échoué ({e}), fallback sur chunking fixe")
+                splitter = self._fixed_splitter()
                 use_semantic = False
+        else:
+            splitter = self._fixed_splitter()
+            use_semantic = False
+
+        # Splitter de secours construit une fois (et non à chaque page en échec)
+        fallback = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
+        )
 
-            for name, doc_data in documents.items():
-                content = doc_data["content"]
-                category = doc_data["category"]
-                path = doc_data["path"]
-                pages_data = doc_data.get("pages")
+        # Chunking document par document : les chunks d'un fichier ne rejoignent
+        # le corpus qu'une fois le fichier entièrement découpé
+        for name, doc_data in documents.items():
+            file_chunks: List[Document] = []
+            content = doc_data["content"]
+            category = doc_data["category"]
+            path = doc_data["path"]
+            pages_data = doc_data.get("pages")
 
-                try:
-                    if pages_data:
-                        # Chunking par page — portage de l'en-tête de section vers les pages suivantes.
-                        # Quand une section (## Titre) commence sur la page N et continue sur N+1, N+2…,
-                        # on préfixe les pages de continuation avec "## Titre [suite]" pour que le
-                        # re-ranker les associe au bon sujet sans contaminer les autres sections.
-                        import re as _re_chunk
-                        _last_header = ""
-                        for i, page_info in enumerate(pages_data):
-                            page_text = page_info["text"].strip()
-                            if not page_text:
-                                continue
-
-                            # Si la page ne démarre pas par un en-tête ## et qu'on a un contexte actif,
-                            # préfixer avec cet en-tête pour aider le retriever/re-ranker
-                            _page_has_header = bool(_re_chunk.match(r'\s*##', page_text))
-                            if not _page_has_header and _last_header:
-                                page_text = f"{_last_header} (suite)\n{page_text}"
-
-                            # Mettre à jour l'en-tête actif avec le dernier ## trouvé sur cette page
-                            _headers_on_page = _re_chunk.findall(r'^##[^\n]+', page_text, _re_chunk.MULTILINE)
-                            if _headers_on_page:
-                                _last_header = _headers_on_page[-1].strip()
-
-                            try:
-                                page_chunks = splitter.split_text(page_text)
-                            except Exception:
-                                page_chunks = RecursiveCharacterTextSplitter(
-                                    chunk_size=self.chunk_size,
-                                    chunk_overlap=self.chunk_overlap
-                                ).split_text(page_text)
-                            for chunk in page_chunks:
-                                all_chunks.append(Document(
-                                    page_content=chunk,
-                                    metadata={
-                                        "source": name,
-                                        "category": category,
-                                        "path": path,
-                                        "page": page_info["page"],
-                                        "section": page_info["section"],
-                                    }
-                                ))
-                    else:
-                        # Fichiers non-PDF : comportement original sans métadonnée de page
-                        doc_chunks = splitter.split_text(f"--- DOCUMENT: {name} ---\n\n{content}")
-                        for chunk in doc_chunks:
-                            all_chunks.append(Document(
+            try:
+                if pages_data:
+                    # Chunking par page — portage de l'en-tête de section vers les pages suivantes.
+                    # Quand une section (## Titre) commence sur la page N et continue sur N+1, N+2…,
+                    # on préfixe les pages de continuation avec "## Titre [suite]" pour que le
+                    # re-ranker les associe au bon sujet sans contaminer les autres sections.
+                    import re as _re_chunk
+                    _last_header = ""
+                    for i, page_info in enumerate(pages_data):
+                        page_text = page_info["text"].strip()
+                        if not page_text:
+                            continue
+
+                        # Si la page ne démarre pas par un en-tête ## et qu'on a un contexte actif,
+                        # préfixer avec cet en-tête pour aider le retriever/re-ranker
+                        _page_has_header = bool(_re_chunk.match(r'\s*##', page_text))
+                        if not _page_has_header and _last_header:
+                            page_text = f"{_last_header} (suite)\n{page_text}"
+
+                        # Mettre à jour l'en-tête actif avec le dernier ## trouvé sur cette page
+                        _headers_on_page = _re_chunk.findall(r'^##[^\n]+', page_text, _re_chunk.MULTILINE)
+                        if _headers_on_page:
+                            _last_header = _headers_on_page[-1].strip()
+
+                        try:
+                            page_chunks = splitter.split_text(page_text)
+                        except Exception:
+                            page_chunks = fallback.split_text(page_text)
+                        for chunk in page_chunks:
+                            file_chunks.append(Document(
                                 page_content=chunk,
                                 metadata={
                                     "source": name,
                                     "category": category,
                                     "path": path,
-                                    "page": None,
-                                    "section": "",
+                                    "page": page_info["page"],
+                                    "section": page_info["section"],
                                 }
                             ))
-                except Exception:
-                    fallback = RecursiveCharacterTextSplitter(
-                        chunk_size=self.chunk_size,
-                        chunk_overlap=self.chunk_overlap
+                else:
+                    # Fichiers non-PDF : sans métadonnée de page. La source est portée
+                    # par les métadonnées, le texte n'est pas recopié avec un en-tête
+                    file_chunks = splitter.create_documents(
+                        [content],
+                        metadatas=[{
+                            "source": name,
+                            "category": category,
+                            "path": path,
+                            "page": None,
+                            "section": "",
+                        }]
                     )
-                    for chunk in fallback.split_text(f"--- DOCUMENT: {name} ---\n\n{content}"):
-                        all_chunks.append(Document(
-                            page_content=chunk,
-                            metadata={"source": name, "category": category, "path": path}
-                        ))
-
-            # ── Enrichissement VD → titre d'arcane ───────────────────────────────
-            # Les pages avec titres en police décorative (image) perdent leur titre lors
-            # de l'extraction. On reconstruit le titre à partir de la valeur VD unique.
-            # 1. Construire le lookup VD→arcane_name depuis les chunks qui ont les deux
-            import re as _re_vd
-            _vd_to_arcane: Dict[str, str] = {}
-            for _ch in all_chunks:
-                if '#' in _ch.page_content[:300]:
-                    # Prendre la ligne de titre ## mais la stopper avant le texte descriptif
-                    # (empêche la capture de toute la ligne quand il n'y a pas de \n après le titre)
-                    _tm_raw = _re_vd.search(r'##\s+(.+)', _ch.page_content)
-                    _vm = _re_vd.search(r'VD\s*[:\s]+([^\n]+)', _ch.page_content)
-                    if _tm_raw and _vm:
-                        _raw_title = _tm_raw.group(1)
-                        # Tronquer avant les mots qui indiquent le début de la description
-                        _stop = _re_vd.search(
-                            r'\b(Symbole|Dans |Chez |Cette |Cet |Les |La |Il |Elle |C\'est|Représente|'
-                            r'Personnage|Incarnation|Archétype)',
-                            _raw_title, _re_vd.IGNORECASE
-                        )
-                        if _stop and _stop.start() > 3:
-                            _raw_title = _raw_title[:_stop.start()].strip()
-                        _raw_title = _raw_title[:80].strip()  # sécurité : max 80 chars
-                        if _raw_title and len(_raw_title) >= 3:
-                            _arcane_key = _vm.group(1).strip().lower().split()[0]
-                            if _arcane_key and _arcane_key not in _vd_to_arcane:
-                                _vd_to_arcane[_arcane_key] = _raw_title
-            print(f"  📖 Lookup VD→arcane : {len(_vd_to_arcane)} entrées — {list(_vd_to_arcane.items())[:5]}")
-
-            # 2. Enrichir les chunks corps (VD+M présents, nom d'arcane absent/garbled)
-            # Attrape aussi les titres en police décorative dont l'encodage est garbled
-            _enriched: List[Document] = []
-            for _ch in all_chunks:
-                _ct = _ch.page_content
-                _has_vd = 'VD' in _ct
-                _has_m = ('M :' in _ct or 'M:' in _ct)
-                if _has_vd and _has_m:
-                    _vm = _re_vd.search(r'VD\s*[:\s]+([^\n]+)', _ct)
-                    if _vm:
-                        _vd_key = _vm.group(1).strip().lower().split()[0]
-                        _arcane_name = _vd_to_arcane.get(_vd_key)
-                        if _arcane_name:
-                            _sig_words = [w.lower() for w in _arcane_name.split() if len(w) >= 5]
-                            _first200 = _ct[:200].lower()
-                            _title_present = all(w in _first200 for w in _sig_words)
-                            if not _title_present:
-                                _ch = Document(
-                                    page_content=f"## {_arcane_name}\n{_ct}",
-                                    metadata=_ch.metadata
-                                )
-                                print(f"  ✨ Enrichi : p.{_ch.metadata.get('page','?')} → ## {_arcane_name}")
-                            else:
-                                print(f"  ⏩ Déjà titré : p.{_ch.metadata.get('page','?')} ({_arcane_name})")
+            except Exception:
+                # Échec en cours de fichier : on repart de zéro pour ce document
+                # (pas de chunks partiels suivis d'un second découpage complet)
+                file_chunks = fallback.create_documents(
+                    [content],
+                    metadatas=[{"source": name, "category": category, "path": path,
+                                "page": None, "section": ""}]
+                )
+            all_chunks.extend(file_chunks)
+
+        # ── Enrichissement VD → titre d'arcane ───────────────────────────────
+        # Les pages avec titres en police décorative (image) perdent leur titre lors
+        # de l'extraction. On reconstruit le titre à partir de la valeur VD unique.
+        # 1. Construire le lookup VD→arcane_name depuis les chunks qui ont les deux
+        import re as _re_vd
+        _vd_to_arcane: Dict[str, str] = {}
+        for _ch in all_chunks:
+            if '#' in _ch.page_content[:300]:
+                # Prendre la ligne de titre ## mais la stopper avant le texte descriptif
+                # (empêche la capture de toute la ligne quand il n'y a pas de \n après le titre)
+                _tm_raw = _re_vd.search(r'##\s+(.+)', _ch.page_content)
+                _vm = _re_vd.search(r'VD\s*[:\s]+([^\n]+)', _ch.page_content)
+                if _tm_raw and _vm:
+                    _raw_title = _tm_raw.group(1)
+                    # Tronquer avant les mots qui indiquent le début de la description
+                    _stop = _re_vd.search(
+                        r'\b(Symbole|Dans |Chez |Cette |Cet |Les |La |Il |Elle |C\'est|Représente|'
+                        r'Personnage|Incarnation|Archétype)',
+                        _raw_title, _re_vd.IGNORECASE
+                    )
+                    if _stop and _stop.start() > 3:
+                        _raw_title = _raw_title[:_stop.start()].strip()
+                    _raw_title = _raw_title[:80].strip()  # sécurité : max 80 chars
+                    if _raw_title and len(_raw_title) >= 3:
+                        _arcane_key = _vm.group(1).strip().lower().split()[0]
+                        if _arcane_key and _arcane_key not in _vd_to_arcane:
+                            _vd_to_arcane[_arcane_key] = _raw_title
+        print(f"  📖 Lookup VD→arcane : {len(_vd_to_arcane)} entrées — {list(islice(_vd_to_arcane.items(), 5))}")
+
+        # 2. Enrichir les chunks corps (VD+M présents, nom d'arcane absent/garbled)
+        # Attrape aussi les titres en police décorative dont l'encodage est garbled
+        _enriched: List[Document] = []
+        for _ch in all_chunks:
+            _ct = _ch.page_content
+            _has_vd = 'VD' in _ct
+            _has_m = ('M :' in _ct or 'M:' in _ct)
+            if _has_vd and _has_m:
+                _vm = _re_vd.search(r'VD\s*[:\s]+([^\n]+)', _ct)
+                if _vm:
+                    _vd_key = _vm.group(1).strip().lower().split()[0]
+                    _arcane_name = _vd_to_arcane.get(_vd_key)
+                    if _arcane_name:
+                        _sig_words = [w.lower() for w in _arcane_name.split() if len(w) >= 5]
+                        _first200 = _ct[:200].lower()
+                        _title_present = all(w in _first200 for w in _sig_words)
+                        if not _title_present:
+                            _ch = Document(
+                                page_content=f"## {_arcane_name}\n{_ct}",
+                                metadata=_ch.metadata
+                            )
+                            print(f"  ✨ Enrichi : p.{_ch.metadata.get('page','?')} → ## {_arcane_name}")
                         else:
-                            _pg = _ch.metadata.get('page', '?')
-                            print(f"  ⚠️ VD+M trouvés p.{_pg} mais clé '{_vd_key}' absente du lookup")
-                            print(f"     Début du chunk : {_ct[:150].replace(chr(10),' ')!r}")
-                elif _has_vd and not _has_m:
-                    _pg = _ch.metadata.get('page', '?')
-                    _vd_ctx = _ct[_ct.find('VD'):_ct.find('VD')+60] if 'VD' in _ct else ''
-                    print(f"  ℹ️ VD sans M: p.{_pg} — {_vd_ctx.replace(chr(10),' ')!r}")
-                _enriched.append(_ch)
-            all_chunks = _enriched
+                            print(f"  ⏩ Déjà titré : p.{_ch.metadata.get('page','?')} ({_arcane_name})")
+                    else:
+                        _pg = _ch.metadata.get('page', '?')
+                        print(f"  ⚠️ VD+M trouvés p.{_pg} mais clé '{_vd_key}' absente du lookup")
+                        print(f"     Début du chunk : {_ct[:150].replace(chr(10),' ')!r}")
+            elif _has_vd and not _has_m:
+                _pg = _ch.metadata.get('page', '?')
+                _vd_ctx = _ct[_ct.find('VD'):_ct.find('VD')+60] if 'VD' in _ct else ''
+                print(f"  ℹ️ VD sans M: p.{_pg} — {_vd_ctx.replace(chr(10),' ')!r}")
+            _enriched.append(_ch)
+        all_chunks = _enriched
+
+        # Dédoublonnage par contenu : les passages répétés d'un PDF à l'autre
+        # (règles reprises, encadrés...) ne sont embeddés et indexés qu'une fois.
+        # Le chunk conservé garde la liste des autres fichiers qui le contiennent
+        # (DUP_PATHS_KEY) : update_incremental redécoupe ces fichiers quand il le retire
+        _kept: Dict[str, Document] = {}
+        _dups: Dict[str, set] = {}
+        _unique: List[Document] = []
+        for _ch in all_chunks:
+            _first = _kept.get(_ch.page_content)
+            if _first is None:
+                _kept[_ch.page_content] = _ch
+                _unique.append(_ch)
+            elif _ch.metadata.get("path") != _first.metadata.get("path"):
+                _dups.setdefault(_ch.page_content, set()).add(_ch.metadata.get("path"))
+        for _text, _paths in _dups.items():
+            self._set_dup_paths(_kept[_text], _paths)
+        if len(_unique) < len(all_chunks):
+            print(f"♻️ {len(all_chunks) - len(_unique)} chunks en double ignorés")
+        all_chunks = _unique
+        del _kept, _dups, _unique
+
+        return all_chunks, use_semantic
+
+    def build_or_load(self, documents: Dict[str, Dict[str, Any]], db_dir: Path, source_dir: Path, progress_callback=None) -> Chroma:
+        """Construit ou charge la base vectorielle avec progression"""
+        metadata_file = db_dir / "corpus_metadata.json"
+
+        # Créer ou charger
+        if not db_dir.exists() or not any(db_dir.iterdir()):
+            print("\n🔧 Préparation des documents...")
+            if progress_callback:
+                progress_callback("Préparation des documents...")
+
+            all_chunks, use_semantic = self._chunk_documents(documents, progress_callback)
 
             chunk_type = "sémantiques" if use_semantic else "fixes"
             print(f"✅ {len(all_chunks)} chunks {chunk_type} créés avec métadonnées")
@@ -702,11 +1151,21 @@ class VectorStore:
             if progress_callback:
                 progress_callback(f"Génération des embeddings ({len(all_chunks)} vecteurs)...")
 
-            self._vectordb = Chroma.from_documents(
-                documents=all_chunks,
-                embedding=self.embeddings,
-                persist_directory=db_dir_str
-            )
+            if self.backend == "faiss":
+                self._vectordb = self._build_faiss(all_chunks, db_dir)
+            else:
+                # Upserts incrémentaux : seuls les embeddings du lot en cours sont en
+                # mémoire et la progression reste visible. Les chunks sont triés par
+                # longueur (smart batching) : chaque lot envoyé au modèle d'embedding
+                # regroupe des textes de taille voisine, donc peu de padding.
+                self._vectordb = self._open_chroma(db_dir, self.indexing_embeddings, self._hnsw_metadata())
+                self._add_chunks(self._vectordb, all_chunks, progress_callback)
+
+                # Chroma >= 0.4 écrit déjà sur disque à chaque ajout ; seul l'ancien
+                # wrapper expose persist(), appelé une seule fois en fin de build
+                persist = getattr(self._vectordb, "persist", None)
+                if persist is not None:
+                    persist()
 
             # Sauvegarder les métadonnées du corpus
             DocumentExtractor.save_corpus_metadata(source_dir, db_dir)
@@ -719,29 +1178,264 @@ class VectorStore:
             if progress_callback:
                 progress_callback("Chargement de la base existante...")
 
-            self._vectordb = Chroma(
-                persist_directory=db_dir_str,
-                embedding_function=self.embeddings
-            )
+            self.load_existing(db_dir)
+
+            # Corpus modifié : mise à jour incrémentale (Chroma uniquement, FAISS
+            # ne sait pas retirer des vecteurs par métadonnée)
+            # Un seul parcours du corpus, partagé par le diff et la sauvegarde des métadonnées
+            scan = None
+            changes = None
+            if self.backend != "faiss":
+                scan = DocumentExtractor.calculate_directory_hash(source_dir)
+                changes = DocumentExtractor.corpus_changes(source_dir, db_dir, scan)
+            if changes and any(changes):
+                added, removed, modified = changes
+                if progress_callback:
+                    progress_callback("Mise à jour incrémentale de la base...")
+                try:
+                    n_added = self.update_incremental(documents, db_dir, added, removed, modified, progress_callback)
+                    DocumentExtractor.save_corpus_metadata(source_dir, db_dir, scan)
+                    print(f"✅ Base mise à jour : +{len(added)} / -{len(removed)} / ~{len(modified)} fichier(s), "
+                          f"{n_added} chunks ajoutés")
+                except Exception as e:
+                    print(f"⚠️ Mise à jour incrémentale impossible ({e}), base existante conservée")
 
             # IMPORTANT: Sauvegarder les métadonnées si elles n'existent pas
             # (cas où la base existe mais pas le fichier de métadonnées)
             if not metadata_file.exists():
                 if progress_callback:
                     progress_callback("Création des métadonnées manquantes...")
-                DocumentExtractor.save_corpus_metadata(source_dir, db_dir)
+                DocumentExtractor.save_corpus_metadata(source_dir, db_dir, scan)
 
             if progress_callback:
                 progress_callback("✅ Base vectorielle chargée !")
 
-        # Persist si possible
+        return self._vectordb
+    
+    def _build_faiss(self, chunks: List[Document], db_dir: Path):
+        """Construit un index FAISS (HNSW, ou IVF-PQ au-delà de faiss_pq_threshold) et le persiste"""
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = self.indexing_embeddings.embed_documents(texts)
+        dim = len(vectors[0]) if vectors else len(self.embeddings.embed_query("dimension"))
+
+        pq_threshold = self.config['rag'].get('faiss_pq_threshold', 10000)
+        if len(vectors) >= pq_threshold and dim % 4 == 0:
+            # Gros corpus : IVF-PQ, codes 8 bits par sous-vecteur (16x plus compact que FP32)
+            import numpy as np
+            import math
+            matrix = np.asarray(vectors, dtype="float32")
+            nlist = min(4096, int(4 * math.sqrt(len(vectors))))
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, dim // 4, 8)
+            print(f"🗜️ Entraînement IVF-PQ ({len(vectors)} vecteurs, nlist={nlist})...")
+            index.train(matrix)
+            index.nprobe = min(nlist, 32)
+        elif self.config['rag'].get('faiss_int8', True) and vectors:
+            # HNSW sur vecteurs quantifiés int8 (un octet par dimension : 4x plus
+            # compact que FP32, distances calculées sur 4x moins de mémoire)
+            import numpy as np
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, 32)
+            index.train(np.asarray(vectors, dtype="float32"))
+        else:
+            # HNSW : recherche en O(log N), pas de phase d'entraînement
+            index = faiss.IndexHNSWFlat(dim, 32)
+
+        vectordb = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        vectordb.add_embeddings(
+            list(zip(texts, vectors)),
+            metadatas=[chunk.metadata for chunk in chunks]
+        )
+        vectordb.save_local(str(db_dir))
+        return vectordb
+
+    def _load_faiss(self, db_dir: Path):
+        """Charge l'index FAISS en mémoire mappée (lecture seule) si le type d'index le permet"""
+        index_path = str(db_dir / "index.faiss")
         try:
-            self._vectordb.persist()
-        except AttributeError:
-            pass  # Nouvelle version de Chroma sans persist()
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            index = faiss.read_index(index_path)
+
+        with open(db_dir / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
 
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id
+        )
+
+    def load_existing(self, db_dir: Path):
+        """Ouvre la base vectorielle persistée avec le backend configuré"""
+        if self.backend == "faiss":
+            self._vectordb = self._load_faiss(db_dir)
+        else:
+            self._vectordb = self._open_chroma(db_dir, self.embeddings)
         return self._vectordb
-    
+
+    def _hnsw_metadata(self) -> Dict[str, Any]:
+        """Paramètres HNSW de la collection Chroma (fixés à la création, ignorés ensuite)"""
+        rag = self.config['rag']
+        return {
+            "hnsw:space": rag.get('hnsw_space', 'l2'),
+            "hnsw:M": rag.get('hnsw_m', 16),
+            "hnsw:construction_ef": rag.get('hnsw_construction_ef', 100),
+            "hnsw:search_ef": rag.get('hnsw_search_ef', 100),
+            # Moins d'écritures de l'index sur disque pendant l'ingestion en masse
+            "hnsw:sync_threshold": rag.get('hnsw_sync_threshold', 10000),
+        }
+
+    @staticmethod
+    def _open_chroma(db_dir: Path, embedding_function, collection_metadata: Optional[Dict[str, Any]] = None) -> Chroma:
+        """Ouvre (ou crée) la collection Chroma persistée, télémétrie désactivée"""
+        kwargs = {}
+        if collection_metadata:
+            kwargs["collection_metadata"] = collection_metadata
+        if CHROMA_SETTINGS_AVAILABLE:
+            kwargs["client_settings"] = ChromaSettings(
+                anonymized_telemetry=False,
+                is_persistent=True,
+                persist_directory=str(db_dir)
+            )
+        return Chroma(
+            persist_directory=str(db_dir),
+            embedding_function=embedding_function,
+            **kwargs
+        )
+
+    def _add_chunks(self, vectordb: Chroma, chunks: List[Document], progress_callback=None):
+        """Insère les chunks dans Chroma par lots de chroma_batch_size, triés par longueur"""
+        ordered = sorted(chunks, key=lambda d: len(d.page_content))
+        batch = self.chroma_batch_size
+        for start in range(0, len(ordered), batch):
+            vectordb.add_documents(ordered[start:start + batch])
+            if progress_callback:
+                done = min(start + batch, len(ordered))
+                progress_callback(f"Embeddings : {done}/{len(ordered)}")
+
+    # Métadonnée des chunks dédoublonnés : autres fichiers contenant le même texte
+    # (chemins séparés par des sauts de ligne ; Chroma n'accepte que des scalaires)
+    DUP_PATHS_KEY = "dup_paths"
+
+    @classmethod
+    def _dup_paths(cls, metadata: Optional[Dict[str, Any]]) -> set:
+        """Chemins des doublons enregistrés sur un chunk"""
+        raw = (metadata or {}).get(cls.DUP_PATHS_KEY)
+        return set(raw.split("\n")) if raw else set()
+
+    @classmethod
+    def _set_dup_paths(cls, chunk: Document, paths: set):
+        """Enregistre (ou retire si vide) les chemins des doublons d'un chunk"""
+        paths = {p for p in paths if p and p != chunk.metadata.get("path")}
+        if paths:
+            chunk.metadata[cls.DUP_PATHS_KEY] = "\n".join(sorted(paths))
+        else:
+            chunk.metadata.pop(cls.DUP_PATHS_KEY, None)
+
+    def update_incremental(self, documents: Dict[str, Dict[str, Any]], db_dir: Path,
+                           added: set, removed: set, modified: List[str], progress_callback=None) -> int:
+        """Applique les changements du corpus à la base Chroma existante sans tout reconstruire
+
+        Les chunks des fichiers supprimés ou modifiés sont retirés (métadonnée "path"),
+        seuls les fichiers ajoutés ou modifiés sont redécoupés, ainsi que les fichiers
+        inchangés dont un passage dédoublonné n'était stocké que sous un fichier retiré.
+        Les chunks au texte inchangé reprennent le vecteur déjà stocké au lieu d'être
+        ré-embeddés. Retourne le nombre de chunks ajoutés.
+        """
+        stale = set(removed) | set(modified)
+        fresh = set(added) | set(modified)
+        corpus_paths = {doc["path"] for doc in documents.values()}
+
+        writer = self._open_chroma(db_dir, self.indexing_embeddings)
+        reusable: Dict[str, Any] = {}
+        old_dups: Dict[str, set] = {}
+        if stale:
+            # Un chunk dédoublonné n'est stocké qu'une fois, sous un seul fichier :
+            # les fichiers inchangés qui le contenaient aussi (DUP_PATHS_KEY) sont
+            # retirés et redécoupés avec les autres, sinon le passage disparaîtrait
+            # de la base alors qu'il est toujours dans leur texte. Un seul niveau
+            # suffit : les doublons des fichiers redécoupés sont reportés sur leurs
+            # nouveaux chunks (old_dups)
+            pending = set(stale)
+            for level in range(2):
+                where = {"path": {"$in": sorted(pending)}}
+                try:
+                    old = writer._collection.get(where=where, include=["documents", "metadatas", "embeddings"])
+                except Exception as e:
+                    print(f"⚠️ Vecteurs existants non récupérés ({e}), ré-embedding complet")
+                    old = writer._collection.get(where=where, include=["documents", "metadatas"])
+                texts = old.get("documents") or []
+                vectors = old.get("embeddings")
+                if vectors is not None:
+                    reusable.update(zip(texts, vectors))
+                siblings = set()
+                for text, meta in zip(texts, old.get("metadatas") or []):
+                    dups = self._dup_paths(meta)
+                    if dups:
+                        old_dups.setdefault(text, set()).update(dups)
+                        siblings |= dups
+                if level:
+                    break
+                pending = (siblings & corpus_paths) - stale - fresh
+                if not pending:
+                    break
+                print(f"🔗 {len(pending)} fichier(s) inchangé(s) partageant des chunks : redécoupés")
+                stale |= pending
+                fresh |= pending
+            print(f"🗑️ Retrait des chunks de {len(stale)} fichier(s)")
+            writer._collection.delete(where={"path": {"$in": sorted(stale)}})
+
+        chunks: List[Document] = []
+        new_docs = {name: doc for name, doc in documents.items() if doc["path"] in fresh}
+        if new_docs:
+            chunks, _ = self._chunk_documents(new_docs, progress_callback)
+            # Reporter les doublons connus des chunks retirés (fichiers hors de ce lot)
+            for c in chunks:
+                carried = old_dups.get(c.page_content)
+                if carried:
+                    self._set_dup_paths(c, (self._dup_paths(c.metadata) | carried) & corpus_paths)
+            known = [c for c in chunks if c.page_content in reusable]
+            todo = [c for c in chunks if c.page_content not in reusable]
+            if known:
+                print(f"♻️ {len(known)} chunks inchangés : vecteurs existants réutilisés")
+                batch = self.chroma_batch_size
+                for start in range(0, len(known), batch):
+                    part = known[start:start + batch]
+                    writer._collection.upsert(
+                        ids=[str(uuid.uuid4()) for _ in part],
+                        embeddings=[reusable[c.page_content] for c in part],
+                        documents=[c.page_content for c in part],
+                        metadatas=[c.metadata for c in part]
+                    )
+            print(f"🧮 Embeddings de {len(todo)} chunks ({len(new_docs)} fichier(s))...")
+            self._add_chunks(writer, todo, progress_callback)
+
+        # Garder l'index BM25 aligné sur la collection
+        bm25_file = db_dir / "bm25_docs.pkl"
+        if BM25_AVAILABLE and bm25_file.exists():
+            with open(bm25_file, "rb") as f:
+                bm25_docs = pickle.load(f)
+            bm25_docs = [d for d in bm25_docs if d.metadata.get("path") not in stale]
+            bm25_docs.extend(chunks)
+            with open(bm25_file, "wb") as f:
+                pickle.dump(bm25_docs, f)
+
+        return len(chunks)
+
+    def count(self) -> int:
+        """Nombre de vecteurs dans la base chargée"""
+        if self._vectordb is None:
+            return 0
+        if self.backend == "faiss":
+            return self._vectordb.index.ntotal
+        return self._vectordb._collection.count()
+
     def reset(self, db_dir: Path):
         """Réinitialise la base vectorielle"""
         # Fermer proprement la connexion si elle existe
@@ -838,6 +1532,10 @@ class RAGChain:
                     print(f"⚠️ Impossible de charger le re-ranker : {e}")
                     self.reranker = None
 
+        # Clients LLM déjà construits, par jeu de paramètres (RAGChain est partagé via cache_resource)
+        self._llm_cache: Dict[tuple, Any] = {}
+        self._inputs_runnable = None
+
     def rerank_documents(self, query: str, documents: List, k: int) -> List:
         """Re-rank les documents selon leur pertinence avec la query"""
         if not self.reranker or not documents:
@@ -872,7 +1570,7 @@ class RAGChain:
             return documents[:k]
     
     def create_llm(self, model_name: str, temperature: float, top_p: float):
-        """Crée une instance LLM"""
+        """Retourne le client LLM pour ces paramètres (réutilisé d'une requête à l'autre)"""
         # num_ctx : priorité au slider UI, sinon config, sinon défaut 32K
         try:
             import streamlit as _st
@@ -882,6 +1580,17 @@ class RAGChain:
             num_ctx = self.config.get('model', {}).get('num_ctx', 32768)
         num_predict = self.config.get('model', {}).get('num_predict', 2048)
 
+        key = (model_name, temperature, top_p, num_ctx, num_predict)
+        llm = self._llm_cache.get(key)
+        if llm is None:
+            if len(self._llm_cache) >= 8:
+                self._llm_cache.pop(next(iter(self._llm_cache)))
+            llm = self._llm_cache[key] = self._build_llm(model_name, temperature, top_p, num_ctx, num_predict)
+        return llm
+
+    @staticmethod
+    def _build_llm(model_name: str, temperature: float, top_p: float, num_ctx: int, num_predict: int):
+        """Construit le client ChatOllama (repli progressif selon les paramètres supportés)"""
         try:
             from langchain_ollama import ChatOllama
 
@@ -1057,31 +1766,34 @@ Ta réponse :"""
         from langchain_core.prompts import ChatPromptTemplate
         
         llm = self.create_llm(model_name, temperature, top_p)
+        # Seul le prompt (mémoire, niveau...) change d'un tour à l'autre ; le LLM vient
+        # du cache et l'étage d'entrée de la chaîne LCEL est construit une seule fois
         prompt_template = self.create_prompt(mode, system_prompt, memory, short_memory, level)
 
-        # Créer une chaîne RAG classique avec LCEL
-        from langchain_core.runnables import RunnablePassthrough
-        from operator import itemgetter
-        
-        # Créer la fonction de formatage du context
-        def format_context(docs):
-            context_text = "\n\n".join([doc.page_content for doc in docs])
-            return context_text
-        
-        # Construire la chaîne
-        chain = (
-            {"context": itemgetter("context") | RunnablePassthrough(), "question": itemgetter("question")}
-            | prompt_template
-            | llm
-        )
+        chain = self._chain_inputs() | prompt_template | llm
         
         return {
             "chain": chain,
             "retriever": retriever,
             "llm": llm,
             "prompt": prompt_template,
-            "format_context": format_context
+            "format_context": self.format_context
         }
+
+    def _chain_inputs(self):
+        """Étage d'entrée {context, question} de la chaîne QA, partagé par toutes les chaînes"""
+        if self._inputs_runnable is None:
+            from operator import itemgetter
+            self._inputs_runnable = RunnableParallel(
+                context=itemgetter("context") | RunnablePassthrough(),
+                question=itemgetter("question")
+            )
+        return self._inputs_runnable
+
+    @staticmethod
+    def format_context(docs) -> str:
+        """Concatène le contenu des documents pour le contexte du prompt"""
+        return "\n\n".join(doc.page_content for doc in docs)
     
     def query(
         self,
@@ -1133,6 +1845,20 @@ Ta réponse :"""
         except Exception as e:
             raise e
     
+    @staticmethod
+    def stream(runnable, inputs, meta: Optional[dict] = None):
+        """Génère la réponse token par token (compatible st.write_stream)
+
+        meta, si fourni, reçoit le response_metadata du dernier chunk
+        (compteurs prompt_eval_count / eval_count d'Ollama).
+        """
+        for chunk in runnable.stream(inputs):
+            if meta is not None and getattr(chunk, 'response_metadata', None):
+                meta.update(chunk.response_metadata)
+            text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if text:
+                yield text
+
     def get_base_llm(self, model_name: str = None):
         """Retourne une instance de base LLM (wrapper pour backward compatibility)"""
         return None
\ No newline at end of file
@@ -3,20 +3,79 @@ core/utils.py
 Fonctions utilitaires diverses
 """
 
+import copy
+import json
+import os
+import platform
 import subprocess
 import re
+import time
 import yaml
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Chargeur YAML en C (libyaml) si PyYAML a été compilé avec, sinon version Python
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+# Serveur Ollama local (API HTTP)
+OLLAMA_URL = "http://localhost:11434"
+
+# Nom de modèle Ollama valide (inclut / pour les modèles user/model:tag) ; \Z exclut un \n final
+_MODEL_NAME_RE = re.compile(r"[\w\-\.:/]+\Z")
+
+
+def loads_json(raw) -> Any:
+    """Décode du JSON (str ou bytes) avec orjson si disponible, sinon json"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def read_json(path: Path) -> Any:
+    """Lit un fichier JSON (orjson si disponible, sinon json)"""
+    return loads_json(path.read_bytes())
+
+
+def write_json(path: Path, data: Any, indent: bool = True):
+    """Écrit un fichier JSON UTF-8 (orjson si disponible, sinon json)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        path.write_bytes(orjson.dumps(data, option=option))
+    else:
+        path.write_text(
+            json.dumps(data, ensure_ascii=False, indent=2 if indent else None),
+            encoding="utf-8"
+        )
 
 
 def load_config(config_path: Path) -> Dict[str, Any]:
-    """Charge la configuration depuis un fichier YAML"""
+    """Charge la configuration depuis un fichier YAML
+
+    Le fichier n'est réanalysé que s'il a changé (date, taille) ; chaque appel
+    reçoit sa propre copie, modifiable sans toucher au cache.
+    """
     if not config_path.exists():
         raise FileNotFoundError(f"Fichier de configuration non trouvé: {config_path}")
-    
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+
+    stat = config_path.stat()
+    return copy.deepcopy(_load_config_cached(str(config_path.absolute()), stat.st_mtime_ns, stat.st_size))
+
+
+@lru_cache(maxsize=4)
+def _load_config_cached(config_path_str: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """Analyse YAML (libyaml si disponible) + résolution des chemins, par version du fichier"""
+    config_path = Path(config_path_str)
+    config = _read_yaml_cached(config_path)
     
     # Expand paths
     base_dir_str = config['paths']['base_dir']
@@ -35,7 +94,7 @@ def load_config(config_path: Path) -> Dict[str, Any]:
     config['paths']['base_dir'] = base_dir.absolute()
     
     # Convertir les chemins relatifs en absolus (relatifs à base_dir)
-    for key in ['pdf_root', 'char_dir', 'db_dir', 'save_dir', 'memory_dir']:
+    for key in ['pdf_root', 'char_dir', 'db_dir', 'save_dir', 'memory_dir', 'embedding_cache', 'text_cache']:
         if key in config['paths']:
             path = config['paths'][key]
             if not Path(path).is_absolute():
@@ -46,8 +105,56 @@ def load_config(config_path: Path) -> Dict[str, Any]:
     return config
 
 
+def _read_yaml_cached(config_path: Path) -> Dict[str, Any]:
+    """Lit le YAML via une copie JSON voisine (.config.yaml.json)
+
+    La copie enregistre la date (ns) et la taille du YAML dont elle provient ;
+    elle n'est utilisée que si les deux correspondent exactement (un YAML plus
+    ancien restauré par-dessus est donc bien relu). Au démarrage, décoder le JSON
+    est bien plus rapide qu'analyser le YAML.
+    """
+    cache_path = config_path.with_name(f".{config_path.name}.json")
+    stat = config_path.stat()
+    try:
+        cached = read_json(cache_path)
+        if (
+            isinstance(cached, dict)
+            and cached.get("yaml_mtime_ns") == stat.st_mtime_ns
+            and cached.get("yaml_size") == stat.st_size
+            and isinstance(cached.get("config"), dict)
+        ):
+            return cached["config"]
+    except (OSError, ValueError):
+        pass
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.load(f, Loader=_YamlLoader)
+    try:
+        write_json(
+            cache_path,
+            {"yaml_mtime_ns": stat.st_mtime_ns, "yaml_size": stat.st_size, "config": config},
+            indent=False
+        )
+    except (OSError, TypeError):
+        pass  # Dossier en lecture seule ou valeur non sérialisable : YAML relu la prochaine fois
+    return config
+
+
 def get_ollama_models() -> List[str]:
-    """Récupère la liste des modèles Ollama disponibles"""
+    """Récupère la liste des modèles Ollama disponibles (rafraîchie au plus toutes les 30 s)"""
+    return list(_ollama_models(int(time.time()) // 30))
+
+
+@lru_cache(maxsize=1)
+def _ollama_models(time_bucket: int) -> Tuple[str, ...]:
+    """Modèles Ollama mémorisés par tranche de temps (time_bucket ne sert que de clé)
+
+    API HTTP du serveur d'abord (pas de processus à lancer), `ollama list` sinon.
+    """
+    models = _ollama_models_http()
+    if models:
+        return tuple(models)
+
     try:
         output = subprocess.check_output(
             ["ollama", "list"],
@@ -67,13 +174,24 @@ def get_ollama_models() -> List[str]:
             if parts:
                 candidate = parts[0]
                 # Validation basique (inclut / pour les modèles user/model:tag)
-                if re.match(r"^[\w\-\.:/]+$", candidate):
+                if _MODEL_NAME_RE.match(candidate):
                     models.append(candidate)
         
-        return models if models else get_fallback_models()
+        return tuple(models) if models else tuple(get_fallback_models())
     
     except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-        return get_fallback_models()
+        return tuple(get_fallback_models())
+
+
+def _ollama_models_http() -> Optional[List[str]]:
+    """Liste des modèles via GET /api/tags, None si le serveur ne répond pas"""
+    import urllib.request
+    try:
+        with urllib.request.urlopen(f"{OLLAMA_URL}/api/tags", timeout=1) as resp:
+            data = loads_json(resp.read())
+        return [m["name"] for m in data.get("models", []) if m.get("name")]
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
 
 
 def get_fallback_models() -> List[str]:
@@ -89,7 +207,13 @@ def get_fallback_models() -> List[str]:
 
 
 def validate_ollama_installation() -> bool:
-    """Vérifie si Ollama est installé et accessible"""
+    """Vérifie si Ollama est installé et accessible (résultat gardé 5 minutes)"""
+    return _ollama_installed(int(time.time()) // 300)
+
+
+@lru_cache(maxsize=1)
+def _ollama_installed(time_bucket: int) -> bool:
+    """`ollama --version` mémorisé par tranche de temps (time_bucket ne sert que de clé)"""
     try:
         subprocess.run(
             ["ollama", "--version"],
@@ -117,8 +241,6 @@ def ensure_ollama_running() -> bool:
 
     Returns True si Ollama est prêt, False si impossible de le démarrer.
     """
-    import time
-
     if _is_ollama_running():
         return True
 
@@ -145,9 +267,16 @@ def ensure_ollama_running() -> bool:
     return False
 
 
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+
 def format_file_size(size_bytes: int) -> str:
     """Formate une taille de fichier en unités lisibles"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
+    if isinstance(size_bytes, int) and size_bytes >= 0:
+        # Unité déduite du nombre de bits (une puissance de 1024 tous les 10 bits)
+        idx = min((size_bytes.bit_length() - 1) // 10, 4) if size_bytes else 0
+        return f"{size_bytes / (1 << (idx * 10)):.1f} {_SIZE_UNITS[idx]}"
+    for unit in _SIZE_UNITS[:-1]:
         if size_bytes < 1024.0:
             return f"{size_bytes:.1f} {unit}"
         size_bytes /= 1024.0
@@ -159,9 +288,9 @@ def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
     if len(text) <= max_length:
         return text
     
-    # Tronque au dernier espace avant max_length
-    truncated = text[:max_length].rsplit(' ', 1)[0]
-    return truncated + suffix
+    # Tronque au dernier espace avant max_length (recherche en place, une seule copie)
+    cut = text.rfind(' ', 0, max_length)
+    return f"{text[:cut if cut != -1 else max_length]}{suffix}"
 
 
 def create_directory_structure(base_dir: Path, subdirs: List[str]):
@@ -177,51 +306,29 @@ def export_session_to_markdown(
     session_name: str,
     output_path: Path
 ) -> bool:
-    """Exporte une session en format Markdown"""
+    """Exporte une session en format Markdown (écrit au fil de l'eau, sans copie en mémoire)"""
     try:
-        lines = [
-            f"# Session: {session_name}",
-            "",
-            "## État du jeu",
-            ""
-        ]
-        
-        # État PNJ
-        if game_state.get("npcs"):
-            lines.append("### PNJ")
-            for name, status in game_state["npcs"].items():
-                lines.append(f"- **{name}**: {status}")
-            lines.append("")
-        
-        # État Lieux
-        if game_state.get("locations"):
-            lines.append("### Lieux")
-            for name, status in game_state["locations"].items():
-                lines.append(f"- **{name}**: {status}")
-            lines.append("")
-        
-        # État Intrigues
-        if game_state.get("intrigues"):
-            lines.append("### Intrigues")
-            for name, status in game_state["intrigues"].items():
-                lines.append(f"- **{name}**: {status}")
-            lines.append("")
-        
-        # Historique des échanges
-        lines.append("## Historique")
-        lines.append("")
-        
-        for i, entry in enumerate(mj_memory, 1):
-            lines.append(f"### Tour {i}")
-            lines.append("")
-            lines.append(f"**Joueur:** {entry['user']}")
-            lines.append("")
-            lines.append(f"**MJ:** {entry['assistant']}")
-            lines.append("")
-            lines.append("---")
-            lines.append("")
+        with open(output_path, "w", encoding="utf-8") as out:
+            out.write(f"# Session: {session_name}\n\n## État du jeu\n\n")
+            
+            # État PNJ / Lieux / Intrigues
+            for key, title in (("npcs", "PNJ"), ("locations", "Lieux"), ("intrigues", "Intrigues")):
+                if game_state.get(key):
+                    out.write(f"### {title}\n")
+                    out.write("".join(f"- **{name}**: {status}\n" for name, status in game_state[key].items()))
+                    out.write("\n")
+            
+            # Historique des échanges : un bloc par tour
+            out.write("## Historique\n\n")
+            
+            for i, entry in enumerate(mj_memory, 1):
+                out.write(
+                    f"### Tour {i}\n\n"
+                    f"**Joueur:** {entry['user']}\n\n"
+                    f"**MJ:** {entry['assistant']}\n\n"
+                    "---\n\n"
+                )
         
-        output_path.write_text("\n".join(lines), encoding="utf-8")
         return True
     
     except Exception as e:
@@ -229,6 +336,20 @@ def export_session_to_markdown(
         return False
 
 
+# Commande d'ouverture par défaut du système, déterminée une fois à l'import
+_SYSTEM = platform.system()
+_OPEN_CMD = {"Darwin": "open"}.get(_SYSTEM, "xdg-open")
+
+
+def open_with_default_app(path: Path) -> None:
+    """Ouvre un fichier avec l'application par défaut du système, sans bloquer l'UI"""
+    if _SYSTEM == "Windows":
+        os.startfile(str(path))
+    else:
+        subprocess.Popen([_OPEN_CMD, str(path)],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
 class ColorScheme:
     """Schéma de couleurs pour l'interface"""
     
@@ -238,10 +359,18 @@ class ColorScheme:
     WARNING = "#FF8C00"
     DANGER = "#DC143C"
     INFO = "#4682B4"
+
+    _css: Optional[str] = None
     
     @classmethod
     def get_css(cls) -> str:
-        """Retourne le CSS personnalisé"""
+        """Retourne le CSS personnalisé (construit une seule fois, réutilisé à chaque rerun)"""
+        if cls._css is None:
+            cls._css = cls._build_css()
+        return cls._css
+
+    @classmethod
+    def _build_css(cls) -> str:
         return f"""
         <style>
         .stButton>button {{
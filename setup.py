@@ -3,11 +3,16 @@ setup.py
 Script d'installation et de configuration initiale
 """
 
+import argparse
+import json
 import os
 import sys
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 import shutil
+from string import Template
 
 
 def print_header(text):
@@ -30,54 +35,93 @@ def check_python_version():
     return True
 
 
-def check_ollama():
-    """Vérifie si Ollama est installé"""
+def run_many(commands):
+    """Lance plusieurs commandes en parallèle, résultats dans l'ordre des commandes
+
+    commands : [(cmd, timeout), ...]. Une commande introuvable donne None,
+    un délai dépassé ou une autre erreur donne l'exception correspondante.
+    """
+    def run(cmd, timeout):
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+        futures = [executor.submit(run, cmd, timeout) for cmd, timeout in commands]
+        return [f.result() for f in futures]
+
+
+# Version et liste des modèles sondées en même temps : l'attente est celle
+# de la plus lente des deux commandes, pas leur somme
+OLLAMA_PROBES = [
+    (["ollama", "--version"], 5),
+    (["ollama", "list"], 5),
+]
+
+
+def check_ollama(probe=None):
+    """Vérifie si Ollama est installé
+
+    probe : Future de run_many(OLLAMA_PROBES) lancé en amont (sinon sondage immédiat).
+    """
     print("\n🔍 Vérification d'Ollama...")
     
-    try:
-        result = subprocess.run(
-            ["ollama", "--version"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode == 0:
-            print("✅ Ollama installé")
-            
-            # Lister les modèles
-            try:
-                models_result = subprocess.run(
-                    ["ollama", "list"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                
-                if models_result.returncode == 0:
-                    lines = models_result.stdout.strip().split('\n')
-                    if len(lines) > 1:
-                        print(f"   Modèles disponibles: {len(lines)-1}")
-                    else:
-                        print("⚠️  Aucun modèle téléchargé")
-                        print("   Exécute: ollama pull mistral-nemo")
-            except Exception:
-                pass
-            
-            return True
-        else:
-            print("❌ Ollama non installé ou non accessible")
-            print("   Télécharge depuis: https://ollama.ai")
-            return False
+    result, models_result = probe.result() if probe is not None else run_many(OLLAMA_PROBES)
     
-    except FileNotFoundError:
+    if result is None:
         print("❌ Ollama non installé")
         print("   Télécharge depuis: https://ollama.ai")
         return False
     
-    except Exception as e:
-        print(f"⚠️  Erreur lors de la vérification: {e}")
+    if isinstance(result, Exception):
+        print(f"⚠️  Erreur lors de la vérification: {result}")
+        return False
+    
+    if result.returncode != 0:
+        print("❌ Ollama non installé ou non accessible")
+        print("   Télécharge depuis: https://ollama.ai")
         return False
+    
+    print("✅ Ollama installé")
+    
+    # Lister les modèles
+    if isinstance(models_result, subprocess.CompletedProcess) and models_result.returncode == 0:
+        # Lignes non vides moins l'en-tête, comptées sans matérialiser de liste
+        count = sum(1 for line in models_result.stdout.splitlines() if line.strip()) - 1
+        if count > 0:
+            print(f"   Modèles disponibles: {count}")
+        else:
+            print("⚠️  Aucun modèle téléchargé")
+            print("   Exécute: ollama pull mistral-nemo")
+    
+    return True
+
+
+# Contenus des README encodés une fois au chargement du module
+README_DATA = (
+    "Dépose ici tes PDFs et documents de règles du jeu.\n"
+    "Formats supportés: .pdf, .txt, .md\n"
+).encode("utf-8")
+README_CHARACTERS = (
+    "Dépose ici les fiches de personnages.\n"
+    "Formats supportés: .pdf, .txt, .md\n"
+).encode("utf-8")
+
+
+def _write_if_missing(path, content: bytes):
+    """Écrit le fichier seulement s'il n'existe pas (création exclusive, sans stat préalable)"""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    try:
+        os.write(fd, content)
+    finally:
+        os.close(fd)
+    return True
 
 
 def create_directory_structure(base_dir):
@@ -86,114 +130,92 @@ def create_directory_structure(base_dir):
     
     base_path = Path(base_dir).expanduser()
     
-    dirs = [
-        base_path,
-        base_path / "Data",
-        base_path / "Characters",
-        base_path / "lames_db",
-        base_path / "saved_sessions",
-        base_path / "memory"
-    ]
-    
-    for directory in dirs:
-        directory.mkdir(parents=True, exist_ok=True)
+    # base_path une seule fois, puis ses sous-dossiers sans remonter les parents
+    base_path.mkdir(parents=True, exist_ok=True)
+    print(f"   ✅ {base_path}")
+    for sub in ("Data", "Characters", "lames_db", "saved_sessions", "memory"):
+        directory = base_path / sub
+        directory.mkdir(exist_ok=True)
         print(f"   ✅ {directory}")
     
     # Créer des fichiers README dans les dossiers importants
-    readme_data = base_path / "Data" / "README.txt"
-    if not readme_data.exists():
-        readme_data.write_text(
-            "Dépose ici tes PDFs et documents de règles du jeu.\n"
-            "Formats supportés: .pdf, .txt, .md\n"
-        )
-    
-    readme_chars = base_path / "Characters" / "README.txt"
-    if not readme_chars.exists():
-        readme_chars.write_text(
-            "Dépose ici les fiches de personnages.\n"
-            "Formats supportés: .pdf, .txt, .md\n"
-        )
+    _write_if_missing(base_path / "Data" / "README.txt", README_DATA)
+    _write_if_missing(base_path / "Characters" / "README.txt", README_CHARACTERS)
     
     return base_path
 
 
-def create_config_file(base_dir):
-    """Crée le fichier de configuration"""
+CONFIG_TEMPLATE_PATH = Path(__file__).resolve().parent / "templates" / "config.yaml.tmpl"
+
+
+@lru_cache(maxsize=1)
+def _config_template():
+    """Modèle de config.yaml (templates/config.yaml.tmpl), lu une seule fois"""
+    return Template(CONFIG_TEMPLATE_PATH.read_text(encoding="utf-8"))
+
+
+def create_config_file(base_dir, assume_yes=False):
+    """Crée le fichier de configuration (assume_yes : écrase sans demander)"""
     print("\n⚙️  Création du fichier config.yaml...")
     
     config_path = Path("config.yaml")
     
-    if config_path.exists():
+    config_content = _config_template().substitute(base_dir=base_dir)
+    
+    # UTF-8 explicite : load_config relit en UTF-8 (accents des prompts sous Windows)
+    data = config_content.encode("utf-8")
+    
+    try:
+        existing = config_path.read_bytes()
+    except FileNotFoundError:
+        existing = None
+    
+    if existing == data:
+        # Contenu identique : ni question, ni écriture
+        print("   ⏭️  config.yaml déjà à jour")
+        return
+    
+    if existing is not None and not assume_yes:
         response = input("   config.yaml existe déjà. Écraser? (o/N): ")
         if response.lower() != 'o':
             print("   ⏭️  Conservation du fichier existant")
             return
     
-    config_content = f"""# Configuration - Assistant MJ Les Lames du Cardinal
-
-# Chemins (utilise ~ pour home directory, ou chemins absolus)
-paths:
-  base_dir: "{base_dir}"
-  pdf_root: "Data"
-  char_dir: "Characters"
-  db_dir: "lames_db"
-  save_dir: "saved_sessions"
-  memory_dir: "memory"
-
-# Configuration du modèle
-model:
-  default: "mistral-nemo"
-  temperature: 0.0
-  top_p: 1.0
-  fallback_models:
-    - "llama3"
-    - "mistral"
-    - "phi3"
-
-# Configuration RAG
-rag:
-  embedding_model: "all-MiniLM-L6-v2"
-  k_retrieval: 6
-  chunk_size: 1000
-  chunk_overlap: 150
-  use_cuda: true
-
-# Configuration de la mémoire
-memory:
-  max_mj_memory: 30
-  max_encyclo_memory: 10
-  short_memory_context: 3
-
-# Configuration UI
-ui:
-  default_mode: "MJ immersif"
-  show_sources_default: false
-  timeline_enabled: true
-  auto_save_interval: 5
-
-# Prompts
-prompts:
-  mj_system: |
-    Tu es le Maître de Jeu des Lames du Cardinal.
-    Tu dois répondre **uniquement** à partir des extraits fournis ci-dessous.
-    Si l'information n'existe pas dans le contexte, réponds exactement : "Aucune information trouvée dans le corpus."
-    N'invente JAMAIS d'informations.
-    
-  encyclo_system: |
-    Tu es une encyclopédie du jeu 'Les Lames du Cardinal'.
-    Réponds uniquement selon le contenu des extraits fournis.
-    Si aucune information n'est trouvée, réponds exactement : "Aucune information trouvée dans le corpus."
-    Ne crée jamais d'informations de toutes pièces.
-
-# Options avancées
-advanced:
-  max_pdf_pages: 500
-  enable_statistics: true
-  export_format: "markdown"
-"""
-    
-    config_path.write_text(config_content)
+    # Écriture atomique : un config.yaml n'est jamais laissé à moitié écrit
+    tmp_path = config_path.with_name(config_path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, config_path)
     print(f"   ✅ config.yaml créé")
+    _write_config_json_cache(config_path, config_content)
+
+
+def _write_config_json_cache(config_path, config_content):
+    """Écrit la copie JSON de config.yaml relue par load_config (core/utils.py)
+
+    Le premier lancement de l'application évite ainsi l'analyse YAML. Ignoré si
+    PyYAML n'est pas encore installé : load_config la créera lui-même.
+    """
+    try:
+        import yaml
+    except ImportError:
+        return
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    # Même nom et même format que core.utils._read_yaml_cached : la copie porte
+    # la date et la taille exactes du YAML dont elle est issue
+    cache_path = config_path.with_name(f".{config_path.name}.json")
+    try:
+        stat = config_path.stat()
+        config = yaml.load(config_content, Loader=loader)
+        cache_path.write_text(
+            json.dumps(
+                {"yaml_mtime_ns": stat.st_mtime_ns, "yaml_size": stat.st_size, "config": config},
+                ensure_ascii=False,
+                separators=(",", ":")
+            ),
+            encoding="utf-8"
+        )
+    except (OSError, TypeError, yaml.YAMLError):
+        pass
 
 
 def install_dependencies():
@@ -208,9 +230,20 @@ def install_dependencies():
     
     print("   Cela peut prendre quelques minutes...")
     
+    # Cache de wheels persistant : les relances de setup.py ne retéléchargent rien
+    cache_dir = Path(os.environ.get("PIP_CACHE_DIR") or Path.home() / ".cache" / "lamesmj-pip")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    env = {
+        **os.environ,
+        "PIP_CACHE_DIR": str(cache_dir),
+        "PIP_DISABLE_PIP_VERSION_CHECK": "1",
+    }
+    
     try:
         subprocess.run(
-            [sys.executable, "-m", "pip", "install", "-r", "requirements.txt"],
+            [sys.executable, "-m", "pip", "install",
+             "--prefer-binary", "--no-input", "-r", "requirements.txt"],
+            env=env,
             check=True
         )
         print("   ✅ Dépendances installées")
@@ -221,11 +254,11 @@ def install_dependencies():
         return False
 
 
-def download_ollama_model(model_name="mistral-nemo"):
-    """Propose de télécharger un modèle Ollama"""
+def download_ollama_model(model_name="mistral-nemo", assume_yes=False):
+    """Propose de télécharger un modèle Ollama (assume_yes : sans demander)"""
     print(f"\n🤖 Téléchargement du modèle {model_name}...")
     
-    response = input(f"   Télécharger {model_name}? (o/N): ")
+    response = 'o' if assume_yes else input(f"   Télécharger {model_name}? (o/N): ")
     
     if response.lower() != 'o':
         print("   ⏭️  Téléchargement annulé")
@@ -233,10 +266,32 @@ def download_ollama_model(model_name="mistral-nemo"):
     
     try:
         print(f"   Téléchargement en cours (cela peut prendre plusieurs minutes)...")
-        subprocess.run(
+        # Sortie lue au fil de l'eau : la progression s'affiche sur une seule ligne
+        # (les \r de ollama sont des fins de ligne en mode texte)
+        proc = subprocess.Popen(
             ["ollama", "pull", model_name],
-            check=True
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1
         )
+        try:
+            for line in proc.stdout:
+                line = line.strip()
+                if line:
+                    sys.stdout.write(f"\r   {line[:100]:<100}")
+                    sys.stdout.flush()
+            returncode = proc.wait()
+        finally:
+            # Ctrl-C ou erreur : ne pas laisser le téléchargement tourner en arrière-plan
+            if proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+        print()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, proc.args)
         print(f"   ✅ Modèle {model_name} téléchargé")
         return True
     
@@ -249,40 +304,78 @@ def download_ollama_model(model_name="mistral-nemo"):
         return False
 
 
-def main():
+def parse_args(argv=None):
+    """Options de ligne de commande (installation sans questions)"""
+    parser = argparse.ArgumentParser(
+        description="Installation de l'Assistant MJ Les Lames du Cardinal"
+    )
+    parser.add_argument("--base-dir", help="Répertoire de base (sinon demandé)")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="Répond oui à toutes les questions (valeurs par défaut)")
+    parser.add_argument("--skip-deps", action="store_true",
+                        help="N'installe pas les dépendances Python")
+    parser.add_argument("--skip-ollama-pull", action="store_true",
+                        help="Ne télécharge pas de modèle Ollama")
+    parser.add_argument("--model", default="mistral-nemo",
+                        help="Modèle Ollama à télécharger (défaut : mistral-nemo)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Fonction principale"""
+    args = parse_args(argv)
+    
     print_header("🗡️  INSTALLATION - ASSISTANT MJ LES LAMES DU CARDINAL")
     
     # Vérifications
     if not check_python_version():
         return
     
-    has_ollama = check_ollama()
-    
-    # Demander le répertoire de base
-    print("\n📂 Configuration du répertoire de base")
-    default_dir = str(Path.home() / "LamesMJ")
-    base_dir = input(f"   Répertoire de base [{default_dir}]: ").strip()
-    
-    if not base_dir:
-        base_dir = default_dir
+    # Sondage d'Ollama en arrière-plan pendant que l'utilisateur répond ;
+    # les input() et l'affichage restent sur le thread principal
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        ollama_probe = executor.submit(run_many, OLLAMA_PROBES)
+        
+        # Demander le répertoire de base
+        print("\n📂 Configuration du répertoire de base")
+        default_dir = str(Path.home() / "LamesMJ")
+        if args.base_dir:
+            base_dir = args.base_dir
+            print(f"   Répertoire de base: {base_dir}")
+        elif args.yes:
+            base_dir = default_dir
+            print(f"   Répertoire de base: {base_dir}")
+        else:
+            base_dir = input(f"   Répertoire de base [{default_dir}]: ").strip()
+        
+        if not base_dir:
+            base_dir = default_dir
+        
+        has_ollama = check_ollama(ollama_probe)
     
     # Créer la structure
     base_path = create_directory_structure(base_dir)
     
     # Créer le fichier de config
-    create_config_file(base_dir)
+    create_config_file(base_dir, assume_yes=args.yes)
     
     # Installer les dépendances
     print("\n📦 Installation des dépendances")
-    install_deps = input("   Installer les dépendances Python? (O/n): ").strip()
+    if args.skip_deps:
+        install_deps = 'n'
+    elif args.yes:
+        install_deps = 'o'
+    else:
+        install_deps = input("   Installer les dépendances Python? (O/n): ").strip()
     
     if install_deps.lower() != 'n':
         install_dependencies()
+    else:
+        print("   ⏭️  Installation ignorée")
     
     # Télécharger un modèle Ollama
-    if has_ollama:
-        download_ollama_model("mistral-nemo")
+    if has_ollama and not args.skip_ollama_pull:
+        download_ollama_model(args.model, assume_yes=args.yes)
     
     # Résumé
     print_header("✅ INSTALLATION TERMINÉE")